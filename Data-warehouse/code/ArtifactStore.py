@@ -0,0 +1,212 @@
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import pandas as pd
+
+# Các DataFrame do DataTransformer.transform_data trả về
+ARTIFACT_FRAMES = ['clean_data', 'date_dim', 'gold_type_dim', 'fact_table', 'daily_agg', 'monthly_agg']
+
+SPILL_FORMATS = {
+    'parquet': '.parquet',
+    'feather': '.arrow'
+}
+
+MANIFEST_FILE = 'manifest.json'
+COLUMN_SEPARATOR = '__'
+
+
+def flatten_frame(df):
+    """Chuẩn bị DataFrame để ghi file cột: đưa index thành cột, làm phẳng MultiIndex columns
+    Trả về (frame phẳng, metadata để khôi phục)
+    """
+    meta = {
+        'index': [name for name in df.index.names if name is not None],
+        'multi_columns': isinstance(df.columns, pd.MultiIndex)
+    }
+    flat = df.reset_index() if meta['index'] else df.reset_index(drop=True)
+    if meta['multi_columns']:
+        flat.columns = [
+            COLUMN_SEPARATOR.join(str(part) for part in col if part != '') if isinstance(col, tuple) else col
+            for col in flat.columns
+        ]
+    return flat, meta
+
+
+def restore_frame(flat, meta):
+    """Khôi phục DataFrame từ frame phẳng và metadata của flatten_frame"""
+    df = flat.set_index(meta['index']) if meta['index'] else flat
+    if meta['multi_columns']:
+        df.columns = pd.MultiIndex.from_tuples([tuple(col.split(COLUMN_SEPARATOR)) for col in df.columns])
+    return df
+
+
+class ArtifactStore:
+    """Lưu kết quả transform_data theo run_id để các job phía sau dùng lại
+    - Giữ tối đa max_in_memory lần chạy gần nhất trong bộ nhớ
+    - spill=True: ghi thêm mỗi DataFrame ra data/artifacts/<run_id>/ (parquet hoặc feather)
+      kèm manifest.json, để job chạy ở process khác (scheduler, chạy lại) đọc được
+    - Artifact đã được load vào warehouse được đánh dấu consumed để không load hai lần
+    """
+
+    def __init__(self, base_dir, spill=False, spill_format='parquet', max_in_memory=3, keep_runs=10):
+        if spill_format not in SPILL_FORMATS:
+            raise ValueError(f"Unsupported spill format: {spill_format}")
+        self.base_dir = base_dir
+        self.spill = spill
+        self.spill_format = spill_format
+        self.max_in_memory = max(int(max_in_memory), 1)
+        self.keep_runs = keep_runs
+
+        self._memory = OrderedDict()  # run_id -> (frames, metadata)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def new_run_id():
+        return datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+
+    def _run_dir(self, run_id):
+        return os.path.join(self.base_dir, run_id)
+
+    def _read_manifest(self, run_id):
+        manifest_path = os.path.join(self._run_dir(run_id), MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def _write_manifest(self, run_id, manifest):
+        manifest_path = os.path.join(self._run_dir(run_id), MANIFEST_FILE)
+        tmp_path = manifest_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=4)
+        os.replace(tmp_path, manifest_path)
+
+    def put(self, transformed_data, run_id=None, metadata=None):
+        """Lưu kết quả transform, trả về run_id"""
+        run_id = run_id or self.new_run_id()
+        metadata = dict(metadata or {})
+        metadata.setdefault('created_at', datetime.now().isoformat())
+        metadata.setdefault('consumed_at', None)
+
+        with self._lock:
+            self._memory[run_id] = (transformed_data, metadata)
+            self._memory.move_to_end(run_id)
+            while len(self._memory) > self.max_in_memory:
+                self._memory.popitem(last=False)
+
+        if self.spill:
+            try:
+                self._spill(run_id, transformed_data, metadata)
+            except Exception as e:
+                # Không spill được vẫn dùng được bản trong bộ nhớ
+                print(f"Error spilling artifact {run_id}: {str(e)}")
+        return run_id
+
+    def _spill(self, run_id, transformed_data, metadata):
+        run_dir = self._run_dir(run_id)
+        os.makedirs(run_dir, exist_ok=True)
+        extension = SPILL_FORMATS[self.spill_format]
+
+        frames = {}
+        for name in ARTIFACT_FRAMES:
+            if name not in transformed_data:
+                continue
+            flat, meta = flatten_frame(transformed_data[name])
+            file_name = name + extension
+            if self.spill_format == 'parquet':
+                flat.to_parquet(os.path.join(run_dir, file_name), index=False)
+            else:
+                flat.to_feather(os.path.join(run_dir, file_name))
+            meta['file'] = file_name
+            meta['rows'] = len(flat)
+            frames[name] = meta
+
+        # Manifest ghi sau cùng: run chưa có manifest coi như chưa spill xong
+        self._write_manifest(run_id, {
+            'run_id': run_id,
+            'format': self.spill_format,
+            'frames': frames,
+            'metadata': metadata
+        })
+        print(f"Artifact {run_id} spilled to {run_dir} ({self.spill_format})")
+        self._prune()
+
+    def _load_spilled(self, run_id):
+        manifest = self._read_manifest(run_id)
+        if manifest is None:
+            return None
+        run_dir = self._run_dir(run_id)
+        transformed_data = {}
+        for name, meta in manifest['frames'].items():
+            path = os.path.join(run_dir, meta['file'])
+            if manifest['format'] == 'parquet':
+                flat = pd.read_parquet(path)
+            else:
+                flat = pd.read_feather(path)
+            transformed_data[name] = restore_frame(flat, meta)
+        return transformed_data, manifest['metadata']
+
+    def get(self, run_id):
+        """Lấy (transformed_data, metadata) của run_id, ưu tiên bản trong bộ nhớ"""
+        with self._lock:
+            if run_id in self._memory:
+                return self._memory[run_id]
+        if self.spill:
+            return self._load_spilled(run_id)
+        return None
+
+    def run_ids(self):
+        """Danh sách run_id (trong bộ nhớ và trên đĩa) theo thứ tự thời gian"""
+        with self._lock:
+            run_ids = set(self._memory)
+        if self.spill and os.path.isdir(self.base_dir):
+            run_ids.update(
+                name for name in os.listdir(self.base_dir)
+                if os.path.exists(os.path.join(self.base_dir, name, MANIFEST_FILE))
+            )
+        return sorted(run_ids)
+
+    def latest(self, include_consumed=False):
+        """run_id mới nhất; mặc định trả về None nếu artifact mới nhất đã được load vào warehouse
+        (artifact cũ hơn chưa load thì đã bị artifact mới thay thế, cùng tính từ một watermark)
+        """
+        run_ids = self.run_ids()
+        if not run_ids:
+            return None
+        run_id = run_ids[-1]
+        if include_consumed or not self._metadata(run_id).get('consumed_at'):
+            return run_id
+        return None
+
+    def _metadata(self, run_id):
+        with self._lock:
+            if run_id in self._memory:
+                return self._memory[run_id][1]
+        manifest = self._read_manifest(run_id) if self.spill else None
+        return manifest['metadata'] if manifest else {}
+
+    def mark_consumed(self, run_id):
+        """Đánh dấu artifact đã được load vào warehouse"""
+        consumed_at = datetime.now().isoformat()
+        with self._lock:
+            if run_id in self._memory:
+                self._memory[run_id][1]['consumed_at'] = consumed_at
+        if self.spill:
+            manifest = self._read_manifest(run_id)
+            if manifest is not None:
+                manifest['metadata']['consumed_at'] = consumed_at
+                self._write_manifest(run_id, manifest)
+
+    def _prune(self):
+        """Xóa các artifact cũ trên đĩa, chỉ giữ keep_runs lần chạy gần nhất"""
+        if not self.keep_runs:
+            return
+        spilled = sorted(
+            name for name in os.listdir(self.base_dir)
+            if os.path.isdir(os.path.join(self.base_dir, name))
+        )
+        for run_id in spilled[:-self.keep_runs]:
+            shutil.rmtree(self._run_dir(run_id), ignore_errors=True)
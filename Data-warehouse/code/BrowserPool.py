@@ -0,0 +1,271 @@
+import argparse
+import atexit
+import os
+import threading
+import time
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+
+PNJ_URL = 'https://www.pnj.com.vn/blog/gia-vang/'
+PRICE_ROW_SELECTOR = '#content-price tr'
+
+# Đọc text các ô <td> của mọi dòng khớp selector trong một lần gọi execute_script
+TABLE_ROWS_SCRIPT = """
+return Array.from(document.querySelectorAll(arguments[0])).map(function (row) {
+    return Array.from(row.querySelectorAll('td')).map(function (cell) {
+        return (cell.innerText || cell.textContent || '').trim();
+    });
+});
+"""
+
+# Bảng giá lưu tĩnh để chạy crawler offline
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'data', 'fixtures', 'pnj_gia_vang.html')
+
+
+def validate_table_rows(rows):
+    """Kiểm tra kết quả TABLE_ROWS_SCRIPT: list các dòng, mỗi dòng là list text
+    Trả về list[list[str]], raise ValueError nếu dữ liệu trả về sai cấu trúc
+    """
+    if not isinstance(rows, list):
+        raise ValueError(f"Unexpected table data from browser: {type(rows).__name__}")
+    table = []
+    for row in rows:
+        if not isinstance(row, list):
+            raise ValueError(f"Unexpected table row from browser: {row!r}")
+        table.append(['' if cell is None else str(cell) for cell in row])
+    return table
+
+
+def create_edge_driver(page_load_timeout=30):
+    """Khởi tạo Edge webdriver headless (cùng cấu hình crawler PNJ trước đây)"""
+    options = webdriver.EdgeOptions()
+    options.add_argument('--headless')
+    options.add_argument('--disable-gpu')
+    options.add_argument('--no-sandbox')
+    options.add_argument('--disable-dev-shm-usage')
+    options.add_argument('--disable-blink-features=AutomationControlled')
+    options.add_experimental_option('excludeSwitches', ['enable-automation'])
+    options.add_experimental_option('useAutomationExtension', False)
+
+    driver = webdriver.Edge(options=options)
+    driver.set_page_load_timeout(page_load_timeout)
+    driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    return driver
+
+
+class BrowserPool:
+    """Pool webdriver dùng lại giữa các lần crawl thay vì mở / đóng browser mỗi lần
+    - Tối đa max_sessions browser, caller chờ khi tất cả đang được dùng
+    - Session bị đóng và tạo lại sau max_uses lần dùng hoặc khi lần dùng trước bị lỗi
+    - Metrics: startups, startup_seconds, page_loads, page_load_seconds, recycles, errors
+    """
+
+    def __init__(self, driver_factory=None, max_sessions=1, max_uses=50,
+                 page_load_timeout=30, wait_timeout=20, bulk_extraction=True):
+        self.driver_factory = driver_factory or (lambda: create_edge_driver(page_load_timeout))
+        self.max_sessions = max(int(max_sessions), 1)
+        self.max_uses = max_uses
+        self.wait_timeout = wait_timeout
+        # True: đọc cả bảng bằng một execute_script; False: find_elements + .text từng ô
+        self.bulk_extraction = bulk_extraction
+
+        self._idle = []  # driver đang rảnh
+        self._uses = {}  # id(driver) -> số lần đã dùng
+        self._size = 0
+        self._cond = threading.Condition()
+        self.metrics = {
+            'startups': 0,
+            'startup_seconds': 0.0,
+            'page_loads': 0,
+            'page_load_seconds': 0.0,
+            'recycles': 0,
+            'errors': 0
+        }
+
+    def _start_driver(self):
+        started = time.perf_counter()
+        driver = self.driver_factory()
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            self.metrics['startups'] += 1
+            self.metrics['startup_seconds'] += elapsed
+        print(f"Browser session started in {elapsed:.2f}s")
+        return driver
+
+    @staticmethod
+    def _quit_quietly(driver):
+        try:
+            driver.quit()
+        except Exception:
+            pass
+
+    def warm(self):
+        """Khởi động trước một browser để lần crawl đầu không phải chờ"""
+        with self._cond:
+            if self._idle or self._size >= self.max_sessions:
+                return
+            self._size += 1
+        try:
+            driver = self._start_driver()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._uses[id(driver)] = 0
+            self._idle.append(driver)
+            self._cond.notify()
+
+    def acquire(self):
+        """Lấy một browser (tạo mới nếu pool chưa đầy)"""
+        with self._cond:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_sessions:
+                    self._size += 1
+                    break
+                self._cond.wait()
+
+        try:
+            driver = self._start_driver()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._uses[id(driver)] = 0
+        return driver
+
+    def release(self, driver, error=False):
+        """Trả browser về pool; đóng và bỏ session nếu bị lỗi hoặc đã dùng đủ max_uses lần"""
+        with self._cond:
+            uses = self._uses.get(id(driver), 0) + 1
+            if error or (self.max_uses and uses >= self.max_uses):
+                self._uses.pop(id(driver), None)
+                self._size -= 1
+                self.metrics['recycles'] += 1
+                if error:
+                    self.metrics['errors'] += 1
+                recycle = True
+            else:
+                self._uses[id(driver)] = uses
+                self._idle.append(driver)
+                recycle = False
+            self._cond.notify()
+        if recycle:
+            self._quit_quietly(driver)
+
+    @contextmanager
+    def session(self):
+        """Context manager: with pool.session() as driver: ..."""
+        driver = self.acquire()
+        try:
+            yield driver
+        except Exception:
+            self.release(driver, error=True)
+            raise
+        else:
+            self.release(driver)
+
+    def load_page(self, driver, url, wait_selector=PRICE_ROW_SELECTOR):
+        """Mở trang và chờ đến khi có ít nhất một dòng khớp wait_selector (thay cho sleep cố định)
+        Trả về thời gian tải trang (giây)
+        """
+        started = time.perf_counter()
+        driver.get(url)
+        WebDriverWait(driver, self.wait_timeout).until(
+            lambda d: len(d.find_elements(By.CSS_SELECTOR, wait_selector)) > 0
+        )
+        elapsed = time.perf_counter() - started
+        with self._cond:
+            self.metrics['page_loads'] += 1
+            self.metrics['page_load_seconds'] += elapsed
+        print(f"Page loaded in {elapsed:.2f}s: {url}")
+        return elapsed
+
+    def read_rows(self, driver, row_selector=PRICE_ROW_SELECTOR):
+        """Đọc text các ô <td> của mọi dòng khớp row_selector, trả về list[list[str]]
+        Chế độ bulk chỉ tốn một round trip WebDriver cho cả bảng thay vì vài round trip mỗi dòng
+        """
+        if self.bulk_extraction:
+            return validate_table_rows(driver.execute_script(TABLE_ROWS_SCRIPT, row_selector))
+        return [
+            [column.text for column in row.find_elements(By.TAG_NAME, 'td')]
+            for row in driver.find_elements(By.CSS_SELECTOR, row_selector)
+        ]
+
+    def close(self):
+        """Đóng toàn bộ browser đang idle"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            for driver in idle:
+                self._uses.pop(id(driver), None)
+        for driver in idle:
+            self._quit_quietly(driver)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self.metrics)
+            stats.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'max_sessions': self.max_sessions
+            })
+        stats['startup_seconds'] = round(stats['startup_seconds'], 3)
+        stats['page_load_seconds'] = round(stats['page_load_seconds'], 3)
+        return stats
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_options = {}
+
+
+def configure_browser_pool(options):
+    """Thiết lập tham số browser pool từ config.json (crawler)"""
+    _pool_options.update({
+        'max_sessions': options.get('max_sessions', 1),
+        'max_uses': options.get('max_uses', 50),
+        'page_load_timeout': options.get('page_load_timeout_seconds', 30),
+        'wait_timeout': options.get('wait_timeout_seconds', 20),
+        'bulk_extraction': options.get('bulk_dom_extraction', True)
+    })
+
+
+def get_browser_pool():
+    """Browser pool dùng chung cho cả process"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = BrowserPool(**_pool_options)
+        return _pool
+
+
+@atexit.register
+def close_browser_pool():
+    if _pool is not None:
+        _pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Crawl the PNJ price table several times with one pooled browser")
+    parser.add_argument('--url', help="Page to crawl (default: local fixture data/fixtures/pnj_gia_vang.html)")
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    url = args.url or 'file:///' + FIXTURE_PATH.replace(os.sep, '/').lstrip('/')
+    pool = get_browser_pool()
+    pool.warm()
+    for run in range(1, args.runs + 1):
+        with pool.session() as driver:
+            pool.load_page(driver, url)
+            rows = pool.read_rows(driver)
+            print(f"Run {run}: {len(rows)} rows")
+    print(f"Browser pool stats: {pool.stats()}")
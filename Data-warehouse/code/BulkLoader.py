@@ -0,0 +1,282 @@
+import time
+
+
+def frame_to_rows(df, columns):
+    """Chuyển DataFrame thành list tuple kiểu Python (NaN/NaT -> None) để truyền vào executemany"""
+    subset = df[columns].astype(object)
+    subset = subset.where(subset.notna(), None)
+    return list(subset.itertuples(index=False, name=None))
+
+
+def bulk_insert(conn, sql, rows, batch_size=1000, label='rows'):
+    """Insert dữ liệu theo từng lô bằng executemany
+    - Với pyodbc: bật fast_executemany để gửi cả mảng tham số trong một round trip
+    - Với các driver DB-API khác (vd. sqlite3 khi kiểm thử local): dùng executemany thông thường
+    Trả về danh sách thống kê từng lô: batch, rows, seconds
+    """
+    cursor = conn.cursor()
+    if hasattr(cursor, 'fast_executemany'):
+        cursor.fast_executemany = True
+
+    batch_size = max(int(batch_size), 1)
+    stats = []
+    for batch_no, start in enumerate(range(0, len(rows), batch_size), 1):
+        batch = rows[start:start + batch_size]
+        started = time.perf_counter()
+        cursor.executemany(sql, batch)
+        elapsed = time.perf_counter() - started
+        stats.append({'batch': batch_no, 'rows': len(batch), 'seconds': round(elapsed, 4)})
+        print(f"Batch {batch_no}: inserted {len(batch)} {label} in {elapsed:.3f}s")
+
+    cursor.close()
+    return stats
+
+
+def drop_temp_tables(cursor, *table_names):
+    """DROP các temp table khi dọn dẹp trong finally
+    Connection / transaction đã hỏng thì DROP cũng lỗi: chỉ in lỗi ra, không che exception gốc
+    """
+    try:
+        cursor.execute(' '.join(f"DROP TABLE IF EXISTS {name};" for name in table_names))
+    except Exception as e:
+        print(f"Could not drop temp tables {', '.join(table_names)}: {str(e)}")
+
+
+def summarize_batches(stats):
+    """Tóm tắt thống kê các lô: (tổng số dòng, số lô, tổng thời gian)"""
+    total_rows = sum(s['rows'] for s in stats)
+    total_seconds = sum(s['seconds'] for s in stats)
+    return total_rows, len(stats), round(total_seconds, 3)
+
+
+# Cột tổng hợp do DataTransformer.create_aggregates sinh ra (MultiIndex columns), dùng chung với ColumnarBackend
+AGGREGATE_COLUMNS = [
+    ('BuyPrice', 'mean'), ('BuyPrice', 'min'), ('BuyPrice', 'max'),
+    ('SellPrice', 'mean'), ('SellPrice', 'min'), ('SellPrice', 'max'),
+    ('PriceDifference', 'mean')
+]
+
+
+def load_star_schema(conn, transformed_data, batch_size=1000, key_cache=None):
+    """Load date_dim, gold_type_dim và fact_table theo kiểu set-based
+    1. Đẩy từng DataFrame vào temp table của session (executemany theo lô)
+    2. Một câu MERGE cho mỗi dimension
+    3. Một câu INSERT...SELECT cho fact, tra GoldTypeKey thật ngay trong SQL
+    Số round trip tỉ lệ với số bảng, không tỉ lệ với số dòng. Không commit - caller tự commit.
+    key_cache (DimensionCache): tra key trong bộ nhớ, chỉ insert dimension còn thiếu.
+    Trả về số dòng fact đã insert
+    """
+    if key_cache is not None:
+        return key_cache.load_star_schema(conn, transformed_data, batch_size)
+
+    date_dim = transformed_data['date_dim']
+    gold_type_dim = transformed_data['gold_type_dim']
+    fact_table = transformed_data['fact_table']
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE #StageDate (
+            DateKey INT PRIMARY KEY, Date DATE, Year INT, Month INT, Day INT, Quarter INT
+        );
+        CREATE TABLE #StageGoldType (
+            GoldTypeKey INT PRIMARY KEY, GoldType NVARCHAR(255), Created_at DATETIME
+        );
+        CREATE TABLE #StageFact (
+            GoldTypeKey INT, DateKey INT,
+            BuyPrice DECIMAL(18,2), SellPrice DECIMAL(18,2),
+            PriceDifference DECIMAL(18,2), PriceDifferencePercentage DECIMAL(18,2)
+        );
+    """)
+
+    try:
+        # 1. Đẩy dữ liệu vào temp tables
+        date_rows = date_dim.drop_duplicates(subset=['DateKey']).assign(DateKey=lambda d: d['DateKey'].astype(int))
+        bulk_insert(conn, """
+            INSERT INTO #StageDate (DateKey, Date, Year, Month, Day, Quarter) VALUES (?, ?, ?, ?, ?, ?)
+        """, frame_to_rows(date_rows, ['DateKey', 'Date', 'Year', 'Month', 'Day', 'Quarter']),
+            batch_size, 'date rows')
+
+        bulk_insert(conn, """
+            INSERT INTO #StageGoldType (GoldTypeKey, GoldType, Created_at) VALUES (?, ?, ?)
+        """, frame_to_rows(gold_type_dim, ['GoldTypeKey', 'GoldType', 'Created_at']),
+            batch_size, 'gold type rows')
+
+        fact_rows = fact_table.assign(DateKey=lambda f: f['DateKey'].astype(int))
+        bulk_insert(conn, """
+            INSERT INTO #StageFact (GoldTypeKey, DateKey, BuyPrice, SellPrice,
+                                    PriceDifference, PriceDifferencePercentage)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, frame_to_rows(fact_rows, ['GoldTypeKey', 'DateKey', 'BuyPrice', 'SellPrice',
+                                       'PriceDifference', 'PriceDifferencePercentage']),
+            batch_size, 'fact rows')
+
+        # 2. MERGE dimensions
+        cursor.execute("""
+            MERGE DimDate AS target
+            USING #StageDate AS source
+            ON target.DateKey = source.DateKey
+            WHEN NOT MATCHED BY TARGET THEN
+                INSERT (DateKey, Date, Year, Month, Day, Quarter)
+                VALUES (source.DateKey, source.Date, source.Year, source.Month, source.Day, source.Quarter);
+        """)
+
+        cursor.execute("""
+            MERGE DimGoldType AS target
+            USING #StageGoldType AS source
+            ON target.GoldType = source.GoldType
+            WHEN NOT MATCHED BY TARGET THEN
+                INSERT (GoldType, Created_at)
+                VALUES (source.GoldType, source.Created_at);
+        """)
+
+        # 3. Insert fact, thay GoldTypeKey tạm của transformer bằng key thật trong DimGoldType
+        cursor.execute("""
+            INSERT INTO FactGoldPrices
+            (GoldTypeKey, DateKey, BuyPrice, SellPrice, PriceDifference, PriceDifferencePercentage)
+            SELECT g.GoldTypeKey, f.DateKey, f.BuyPrice, f.SellPrice,
+                   f.PriceDifference, f.PriceDifferencePercentage
+            FROM #StageFact f
+            JOIN #StageGoldType s ON s.GoldTypeKey = f.GoldTypeKey
+            JOIN (
+                SELECT GoldType, MIN(GoldTypeKey) AS GoldTypeKey
+                FROM DimGoldType
+                GROUP BY GoldType
+            ) g ON g.GoldType = s.GoldType;
+        """)
+        inserted = cursor.rowcount
+    finally:
+        drop_temp_tables(cursor, '#StageFact', '#StageGoldType', '#StageDate')
+        cursor.close()
+
+    return inserted
+
+
+def changed_date_keys(fact_table):
+    """Tập DateKey (int) có trong fact vừa load - dùng cho mart refresh incremental"""
+    return {int(key) for key in fact_table['DateKey'].unique()}
+
+
+def load_star_schema_chunks(conn, chunks, batch_size=1000, key_cache=None):
+    """Load lần lượt các dict của DataTransformer.transform_chunks (hoặc một dict của transform_data)
+    Mỗi chunk được load xong và bỏ đi trước khi chunk tiếp theo được transform. Không commit - caller tự commit
+    Trả về (số dòng fact, tập DateKey đã load)
+    """
+    if isinstance(chunks, dict):
+        chunks = [chunks]
+    records, date_keys = 0, set()
+    for transformed_data in chunks:
+        records += load_star_schema(conn, transformed_data, batch_size, key_cache=key_cache)
+        date_keys |= changed_date_keys(transformed_data['fact_table'])
+        del transformed_data
+    return records, date_keys
+
+
+# Procedure tính lại aggregate từ FactGoldPrices cho các DateKey thay đổi (update_procedures.sql)
+REFRESH_PROCEDURES = {'daily': 'sp_RefreshDailyMart', 'monthly': 'sp_RefreshMonthlyMart'}
+
+
+def refresh_aggregates(conn, date_keys, marts=('daily', 'monthly')):
+    """Tính lại AggDailyGoldPrices / AggMonthlyGoldPrices từ FactGoldPrices cho các DateKey / (Year, Month)
+    chứa date_keys. Dùng sau load incremental: aggregate của riêng phần mới load không đúng cho cả ngày / tháng.
+    Không commit - caller tự commit
+    """
+    if not date_keys:
+        return
+    keys = ','.join(str(key) for key in sorted(date_keys))
+    cursor = conn.cursor()
+    try:
+        for mart in marts:
+            cursor.execute(f"EXEC {REFRESH_PROCEDURES[mart]} ?", keys)
+    finally:
+        cursor.close()
+
+
+def merge_aggregates(conn, daily_agg, monthly_agg, batch_size=1000):
+    """MERGE daily_agg / monthly_agg của transformer vào AggDailyGoldPrices / AggMonthlyGoldPrices
+    qua temp table, mỗi bảng một câu MERGE. Không commit - caller tự commit
+    Dòng đã có bị ghi đè: aggregate phải được tính trên toàn bộ fact của các ngày / tháng đó,
+    load incremental thì dùng refresh_aggregates
+    """
+    daily_rows = list(zip(
+        [int(key) for key in daily_agg.index],
+        *[daily_agg[col].tolist() for col in AGGREGATE_COLUMNS]
+    ))
+    monthly_rows = list(zip(
+        [int(year) for year, _ in monthly_agg.index],
+        [int(month) for _, month in monthly_agg.index],
+        *[monthly_agg[col].tolist() for col in AGGREGATE_COLUMNS]
+    ))
+
+    cursor = conn.cursor()
+    cursor.execute("""
+        CREATE TABLE #StageDailyAgg (
+            DateKey INT PRIMARY KEY,
+            AvgBuyPrice DECIMAL(18,2), MinBuyPrice DECIMAL(18,2), MaxBuyPrice DECIMAL(18,2),
+            AvgSellPrice DECIMAL(18,2), MinSellPrice DECIMAL(18,2), MaxSellPrice DECIMAL(18,2),
+            AvgPriceDifference DECIMAL(18,2)
+        );
+        CREATE TABLE #StageMonthlyAgg (
+            Year INT, Month INT,
+            AvgBuyPrice DECIMAL(18,2), MinBuyPrice DECIMAL(18,2), MaxBuyPrice DECIMAL(18,2),
+            AvgSellPrice DECIMAL(18,2), MinSellPrice DECIMAL(18,2), MaxSellPrice DECIMAL(18,2),
+            AvgPriceDifference DECIMAL(18,2),
+            PRIMARY KEY (Year, Month)
+        );
+    """)
+
+    try:
+        bulk_insert(conn, """
+            INSERT INTO #StageDailyAgg (DateKey, AvgBuyPrice, MinBuyPrice, MaxBuyPrice,
+                                        AvgSellPrice, MinSellPrice, MaxSellPrice, AvgPriceDifference)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """, daily_rows, batch_size, 'daily aggregate rows')
+
+        bulk_insert(conn, """
+            INSERT INTO #StageMonthlyAgg (Year, Month, AvgBuyPrice, MinBuyPrice, MaxBuyPrice,
+                                          AvgSellPrice, MinSellPrice, MaxSellPrice, AvgPriceDifference)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, monthly_rows, batch_size, 'monthly aggregate rows')
+
+        cursor.execute("""
+            MERGE INTO AggDailyGoldPrices AS target
+            USING #StageDailyAgg AS source
+            ON target.DateKey = source.DateKey
+            WHEN MATCHED THEN
+                UPDATE SET
+                    AvgBuyPrice = source.AvgBuyPrice,
+                    MinBuyPrice = source.MinBuyPrice,
+                    MaxBuyPrice = source.MaxBuyPrice,
+                    AvgSellPrice = source.AvgSellPrice,
+                    MinSellPrice = source.MinSellPrice,
+                    MaxSellPrice = source.MaxSellPrice,
+                    AvgPriceDifference = source.AvgPriceDifference
+            WHEN NOT MATCHED THEN
+                INSERT (DateKey, AvgBuyPrice, MinBuyPrice, MaxBuyPrice,
+                        AvgSellPrice, MinSellPrice, MaxSellPrice, AvgPriceDifference)
+                VALUES (source.DateKey, source.AvgBuyPrice, source.MinBuyPrice, source.MaxBuyPrice,
+                        source.AvgSellPrice, source.MinSellPrice, source.MaxSellPrice, source.AvgPriceDifference);
+        """)
+
+        cursor.execute("""
+            MERGE INTO AggMonthlyGoldPrices AS target
+            USING #StageMonthlyAgg AS source
+            ON target.Year = source.Year AND target.Month = source.Month
+            WHEN MATCHED THEN
+                UPDATE SET
+                    AvgBuyPrice = source.AvgBuyPrice,
+                    MinBuyPrice = source.MinBuyPrice,
+                    MaxBuyPrice = source.MaxBuyPrice,
+                    AvgSellPrice = source.AvgSellPrice,
+                    MinSellPrice = source.MinSellPrice,
+                    MaxSellPrice = source.MaxSellPrice,
+                    AvgPriceDifference = source.AvgPriceDifference
+            WHEN NOT MATCHED THEN
+                INSERT (Year, Month, AvgBuyPrice, MinBuyPrice, MaxBuyPrice,
+                        AvgSellPrice, MinSellPrice, MaxSellPrice, AvgPriceDifference)
+                VALUES (source.Year, source.Month, source.AvgBuyPrice, source.MinBuyPrice,
+                        source.MaxBuyPrice, source.AvgSellPrice, source.MinSellPrice,
+                        source.MaxSellPrice, source.AvgPriceDifference);
+        """)
+    finally:
+        drop_temp_tables(cursor, '#StageDailyAgg', '#StageMonthlyAgg')
+        cursor.close()
@@ -0,0 +1,103 @@
+import argparse
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from BulkLoader import bulk_insert, drop_temp_tables, frame_to_rows
+
+DATE_DIM_COLUMNS = ['DateKey', 'Date', 'Year', 'Month', 'Day', 'Quarter']
+
+# Năm đầu tiên có dữ liệu giá vàng (data/gold_price.csv bắt đầu từ 06/2014)
+DEFAULT_START_YEAR = 2014
+
+
+def date_keys(values):
+    """DateKey yyyymmdd (int32, vừa cột INT) cho cột / mảng datetime, tính bằng phép toán số nguyên"""
+    values = pd.DatetimeIndex(values)
+    return (values.year * 10000 + values.month * 100 + values.day).to_numpy(dtype='int32')
+
+
+def date_rows(keys):
+    """Các dòng DimDate (DateKey, Date, Year, Month, Day, Quarter) cho mảng DateKey int"""
+    keys = np.asarray(keys, dtype='int32')
+    year, month, day = keys // 10000, keys // 100 % 100, keys % 100
+    return pd.DataFrame({
+        'DateKey': keys,
+        'Date': pd.to_datetime(pd.DataFrame({'year': year, 'month': month, 'day': day})).dt.date,
+        'Year': year,
+        'Month': month,
+        'Day': day,
+        'Quarter': (month - 1) // 3 + 1
+    })
+
+
+def calendar_dim(start_year, end_year):
+    """Toàn bộ các ngày từ 01/01/start_year đến 31/12/end_year dưới dạng DimDate"""
+    if end_year < start_year:
+        raise ValueError(f"end_year {end_year} is before start_year {start_year}")
+    days = pd.date_range(f'{start_year}-01-01', f'{end_year}-12-31', freq='D')
+    return date_rows(date_keys(days))
+
+
+def calendar_years(calendar_config):
+    """(start_year, end_year) từ etl.calendar; end_year mặc định là năm sau năm hiện tại"""
+    start_year = calendar_config.get('start_year') or DEFAULT_START_YEAR
+    end_year = calendar_config.get('end_year') or datetime.now().year + 1
+    return int(start_year), int(end_year)
+
+
+def populate_dim_date(conn, start_year, end_year, batch_size=1000):
+    """Điền sẵn DimDate cho các năm start_year..end_year, trả về số ngày mới
+    Dùng sp_PopulateDimDate (update_procedures.sql); database chưa có procedure thì sinh lịch
+    bằng calendar_dim và insert qua temp table. Không commit - caller tự commit
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT OBJECT_ID('sp_PopulateDimDate')")
+    if cursor.fetchone()[0] is not None:
+        cursor.execute("EXEC sp_PopulateDimDate ?, ?", start_year, end_year)
+        inserted = cursor.fetchone()[0]
+    else:
+        cursor.execute("CREATE TABLE #Calendar (DateKey INT PRIMARY KEY, Date DATE, Year INT, Month INT, Day INT, Quarter INT)")
+        try:
+            bulk_insert(conn, """
+                INSERT INTO #Calendar (DateKey, Date, Year, Month, Day, Quarter) VALUES (?, ?, ?, ?, ?, ?)
+            """, frame_to_rows(calendar_dim(start_year, end_year), DATE_DIM_COLUMNS), batch_size, 'calendar days')
+            cursor.execute("""
+                INSERT INTO DimDate (DateKey, Date, Year, Month, Day, Quarter)
+                SELECT c.DateKey, c.Date, c.Year, c.Month, c.Day, c.Quarter
+                FROM #Calendar c
+                WHERE NOT EXISTS (SELECT 1 FROM DimDate d WHERE d.DateKey = c.DateKey)
+            """)
+            inserted = cursor.rowcount
+        finally:
+            drop_temp_tables(cursor, '#Calendar')
+    cursor.close()
+    print(f"DimDate populated for {start_year}-{end_year}: {inserted} new days")
+    return inserted
+
+
+if __name__ == "__main__":
+    import pyodbc
+
+    parser = argparse.ArgumentParser(description="Pre-populate DimDate for a range of years")
+    parser.add_argument('--start-year', type=int, help="Default: etl.calendar.start_year")
+    parser.add_argument('--end-year', type=int, help="Default: etl.calendar.end_year (next year)")
+    args = parser.parse_args()
+
+    config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
+    with open(config_path, 'r') as f:
+        config = json.load(f)
+    start_year, end_year = calendar_years(config.get('etl', {}).get('calendar', {}))
+    db_config = config['database']
+    conn = pyodbc.connect(
+        f"DRIVER={{{db_config['driver']}}};"
+        f"SERVER={db_config['server']};"
+        "DATABASE=warehouse_db;"
+        "Trusted_Connection=yes;"
+    )
+    try:
+        populate_dim_date(conn, args.start_year or start_year, args.end_year or end_year)
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+import pandas as pd
+from ConnectionPool import pooled_connection
+
+# Trạng thái Job_Status cho job không chạy vì dữ liệu nguồn không đổi
+SKIPPED = 'SKIPPED'
+
+FINGERPRINT_COLUMNS = ['GoldType', 'BuyPrice', 'SellPrice']
+
+
+def price_fingerprint(records):
+    """SHA-256 của bảng giá (GoldType, BuyPrice, SellPrice), không phụ thuộc thứ tự dòng và UpdateTime
+    records: list dict hoặc DataFrame có các cột GoldType, BuyPrice, SellPrice
+    """
+    df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(list(records), columns=FINGERPRINT_COLUMNS)
+    lines = sorted(
+        f"{str(gold_type).strip()}|{float(buy_price):.2f}|{float(sell_price):.2f}"
+        for gold_type, buy_price, sell_price in df[FINGERPRINT_COLUMNS].itertuples(index=False, name=None)
+    )
+    return hashlib.sha256('\n'.join(lines).encode('utf-8')).hexdigest()
+
+
+def file_fingerprint(path, block_size=2**20):
+    """SHA-256 nội dung file nguồn (CSV / Excel), đọc theo từng khối block_size byte"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SnapshotStore:
+    """Lưu fingerprint snapshot đã load gần nhất của từng nguồn vào file JSON
+    {source: {fingerprint, records, staging_path, captured_at}}
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def last(self, source):
+        """Snapshot gần nhất của source, None nếu chưa có"""
+        with self._lock:
+            return self._read().get(source)
+
+    def is_unchanged(self, source, fingerprint):
+        snapshot = self.last(source)
+        return snapshot is not None and snapshot.get('fingerprint') == fingerprint
+
+    def save(self, source, fingerprint, records=0, staging_path=None):
+        """Ghi snapshot mới của source (ghi file tạm rồi replace để không hỏng file khi lỗi giữa chừng)"""
+        with self._lock:
+            snapshots = self._read()
+            snapshots[source] = {
+                'fingerprint': fingerprint,
+                'records': records,
+                'staging_path': staging_path,
+                'captured_at': datetime.now().isoformat(timespec='seconds')
+            }
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshots, f, ensure_ascii=False, indent=4)
+            os.replace(tmp_path, self.path)
+
+
+def record_skipped_job(control_conn_str, job_name, reason):
+    """Ghi một dòng Job_Status 'SKIPPED' (lý do lưu ở error_message), trả về (job_id, status_id)"""
+    with pooled_connection(control_conn_str) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT job_id FROM ETL_Jobs WHERE job_name = ?", job_name)
+        job_id = cursor.fetchone()[0]
+        cursor.execute("""
+            INSERT INTO Job_Status (job_id, status, end_time, records_processed, error_message)
+            VALUES (?, ?, GETDATE(), 0, ?)
+        """, job_id, SKIPPED, reason)
+        status_id = cursor.execute("SELECT @@IDENTITY").fetchone()[0]
+        conn.commit()
+    return job_id, status_id
@@ -0,0 +1,115 @@
+import importlib
+import pandas as pd
+from BulkLoader import AGGREGATE_COLUMNS
+
+# Engine tính derived fields, DateKey và aggregate cho DataTransformer (chế độ lean)
+# polars / duckdb là dependency tùy chọn, chưa cài thì dùng pandas
+BACKENDS = ('pandas', 'polars', 'duckdb')
+
+DERIVED_COLUMNS = ['BuyPrice', 'SellPrice', 'PriceDifference', 'PriceDifferencePercentage', 'DateKey']
+
+
+def available_backend(backend):
+    """backend nếu thư viện đã được cài, ngược lại 'pandas'"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unsupported transform backend: {backend}")
+    if backend == 'pandas':
+        return backend
+    try:
+        importlib.import_module(backend)
+    except ImportError:
+        print(f"{backend} is not installed, transforming with pandas instead")
+        return 'pandas'
+    return backend
+
+
+def _aggregate_frame(flat, index_columns):
+    """Kết quả group by dạng cột phẳng (BuyPrice_mean, ...) -> cùng dạng với create_aggregates
+    (cột MultiIndex, index DateKey hoặc (Year, Month), làm tròn 2 chữ số)"""
+    result = pd.DataFrame(
+        {(col, stat): flat[f'{col}_{stat}'].to_numpy(dtype='float64') for col, stat in AGGREGATE_COLUMNS},
+        index=pd.MultiIndex.from_frame(flat[index_columns].astype('int32')) if len(index_columns) > 1
+        else pd.Index(flat[index_columns[0]].astype('int32'), name=index_columns[0])
+    )
+    return result.round(2)
+
+
+def transform_polars(df):
+    """Derived fields + DateKey + daily / monthly aggregate bằng Polars (đa luồng)
+    df: BuyPrice / SellPrice float64 không NaN, UpdateTime datetime64
+    Trả về (DataFrame DERIVED_COLUMNS cùng thứ tự dòng với df, daily_agg, monthly_agg)
+    """
+    import polars as pl
+
+    def rounded(expr):
+        # half_to_even: cho cùng kết quả với np.round(x, 2)
+        return expr.round(2, mode='half_to_even')
+
+    frame = pl.from_pandas(df[['BuyPrice', 'SellPrice', 'UpdateTime']])
+    difference = pl.col('SellPrice') - pl.col('BuyPrice')
+    derived = frame.select(
+        rounded(pl.col('BuyPrice')).alias('BuyPrice'),
+        rounded(pl.col('SellPrice')).alias('SellPrice'),
+        rounded(difference).alias('PriceDifference'),
+        rounded(difference / pl.col('BuyPrice') * 100).alias('PriceDifferencePercentage'),
+        (pl.col('UpdateTime').dt.year() * 10000 + pl.col('UpdateTime').dt.month().cast(pl.Int32) * 100
+         + pl.col('UpdateTime').dt.day().cast(pl.Int32)).cast(pl.Int32).alias('DateKey')
+    )
+
+    statistics = [getattr(pl.col(col), stat)().alias(f'{col}_{stat}') for col, stat in AGGREGATE_COLUMNS]
+    daily = derived.group_by('DateKey').agg(statistics).sort('DateKey')
+    monthly = derived.with_columns(
+        (pl.col('DateKey') // 10000).alias('Year'),
+        (pl.col('DateKey') // 100 % 100).alias('Month')
+    ).group_by('Year', 'Month').agg(statistics).sort('Year', 'Month')
+
+    return (derived.to_pandas(),
+            _aggregate_frame(daily.to_pandas(), ['DateKey']),
+            _aggregate_frame(monthly.to_pandas(), ['Year', 'Month']))
+
+
+def transform_duckdb(df):
+    """Như transform_polars nhưng bằng DuckDB (đa luồng, đọc thẳng DataFrame pandas)"""
+    import duckdb
+
+    conn = duckdb.connect()
+    try:
+        conn.register('source_rows', df[['BuyPrice', 'SellPrice', 'UpdateTime']])
+        # round_even(x * 100, 0) / 100 giống np.round(x, 2); chia cho 0 trả inf / NaN như numpy thay vì NULL
+        conn.execute("""
+            CREATE TEMP TABLE derived AS
+            SELECT round_even(BuyPrice * 100, 0) / 100 AS BuyPrice,
+                   round_even(SellPrice * 100, 0) / 100 AS SellPrice,
+                   round_even((SellPrice - BuyPrice) * 100, 0) / 100 AS PriceDifference,
+                   CASE WHEN BuyPrice <> 0 THEN round_even((SellPrice - BuyPrice) / BuyPrice * 100 * 100, 0) / 100
+                        WHEN SellPrice > BuyPrice THEN 'inf'::DOUBLE
+                        WHEN SellPrice < BuyPrice THEN '-inf'::DOUBLE
+                        ELSE 'nan'::DOUBLE END AS PriceDifferencePercentage,
+                   CAST(year(UpdateTime) * 10000 + month(UpdateTime) * 100 + day(UpdateTime) AS INTEGER) AS DateKey
+            FROM source_rows
+        """)
+        statistics = ', '.join(f'{stat.replace("mean", "avg")}({col}) AS {col}_{stat}' for col, stat in AGGREGATE_COLUMNS)
+        # preserve_insertion_order (mặc định bật): thứ tự dòng giữ nguyên như df
+        derived = conn.execute("SELECT * FROM derived").df()
+        daily = conn.execute(f"SELECT DateKey, {statistics} FROM derived GROUP BY DateKey ORDER BY DateKey").df()
+        monthly = conn.execute(f"""
+            SELECT DateKey // 10000 AS Year, DateKey // 100 % 100 AS Month, {statistics}
+            FROM derived
+            GROUP BY Year, Month
+            ORDER BY Year, Month
+        """).df()
+    finally:
+        conn.close()
+
+    return (derived,
+            _aggregate_frame(daily, ['DateKey']),
+            _aggregate_frame(monthly, ['Year', 'Month']))
+
+
+def run_backend(backend, df):
+    """Chạy phần derive / aggregate của transform trên backend ('polars' hoặc 'duckdb')"""
+    if backend == 'polars':
+        return transform_polars(df)
+    if backend == 'duckdb':
+        return transform_duckdb(df)
+    raise ValueError(f"No columnar engine for backend: {backend}")
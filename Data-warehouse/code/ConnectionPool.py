@@ -0,0 +1,224 @@
+import atexit
+import re
+import threading
+import time
+from contextlib import contextmanager
+import pyodbc
+
+
+class PoolExhaustedError(Exception):
+    """Không lấy được connection trong thời gian checkout_timeout"""
+
+
+class ConnectionPool:
+    """Pool connection pyodbc cho một database
+    - Giới hạn số connection tối đa (max_size), caller phải chờ khi pool đã đầy
+    - Health check (SELECT 1) cho connection idle lâu hơn health_check_interval
+    - Đóng các connection idle lâu hơn idle_timeout
+    - Metrics: checkouts, waits, wait_seconds, creations, evictions, health_check_failures, timeouts
+    """
+
+    def __init__(self, connection_string, max_size=5, idle_timeout=300,
+                 health_check_interval=30, checkout_timeout=30):
+        self.connection_string = connection_string
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.checkout_timeout = checkout_timeout
+
+        self._idle = []  # [(connection, last_used)]
+        self._size = 0
+        self._cond = threading.Condition()
+        self.metrics = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds': 0.0,
+            'creations': 0,
+            'evictions': 0,
+            'health_check_failures': 0,
+            'timeouts': 0
+        }
+
+    def _evict_idle(self):
+        """Đóng các connection idle quá idle_timeout (gọi khi đang giữ lock)"""
+        now = time.monotonic()
+        keep = []
+        for conn, last_used in self._idle:
+            if now - last_used > self.idle_timeout:
+                self._close_quietly(conn)
+                self._size -= 1
+                self.metrics['evictions'] += 1
+            else:
+                keep.append((conn, last_used))
+        self._idle = keep
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    @staticmethod
+    def _is_healthy(conn):
+        try:
+            conn.cursor().execute("SELECT 1").fetchone()
+            return True
+        except Exception:
+            return False
+
+    def acquire(self):
+        """Lấy một connection từ pool (tạo mới nếu pool chưa đầy)"""
+        deadline = time.monotonic() + self.checkout_timeout
+        wait_started = None
+        conn, last_used = None, None
+
+        with self._cond:
+            self.metrics['checkouts'] += 1
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+
+                now = time.monotonic()
+                if wait_started is None:
+                    wait_started = now
+                    self.metrics['waits'] += 1
+                if now >= deadline:
+                    self.metrics['timeouts'] += 1
+                    self.metrics['wait_seconds'] += now - wait_started
+                    raise PoolExhaustedError(
+                        f"No connection available after {self.checkout_timeout}s (max_size={self.max_size})")
+                self._cond.wait(deadline - now)
+
+            if wait_started is not None:
+                self.metrics['wait_seconds'] += time.monotonic() - wait_started
+
+        # Health check connection đã idle lâu
+        if conn is not None and time.monotonic() - last_used > self.health_check_interval:
+            if not self._is_healthy(conn):
+                self._close_quietly(conn)
+                conn = None
+                with self._cond:
+                    self.metrics['health_check_failures'] += 1
+
+        if conn is None:
+            try:
+                conn = pyodbc.connect(self.connection_string)
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self.metrics['creations'] += 1
+
+        return conn
+
+    def release(self, conn, discard=False):
+        """Trả connection về pool; discard=True đóng hẳn connection (vd. khi connection lỗi)"""
+        with self._cond:
+            if discard:
+                self._close_quietly(conn)
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        """Context manager: with pool.connection() as conn: ... (caller tự commit)
+        Phần caller chưa commit (kể cả transaction ngầm của câu SELECT) bị rollback trước khi trả về pool,
+        không để lại cho lần mượn sau; rollback lỗi thì đóng hẳn connection
+        """
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            try:
+                conn.rollback()
+                discard = False
+            except Exception:
+                discard = True
+            self.release(conn, discard=discard)
+
+    def close(self):
+        """Đóng toàn bộ connection idle"""
+        with self._cond:
+            for conn, _ in self._idle:
+                self._close_quietly(conn)
+            self._size -= len(self._idle)
+            self._idle = []
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self.metrics)
+            stats.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size
+            })
+            return stats
+
+
+# Registry các pool theo tên database (control_db / staging_db / warehouse_db)
+_pools = {}
+_pools_lock = threading.Lock()
+_pool_options = {}
+
+
+def configure_pools(options):
+    """Thiết lập tham số pool từ config.json (database.pool)"""
+    _pool_options.update({
+        'max_size': options.get('max_size', 5),
+        'idle_timeout': options.get('idle_timeout_seconds', 300),
+        'health_check_interval': options.get('health_check_interval_seconds', 30),
+        'checkout_timeout': options.get('checkout_timeout_seconds', 30)
+    })
+
+
+def database_name(connection_string):
+    """Lấy tên database từ connection string (DATABASE=...)"""
+    match = re.search(r'DATABASE=([^;]+)', connection_string, re.IGNORECASE)
+    return match.group(1) if match else connection_string
+
+
+def get_pool(connection_string):
+    """Lấy (hoặc tạo) pool cho database của connection string"""
+    key = database_name(connection_string)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None or pool.connection_string != connection_string:
+            if pool is not None:
+                # Cùng tên database nhưng khác server/driver: tách pool riêng
+                key = connection_string
+                pool = _pools.get(key)
+            if pool is None:
+                pool = ConnectionPool(connection_string, **_pool_options)
+                _pools[key] = pool
+        return pool
+
+
+def pooled_connection(connection_string):
+    """Shortcut: with pooled_connection(conn_str) as conn: ..."""
+    return get_pool(connection_string).connection()
+
+
+def pool_stats():
+    """Metrics của tất cả các pool theo tên database"""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {key: pool.stats() for key, pool in pools.items()}
+
+
+@atexit.register
+def close_all_pools():
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
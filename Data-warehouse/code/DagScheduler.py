@@ -0,0 +1,151 @@
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from ConnectionPool import pooled_connection
+
+
+class DependencyCycleError(Exception):
+    """Job_Dependencies có chu trình, không sắp xếp topo được"""
+
+
+def load_job_graph(control_conn_str):
+    """Đọc ETL_Jobs (đang active) và Job_Dependencies từ control_db
+    Trả về dict job_name -> set(job_name upstream); dependency tới job không active bị bỏ qua
+    """
+    with pooled_connection(control_conn_str) as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT job_id, job_name FROM ETL_Jobs WHERE is_active = 1")
+        jobs = {job_id: job_name for job_id, job_name in cursor.fetchall()}
+        cursor.execute("SELECT job_id, depends_on FROM Job_Dependencies")
+        edges = cursor.fetchall()
+
+    graph = {job_name: set() for job_name in jobs.values()}
+    for job_id, depends_on in edges:
+        if job_id in jobs and depends_on in jobs:
+            graph[jobs[job_id]].add(jobs[depends_on])
+    return graph
+
+
+def topological_order(graph):
+    """Sắp xếp topo (thuật toán Kahn), job cùng cấp giữ thứ tự tên để kết quả ổn định"""
+    remaining = {job: set(upstream) & graph.keys() for job, upstream in graph.items()}
+    downstream = {job: set() for job in graph}
+    for job, upstream in remaining.items():
+        for parent in upstream:
+            downstream[parent].add(job)
+
+    ready = deque(sorted(job for job, upstream in remaining.items() if not upstream))
+    order = []
+    while ready:
+        job = ready.popleft()
+        order.append(job)
+        for child in sorted(downstream[job]):
+            remaining[child].discard(job)
+            if not remaining[child]:
+                ready.append(child)
+
+    if len(order) != len(graph):
+        cycle = sorted(job for job in graph if job not in order)
+        raise DependencyCycleError(f"Dependency cycle between jobs: {cycle}")
+    return order
+
+
+def root_jobs(graph):
+    """Các job không có upstream"""
+    return sorted(job for job, upstream in graph.items() if not upstream)
+
+
+def downstream_closure(graph, jobs):
+    """Tập job gồm các job cho trước và toàn bộ job phía sau chúng"""
+    downstream = {job: set() for job in graph}
+    for job, upstream in graph.items():
+        for parent in upstream:
+            if parent in downstream:
+                downstream[parent].add(job)
+
+    selected = set()
+    pending = list(jobs)
+    while pending:
+        job = pending.pop()
+        if job in selected or job not in graph:
+            continue
+        selected.add(job)
+        pending.extend(downstream[job])
+    return selected
+
+
+class DagExecutor:
+    """Chạy các job theo đồ thị phụ thuộc
+    - Job sẵn sàng (mọi upstream đã xong) được chạy song song, tối đa max_workers job cùng lúc
+    - Job downstream được submit ngay khi upstream cuối cùng hoàn thành
+    - Job lỗi: các job phía sau bị bỏ qua (skipped); riêng các job trong partial_jobs
+      vẫn chạy nếu còn ít nhất một upstream thành công (vd. load_staging khi một nguồn extract lỗi)
+    - Chạy một phần đồ thị (jobs=...): upstream nằm ngoài lần chạy được coi là đã thỏa mãn
+    job_runner(job_name, upstream_results) trả về kết quả của job, truyền cho các job phía sau
+    """
+
+    def __init__(self, graph, job_runner, max_workers=4, partial_jobs=()):
+        self.graph = graph
+        self.job_runner = job_runner
+        self.max_workers = max(int(max_workers), 1)
+        self.partial_jobs = set(partial_jobs)
+        # Kiểm tra chu trình ngay khi khởi tạo
+        self.order = topological_order(graph)
+
+    def run(self, jobs=None):
+        """Chạy toàn bộ đồ thị hoặc tập job cho trước
+        Trả về dict: succeeded {job: result}, failed {job: error}, skipped [job], seconds {job: thời gian chạy}
+        """
+        selected = set(self.graph) if jobs is None else set(jobs) & set(self.graph)
+        waiting = {job: set(self.graph[job]) & selected for job in self.order if job in selected}
+        upstream_in_run = {job: set(upstream) for job, upstream in waiting.items()}
+
+        succeeded, failed, skipped, seconds = {}, {}, [], {}
+        started_at = {}
+
+        def can_run(job):
+            upstream = upstream_in_run[job]
+            if all(parent in succeeded for parent in upstream):
+                return True
+            return job in self.partial_jobs and any(parent in succeeded for parent in upstream)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = {}
+
+            def release(job):
+                for pending in waiting.values():
+                    pending.discard(job)
+
+            def submit_ready():
+                # Lặp lại vì job bị skip có thể làm các job phía sau sẵn sàng (để skip tiếp)
+                ready = [job for job, pending in waiting.items() if not pending]
+                while ready:
+                    for job in ready:
+                        del waiting[job]
+                        if not can_run(job):
+                            print(f"Skipping {job}: upstream job(s) did not succeed")
+                            skipped.append(job)
+                            release(job)
+                            continue
+                        upstream_results = {parent: succeeded[parent]
+                                            for parent in upstream_in_run[job] if parent in succeeded}
+                        print(f"Starting job {job}")
+                        started_at[job] = time.perf_counter()
+                        running[executor.submit(self.job_runner, job, upstream_results)] = job
+                    ready = [job for job, pending in waiting.items() if not pending]
+
+            submit_ready()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = running.pop(future)
+                    seconds[job] = round(time.perf_counter() - started_at[job], 3)
+                    try:
+                        succeeded[job] = future.result()
+                        print(f"Job {job} succeeded in {seconds[job]}s")
+                    except Exception as e:
+                        failed[job] = str(e)
+                        print(f"Job {job} failed after {seconds[job]}s: {str(e)}")
+                    release(job)
+                submit_ready()
+        return {'succeeded': succeeded, 'failed': failed, 'skipped': skipped, 'seconds': seconds}
@@ -1,135 +1,248 @@
 import pandas as pd
-import json
-import requests
-from selenium import webdriver
-from selenium.webdriver.common.by import By
 import os
+import time
 from datetime import datetime
 from Loging import create_log
+from StagingFormat import write_staging, gold_type_category, JSON_TIME_FORMAT
+from BrowserPool import get_browser_pool, PNJ_URL, PRICE_ROW_SELECTOR
+from PnjParser import fetch_price_rows
+from ChangeDetector import SnapshotStore, file_fingerprint, price_fingerprint
+from TimestampParser import parse_timestamps, format_timestamps
 
 class DataExtractor:
-    def __init__(self, output_dir='data'):
+    def __init__(self, output_dir='data', staging_format='json', crawl_mode='auto', http_timeout=10,
+                 skip_unchanged=True):
         self.output_dir = output_dir
+        # Định dạng file staging: 'json', 'parquet' hoặc 'arrow'
+        self.staging_format = staging_format
+        # Cách crawl PNJ: 'auto' (HTTP, lỗi thì dùng browser), 'http' hoặc 'browser'
+        self.crawl_mode = crawl_mode
+        self.http_timeout = http_timeout
         self.timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         
         if not os.path.exists(output_dir):
             os.makedirs(output_dir)
 
-    def extract_from_pnj(self, connection_string=None):
+        # Bỏ qua bảng giá crawl giống hệt snapshot đã load gần nhất (không ghi staging)
+        self.skip_unchanged = skip_unchanged
+        self.snapshots = SnapshotStore(os.path.join(output_dir, 'snapshots', 'price_snapshots.json'))
+        # Fingerprint đã extract nhưng chưa load xong warehouse: source -> (fingerprint, records, staging_path)
+        self.pending_snapshots = {}
+
+        # Các dòng bị loại ở lần extract gần nhất (type, buy, sell, update, reason)
+        self.last_rejected = pd.DataFrame(columns=['type', 'buy', 'sell', 'update', 'reason'])
+
+    def standardize_frame(self, df, source=None):
+        """Chuẩn hóa DataFrame nguồn (cột type, buy, sell, update) theo từng cột
+        source: tên nguồn để cache định dạng thời gian đã nhận ra
+        Trả về (DataFrame đã chuẩn hóa, DataFrame các dòng bị loại kèm lý do)
+        """
+        # Clean gold type: categorical, strip trên từ điển tên loại vàng
+        gold_type = gold_type_category(df['type'])
+
+        # Clean prices: bỏ dấu phẩy và ép kiểu float cho cả cột
+        buy_price = pd.to_numeric(
+            df['buy'].astype(str).str.replace(',', '', regex=False).str.strip(), errors='coerce')
+        sell_price = pd.to_numeric(
+            df['sell'].astype(str).str.replace(',', '', regex=False).str.strip(), errors='coerce')
+
+        # Clean date: mỗi giá trị khác nhau parse một lần, định dạng nhận ra được cache theo nguồn
+        update_time = parse_timestamps(df['update'], source)
+
+        # Gán lý do loại theo đúng thứ tự kiểm tra
+        reason = pd.Series(None, index=df.index, dtype=object)
+        checks = [
+            ('empty_gold_type', gold_type.isna() | (gold_type == '')),
+            ('invalid_price', buy_price.isna() | sell_price.isna()),
+            ('negative_price', (buy_price < 0) | (sell_price < 0)),
+            ('invalid_date', update_time.isna()),
+        ]
+        for label, mask in checks:
+            reason = reason.mask(reason.isna() & mask, label)
+
+        valid = reason.isna()
+        rejected_df = df.loc[~valid, ['type', 'buy', 'sell', 'update']].assign(reason=reason[~valid])
+
+        clean_df = pd.DataFrame({
+            'GoldType': gold_type[valid].cat.remove_unused_categories(),
+            'BuyPrice': buy_price[valid].astype(float),
+            'SellPrice': sell_price[valid].astype(float),
+            'UpdateTime': format_timestamps(update_time[valid], JSON_TIME_FORMAT)
+        })
+        return clean_df, rejected_df
+
+    def save_rejected_report(self, rejected_df, source_name, report_path=None):
+        """Ghi các dòng bị loại ra file báo cáo thay vì in từng dòng
+        report_path: ghi nối vào báo cáo có sẵn (dùng khi đọc file theo chunk)
+        """
+        self.last_rejected = rejected_df
+        if rejected_df.empty:
+            return report_path
+
+        summary = ', '.join(f"{reason}: {count}" for reason, count in rejected_df['reason'].value_counts().items())
+        print(f"Warning: Rejected {len(rejected_df)} rows ({summary})")
+
+        if report_path is None:
+            reject_dir = os.path.join(self.output_dir, 'rejected')
+            if not os.path.exists(reject_dir):
+                os.makedirs(reject_dir)
+
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            report_path = os.path.join(reject_dir, f'rejected_{source_name}_{timestamp}.csv')
+        append = os.path.exists(report_path)
+        rejected_df.to_csv(report_path, mode='a' if append else 'w', header=not append,
+                           index=True, index_label='row', encoding='utf-8')
+        print(f"Rejected rows report saved to: {report_path}")
+        return report_path
+
+    def _save_staging(self, df, source_name, timestamp=None):
+        """Lưu DataFrame đã chuẩn hóa vào staging area theo staging_format, trả về đường dẫn file"""
+        staging_dir = os.path.join(self.output_dir, 'staging')
+        staging_path = write_staging(df, staging_dir, source_name, self.staging_format, timestamp)
+        print(f"Successfully extracted {len(df)} records")
+        print(f"Staging data saved to: {staging_path}")
+        return staging_path
+
+    def _build_pnj_records(self, rows):
+        """Validate các dòng bảng giá (list text các ô) và tạo record chuẩn
+        Dùng chung cho cả đường HTTP và đường browser
+        """
+        transformed_data = []
+        update_time = datetime.now().strftime('%d/%m/%Y %H:%M:%S')
+        for columns in rows:
+            try:
+                # 2.1. Chỉ lấy dòng đủ 3 cột
+                if len(columns) != 3:
+                    continue
+
+                # 2.2. Clean and validate data
+                gold_type = columns[0].strip()
+                if not gold_type:
+                    print("Warning: Empty gold type")
+                    continue
+
+                try:
+                    buy_price = float(columns[1].strip().replace(',', ''))
+                    sell_price = float(columns[2].strip().replace(',', ''))
+
+                    if buy_price < 0 or sell_price < 0:
+                        print(f"Warning: Negative price found - Buy: {buy_price}, Sell: {sell_price}")
+                        continue
+                except ValueError:
+                    print(f"Warning: Invalid price format for {gold_type}")
+                    continue
+
+                # 2.3. Create standardized record
+                transformed_data.append({
+                    "GoldType": gold_type,
+                    "BuyPrice": buy_price,
+                    "SellPrice": sell_price,
+                    "UpdateTime": update_time
+                })
+            except Exception as row_error:
+                print(f"Error processing row: {str(row_error)}")
+                continue
+        return transformed_data
+
+    def _is_unchanged_file(self, source, fingerprint, input_file, log_name, function_name, connection_string=None):
+        """File nguồn giống hệt snapshot đã load gần nhất (skip_unchanged): ghi log và trả về True"""
+        if not (self.skip_unchanged and self.snapshots.is_unchanged(source, fingerprint)):
+            return False
+        print(f"{input_file} unchanged since last snapshot ({fingerprint[:12]}), skipping staging")
+        if connection_string:
+            create_log(log_name, f"File unchanged, fingerprint {fingerprint}", function_name, "INFO",
+                       input_file, connection_string)
+        return True
+
+    def commit_snapshots(self):
+        """Ghi các fingerprint đang chờ thành snapshot sau khi dữ liệu đã load xong vào warehouse
+        (load lỗi thì snapshot cũ giữ nguyên, lần crawl sau vẫn load lại)
+        """
+        for source, (fingerprint, records, staging_path) in list(self.pending_snapshots.items()):
+            self.snapshots.save(source, fingerprint, records, staging_path)
+            self.pending_snapshots.pop(source, None)
+            print(f"Saved {source} snapshot {fingerprint[:12]}")
+
+    def _fetch_pnj_rows_browser(self, url):
+        """Đọc bảng giá bằng browser trong pool (trang cần chạy JavaScript)"""
+        pool = get_browser_pool()
+        with pool.session() as driver:
+            # Truy cập trang web và chờ đến khi bảng giá có dữ liệu
+            print(f"Accessing URL with browser: {url}")
+            pool.load_page(driver, url, PRICE_ROW_SELECTOR)
+            # Cả bảng trong một execute_script, validate từng dòng ở Python
+            return pool.read_rows(driver, PRICE_ROW_SELECTOR)
+
+    def extract_from_pnj(self, connection_string=None, url=None, mode=None):
         """Extract dữ liệu từ website PNJ blog
         Quy trình ETL:
-        1. Extract: Crawl dữ liệu từ web
+        1. Extract: Tải trang bằng HTTP client và parse bảng giá (mode 'http'),
+           hoặc render bằng browser (mode 'browser'); mode 'auto' chỉ dùng browser khi parse HTTP thất bại
         2. Transform: Chuẩn hóa dữ liệu theo format chung
-        3. Load: Lưu vào staging area (JSON)
+        3. Load: Lưu vào staging area (JSON / Parquet / Arrow)
+        Bảng giá không đổi so với snapshot đã load (skip_unchanged) thì không ghi staging và trả về None
         """
+        url = url or PNJ_URL
+        mode = mode or self.crawl_mode
         try:
             # 1. Extract - Crawl dữ liệu từ web
             print("Starting web crawling process...")
-            
-            # 1.1. Khởi tạo webdriver
-            options = webdriver.EdgeOptions()
-            options.add_argument('--headless')
-            options.add_argument('--disable-gpu')
-            options.add_argument('--no-sandbox')
-            options.add_argument('--disable-dev-shm-usage')
-            options.add_argument('--disable-blink-features=AutomationControlled')
-            options.add_experimental_option('excludeSwitches', ['enable-automation'])
-            options.add_experimental_option('useAutomationExtension', False)
-            
-            print("Initializing web driver...")
-            driver = webdriver.Edge(options=options)
-            driver.execute_script("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
-            
-            # 1.2. Truy cập trang web
-            url = 'https://www.pnj.com.vn/blog/gia-vang/'
-            print(f"Accessing URL: {url}")
-            driver.get(url)
-            
-            # 1.3. Đợi và lấy dữ liệu
-            from selenium.webdriver.support.ui import WebDriverWait
-            from selenium.webdriver.support import expected_conditions as EC
-            wait = WebDriverWait(driver, 20)
-            
-            print("Waiting for price table...")
-            table = wait.until(EC.presence_of_element_located((By.CSS_SELECTOR, '#content-price')))
-            
-            import time
-            time.sleep(2)
-            
-            # 2. Transform - Chuẩn hóa dữ liệu
-            print("Transforming data...")
-            rows = driver.find_elements(By.CSS_SELECTOR, '#content-price tr')
             transformed_data = []
 
-            for row in rows:
+            # 1.1. Đường nhanh: HTTP + HTML parser, không cần browser
+            if mode in ('auto', 'http'):
                 try:
-                    # 2.1. Extract row data
-                    columns = row.find_elements(By.TAG_NAME, 'td')
-                    if len(columns) != 3:
-                        continue
-                        
-                    # 2.2. Clean and validate data
-                    gold_type = columns[0].text.strip()
-                    if not gold_type:
-                        print("Warning: Empty gold type")
-                        continue
-                        
-                    try:
-                        buy_price = float(columns[1].text.strip().replace(',', ''))
-                        sell_price = float(columns[2].text.strip().replace(',', ''))
-                        
-                        if buy_price < 0 or sell_price < 0:
-                            print(f"Warning: Negative price found - Buy: {buy_price}, Sell: {sell_price}")
-                            continue
-                    except ValueError:
-                        print(f"Warning: Invalid price format for {gold_type}")
-                        continue
-                    
-                    # 2.3. Create standardized record
-                    record = {
-                        "GoldType": gold_type,
-                        "BuyPrice": buy_price,
-                        "SellPrice": sell_price,
-                        "UpdateTime": datetime.now().strftime('%d/%m/%Y %H:%M:%S')
-                    }
-                    transformed_data.append(record)
-                except Exception as row_error:
-                    print(f"Error processing row: {str(row_error)}")
-                    continue
-            
-            driver.quit()
+                    started = time.perf_counter()
+                    rows = fetch_price_rows(url, self.http_timeout)
+                    transformed_data = self._build_pnj_records(rows)
+                    print(f"Parsed {len(rows)} rows over HTTP in {time.perf_counter() - started:.2f}s")
+                    if not transformed_data:
+                        raise ValueError("No valid price rows in HTTP response")
+                except Exception as http_error:
+                    if mode == 'http':
+                        raise
+                    print(f"HTTP extraction failed ({str(http_error)}), falling back to browser")
+                    transformed_data = []
+
+            # 1.2. Đường browser (Selenium) khi HTTP không dùng được
+            if not transformed_data:
+                rows = self._fetch_pnj_rows_browser(url)
+                # 2. Transform - Chuẩn hóa dữ liệu
+                print("Transforming data...")
+                transformed_data = self._build_pnj_records(rows)
+
             print(f"Found {len(transformed_data)} valid gold price entries")
 
             if not transformed_data:
                 raise ValueError("No valid data was extracted from the page")
 
-            # 3. Load - Lưu vào staging area
-            # 3.1. Tạo thư mục staging nếu chưa có
-            staging_dir = os.path.join(self.output_dir, 'staging')
-            if not os.path.exists(staging_dir):
-                os.makedirs(staging_dir)
-            
-            # 3.2. Lưu file JSON vào staging
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            json_filename = f'staging_pnj_{timestamp}.json'
-            json_path = os.path.join(staging_dir, json_filename)
-            
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(transformed_data, f, ensure_ascii=False, indent=4)
-            
-            print(f"Successfully extracted {len(transformed_data)} records")
-            print(f"Staging data saved to: {json_path}")
+            # 2.1. So sánh fingerprint với snapshot đã load gần nhất
+            fingerprint = price_fingerprint(transformed_data)
+            if self.skip_unchanged and self.snapshots.is_unchanged('pnj', fingerprint):
+                print(f"PNJ prices unchanged since last snapshot ({fingerprint[:12]}), skipping staging")
+                if connection_string:
+                    create_log("ExtractPNJUnchanged",
+                              f"Prices unchanged, fingerprint {fingerprint}",
+                              "extract_from_pnj",
+                              "INFO",
+                              url,
+                              connection_string)
+                return None
+
+            # 3. Load - Lưu vào staging area (json / parquet / arrow theo staging_format)
+            staging_path = self._save_staging(pd.DataFrame(transformed_data), 'pnj')
+            self.pending_snapshots['pnj'] = (fingerprint, len(transformed_data), staging_path)
             
-            # 3.3. Log kết quả
+            # 3.1. Log kết quả
             if connection_string:
                 create_log("ExtractPNJSuccess", 
-                          f"Extracted {len(transformed_data)} records to {json_path}", 
+                          f"Extracted {len(transformed_data)} records to {staging_path}", 
                           "extract_from_pnj", 
                           "INFO", 
                           url, 
                           connection_string)
             
-            return json_path
+            return staging_path
             
         except Exception as e:
             error_msg = f"Error in ETL process: {str(e)}"
@@ -148,12 +261,18 @@ class DataExtractor:
         Quy trình ETL:
         1. Extract: Đọc dữ liệu từ CSV
         2. Transform: Chuẩn hóa dữ liệu theo format chung
-        3. Load: Lưu vào staging area (JSON)
+        3. Load: Lưu vào staging area (JSON / Parquet / Arrow)
+        File giống hệt snapshot đã load (skip_unchanged) thì không đọc, không ghi staging và trả về None
         """
         try:
             # 1. Extract - Đọc dữ liệu từ CSV
             if not os.path.exists(input_file):
                 raise FileNotFoundError(f"Input file not found: {input_file}")
+
+            fingerprint = file_fingerprint(input_file)
+            if self._is_unchanged_file('csv', fingerprint, input_file, "ExtractCSVUnchanged", "extract_from_csv",
+                                       connection_string):
+                return None
             
             print(f"Reading CSV file: {input_file}")
             df = pd.read_csv(input_file)
@@ -169,76 +288,27 @@ class DataExtractor:
             # 2.2. Clean data
             df = df.dropna(subset=required_columns)  # Bỏ dòng thiếu dữ liệu
             
-            # 2.3. Transform data
-            transformed_data = []
-            for _, row in df.iterrows():
-                try:
-                    # Clean gold type
-                    gold_type = str(row['type']).strip()
-                    if not gold_type or pd.isna(gold_type):
-                        continue
-                    
-                    # Clean prices
-                    try:
-                        buy_price = float(str(row['buy']).replace(',', ''))
-                        sell_price = float(str(row['sell']).replace(',', ''))
-                        if buy_price < 0 or sell_price < 0:
-                            print(f"Warning: Negative price found - Buy: {buy_price}, Sell: {sell_price}")
-                            continue
-                    except ValueError:
-                        print(f"Warning: Invalid price format - Buy: {row['buy']}, Sell: {row['sell']}")
-                        continue
-                    
-                    # Clean date
-                    try:
-                        update_time = pd.to_datetime(row['update'])
-                        update_time_str = update_time.strftime('%d/%m/%Y %H:%M:%S')
-                    except:
-                        print(f"Warning: Invalid date format: {row['update']}")
-                        continue
-                    
-                    # Create standardized record
-                    record = {
-                        'GoldType': gold_type,
-                        'BuyPrice': buy_price,
-                        'SellPrice': sell_price,
-                        'UpdateTime': update_time_str
-                    }
-                    transformed_data.append(record)
-                except Exception as e:
-                    print(f"Warning: Error processing row: {str(e)}")
-                    continue
+            # 2.3. Transform data (xử lý theo cột, không lặp từng dòng)
+            clean_df, rejected_df = self.standardize_frame(df, 'csv')
+            self.save_rejected_report(rejected_df, 'csv')
             
-            if not transformed_data:
+            if clean_df.empty:
                 raise ValueError("No valid data found in CSV file")
             
-            # 3. Load - Lưu vào staging area
-            # 3.1. Tạo thư mục staging nếu chưa có
-            staging_dir = os.path.join(self.output_dir, 'staging')
-            if not os.path.exists(staging_dir):
-                os.makedirs(staging_dir)
-            
-            # 3.2. Lưu file JSON vào staging
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            json_filename = f'staging_csv_{timestamp}.json'
-            json_path = os.path.join(staging_dir, json_filename)
-            
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(transformed_data, f, ensure_ascii=False, indent=4)
-            
-            print(f"Successfully extracted {len(transformed_data)} records")
-            print(f"Staging data saved to: {json_path}")
+            # 3. Load - Lưu vào staging area (json / parquet / arrow theo staging_format)
+            staging_path = self._save_staging(clean_df, 'csv')
+            self.pending_snapshots['csv'] = (fingerprint, len(clean_df), staging_path)
             
-            # 3.3. Log kết quả
+            # 3.1. Log kết quả
             if connection_string:
                 create_log("ExtractCSVSuccess", 
-                          f"Extracted {len(transformed_data)} records to {json_path}", 
+                          f"Extracted {len(clean_df)} records to {staging_path}", 
                           "extract_from_csv", 
                           "INFO", 
                           input_file, 
                           connection_string)
             
-            return json_path
+            return staging_path
             
         except Exception as e:
             error_msg = f"Error in ETL process: {str(e)}"
@@ -247,17 +317,92 @@ class DataExtractor:
                 create_log("ExtractCSVError", error_msg, "extract_from_csv", "ERROR", input_file, connection_string)
             raise e
 
+    def extract_from_csv_chunked(self, input_file, chunk_size=100000, connection_string=None):
+        """Extract file CSV lớn theo từng chunk chunk_size dòng
+        Mỗi chunk được chuẩn hóa và ghi thành một file staging riêng (staging_csv_<ts>_partNNNNN),
+        bộ nhớ chỉ phụ thuộc chunk_size chứ không phụ thuộc kích thước file.
+        Trả về danh sách file staging theo thứ tự chunk, None nếu file giống hệt snapshot đã load (skip_unchanged)
+        """
+        try:
+            if not os.path.exists(input_file):
+                raise FileNotFoundError(f"Input file not found: {input_file}")
+
+            fingerprint = file_fingerprint(input_file)
+            if self._is_unchanged_file('csv', fingerprint, input_file, "ExtractCSVUnchanged",
+                                       "extract_from_csv_chunked", connection_string):
+                return None
+
+            print(f"Reading CSV file in chunks of {chunk_size} rows: {input_file}")
+            required_columns = ['type', 'buy', 'sell', 'update']
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            staging_paths = []
+            report_path = None
+            total_read = total_valid = total_rejected = 0
+            started = time.perf_counter()
+
+            for chunk_no, df in enumerate(pd.read_csv(input_file, chunksize=chunk_size), 1):
+                # 1. Validate và clean columns
+                df.columns = df.columns.str.strip().str.lower()
+                missing_columns = [col for col in required_columns if col not in df.columns]
+                if missing_columns:
+                    raise ValueError(f"Missing required columns: {missing_columns}")
+                total_read += len(df)
+                df = df.dropna(subset=required_columns)
+
+                # 2. Transform chunk, các dòng bị loại ghi nối vào cùng một báo cáo
+                clean_df, rejected_df = self.standardize_frame(df, 'csv')
+                report_path = self.save_rejected_report(rejected_df, 'csv', report_path)
+                total_valid += len(clean_df)
+                total_rejected += len(rejected_df)
+
+                # 3. Load chunk vào staging area
+                if not clean_df.empty:
+                    staging_paths.append(self._save_staging(clean_df, 'csv', f'{timestamp}_part{chunk_no:05d}'))
+
+                print(f"Chunk {chunk_no}: {len(clean_df)} valid, {len(rejected_df)} rejected "
+                      f"(total {total_read} rows read, {total_valid} valid) "
+                      f"in {time.perf_counter() - started:.1f}s")
+
+            if not staging_paths:
+                raise ValueError("No valid data found in CSV file")
+            self.pending_snapshots['csv'] = (fingerprint, total_valid, staging_paths)
+
+            print(f"Successfully extracted {total_valid} records into {len(staging_paths)} staging files "
+                  f"({total_rejected} rejected)")
+            if connection_string:
+                create_log("ExtractCSVSuccess",
+                          f"Extracted {total_valid} records to {len(staging_paths)} staging files",
+                          "extract_from_csv_chunked",
+                          "INFO",
+                          input_file,
+                          connection_string)
+
+            return staging_paths
+
+        except Exception as e:
+            error_msg = f"Error in ETL process: {str(e)}"
+            print(error_msg)
+            if connection_string:
+                create_log("ExtractCSVError", error_msg, "extract_from_csv_chunked", "ERROR", input_file, connection_string)
+            raise e
+
     def extract_from_excel(self, input_file, sheet_name=0, connection_string=None):
         """Extract dữ liệu từ file Excel
         Quy trình ETL:
         1. Extract: Đọc dữ liệu từ Excel
         2. Transform: Chuẩn hóa dữ liệu theo format chung
-        3. Load: Lưu vào staging area (JSON)
+        3. Load: Lưu vào staging area (JSON / Parquet / Arrow)
+        File giống hệt snapshot đã load (skip_unchanged) thì không đọc, không ghi staging và trả về None
         """
         try:
             # 1. Extract - Đọc dữ liệu từ Excel
             if not os.path.exists(input_file):
                 raise FileNotFoundError(f"Input file not found: {input_file}")
+
+            fingerprint = file_fingerprint(input_file)
+            if self._is_unchanged_file('excel', fingerprint, input_file, "ExtractExcelUnchanged",
+                                       "extract_from_excel", connection_string):
+                return None
             
             print(f"Reading Excel file: {input_file}")
             df = pd.read_excel(input_file, sheet_name=sheet_name, engine='openpyxl')
@@ -273,76 +418,27 @@ class DataExtractor:
             # 2.2. Clean data
             df = df.dropna(subset=required_columns)  # Bỏ dòng thiếu dữ liệu
             
-            # 2.3. Transform data
-            transformed_data = []
-            for _, row in df.iterrows():
-                try:
-                    # Clean gold type
-                    gold_type = str(row['type']).strip()
-                    if not gold_type or pd.isna(gold_type):
-                        continue
-                    
-                    # Clean prices
-                    try:
-                        buy_price = float(str(row['buy']).replace(',', ''))
-                        sell_price = float(str(row['sell']).replace(',', ''))
-                        if buy_price < 0 or sell_price < 0:
-                            print(f"Warning: Negative price found - Buy: {buy_price}, Sell: {sell_price}")
-                            continue
-                    except ValueError:
-                        print(f"Warning: Invalid price format - Buy: {row['buy']}, Sell: {row['sell']}")
-                        continue
-                    
-                    # Clean date
-                    try:
-                        update_time = pd.to_datetime(row['update'])
-                        update_time_str = update_time.strftime('%d/%m/%Y %H:%M:%S')
-                    except:
-                        print(f"Warning: Invalid date format: {row['update']}")
-                        continue
-                    
-                    # Create standardized record
-                    record = {
-                        'GoldType': gold_type,
-                        'BuyPrice': buy_price,
-                        'SellPrice': sell_price,
-                        'UpdateTime': update_time_str
-                    }
-                    transformed_data.append(record)
-                except Exception as e:
-                    print(f"Warning: Error processing row: {str(e)}")
-                    continue
+            # 2.3. Transform data (xử lý theo cột, không lặp từng dòng)
+            clean_df, rejected_df = self.standardize_frame(df, 'excel')
+            self.save_rejected_report(rejected_df, 'excel')
             
-            if not transformed_data:
+            if clean_df.empty:
                 raise ValueError("No valid data found in Excel file")
             
-            # 3. Load - Lưu vào staging area
-            # 3.1. Tạo thư mục staging nếu chưa có
-            staging_dir = os.path.join(self.output_dir, 'staging')
-            if not os.path.exists(staging_dir):
-                os.makedirs(staging_dir)
-            
-            # 3.2. Lưu file JSON vào staging
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            json_filename = f'staging_excel_{timestamp}.json'
-            json_path = os.path.join(staging_dir, json_filename)
-            
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(transformed_data, f, ensure_ascii=False, indent=4)
-            
-            print(f"Successfully extracted {len(transformed_data)} records")
-            print(f"Staging data saved to: {json_path}")
+            # 3. Load - Lưu vào staging area (json / parquet / arrow theo staging_format)
+            staging_path = self._save_staging(clean_df, 'excel')
+            self.pending_snapshots['excel'] = (fingerprint, len(clean_df), staging_path)
             
-            # 3.3. Log kết quả
+            # 3.1. Log kết quả
             if connection_string:
                 create_log("ExtractExcelSuccess", 
-                          f"Extracted {len(transformed_data)} records to {json_path}", 
+                          f"Extracted {len(clean_df)} records to {staging_path}", 
                           "extract_from_excel", 
                           "INFO", 
                           input_file, 
                           connection_string)
             
-            return json_path
+            return staging_path
             
         except Exception as e:
             error_msg = f"Error in ETL process: {str(e)}"
@@ -1,11 +1,76 @@
+import time
+import tracemalloc
+from contextlib import contextmanager
 import pandas as pd
 from datetime import datetime
 import numpy as np
+from TimestampParser import parse_timestamps
+from CalendarDimension import date_keys, date_rows
+from StagingFormat import gold_type_category
+from ColumnarBackend import DERIVED_COLUMNS, available_backend, run_backend
+
+REQUIRED_COLUMNS = ['GoldType', 'BuyPrice', 'SellPrice', 'UpdateTime']
+FACT_COLUMNS = ['GoldTypeKey', 'DateKey', 'BuyPrice', 'SellPrice', 'PriceDifference', 'PriceDifferencePercentage']
+
+# Bộ nhớ ước lượng cho mỗi dòng khi transform ở chế độ lean: chunk đầu vào + phần tạm
+# (đo được ~140 byte/dòng phần tạm trên data/gold_price.csv, lấy dư)
+LEAN_BYTES_PER_ROW = 400
+
+
+def chunk_rows_for_budget(memory_budget_mb, bytes_per_row=LEAN_BYTES_PER_ROW):
+    """Số dòng mỗi chunk để phần bộ nhớ tạm của một chunk nằm trong memory_budget_mb"""
+    return max(int(memory_budget_mb * 1024 * 1024 // max(bytes_per_row, 1)), 1000)
 
 
 class DataTransformer:
-    def __init__(self):
+    """Transform dữ liệu staging thành star schema
+    - lean=False: pipeline cũ (copy từng bước, in thông tin chẩn đoán)
+    - lean=True: làm việc trực tiếp trên DataFrame đầu vào (caller giao quyền sở hữu, không copy),
+      tính derived fields và key trong một lượt, không in gì
+    - track_memory=True: đo bộ nhớ đỉnh từng stage bằng tracemalloc, kết quả ở last_memory_report
+    - backend='polars' / 'duckdb' (chỉ chế độ lean): derived fields, DateKey và aggregate chạy trên
+      engine cột đa luồng, kết quả cùng dạng với pandas; thư viện chưa cài thì dùng pandas
+    """
+
+    def __init__(self, lean=False, track_memory=False, backend='pandas'):
         self.current_timestamp = datetime.now()
+        self.lean = lean
+        self.track_memory = track_memory
+        self.backend = available_backend(backend) if lean else 'pandas'
+        self.last_memory_report = []
+        # GoldType -> GoldTypeKey, giữ ổn định giữa các chunk của transform_chunks
+        self._gold_type_keys = {}
+        # Partial aggregate cộng dồn của transform_chunks
+        self.aggregate_totals = None
+        # tracemalloc do transformer bật (tắt lại khi transform xong), không đụng tới tracing của caller
+        self._started_tracing = False
+
+    @contextmanager
+    def _stage(self, name, rows=None):
+        """Ghi thời gian (và bộ nhớ nếu track_memory) của một stage vào last_memory_report"""
+        if self.track_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        yield
+        entry = {'stage': name, 'rows': rows, 'seconds': round(time.perf_counter() - started, 4)}
+        if self.track_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            entry.update({'current_mb': round(current / 2**20, 2), 'peak_mb': round(peak / 2**20, 2)})
+        self.last_memory_report.append(entry)
+
+    def _stop_tracing(self):
+        """Tắt tracemalloc nếu chính transformer đã bật (tracemalloc làm chậm mọi cấp phát)"""
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def peak_memory_mb(self):
+        """Bộ nhớ đỉnh lớn nhất trong các stage của lần transform gần nhất (None nếu không đo)"""
+        peaks = [entry['peak_mb'] for entry in self.last_memory_report if 'peak_mb' in entry]
+        return max(peaks) if peaks else None
 
     def clean_data(self, df):
         """Clean and standardize data"""
@@ -65,14 +130,7 @@ class DataTransformer:
             print(f"Creating dimensions with UpdateTime type: {df['UpdateTime'].dtype}")
             
             # Create Date Dimension
-            date_dim = pd.DataFrame({
-                'DateKey': pd.to_datetime(df['UpdateTime']).dt.strftime('%Y%m%d'),
-                'Date': pd.to_datetime(df['UpdateTime']).dt.date,
-                'Year': pd.to_datetime(df['UpdateTime']).dt.year,
-                'Month': pd.to_datetime(df['UpdateTime']).dt.month,
-                'Day': pd.to_datetime(df['UpdateTime']).dt.day,
-                'Quarter': pd.to_datetime(df['UpdateTime']).dt.quarter
-            }).drop_duplicates()
+            date_dim = date_rows(np.sort(pd.unique(date_keys(df['UpdateTime']))))
 
             # Create Gold Type Dimension
             gold_type_dim = pd.DataFrame({
@@ -88,15 +146,21 @@ class DataTransformer:
             raise
 
     def create_fact_table(self, df, date_dim, gold_type_dim):
-        # Merge with dimensions to get keys
-        df['DateKey'] = df['UpdateTime'].dt.strftime('%Y%m%d')
-        fact_table = df.merge(gold_type_dim, on='GoldType', how='left')
+        df['DateKey'] = date_keys(df['UpdateTime'])
+        # GoldTypeKey tra theo mã categorical của GoldType trong từ điển gold_type_dim, không merge theo chuỗi
+        dictionary = gold_type_dim.dropna(subset=['GoldType'])
+        codes = pd.Categorical(df['GoldType'], categories=dictionary['GoldType']).codes
+        gold_type_keys = self._take_keys(dictionary['GoldTypeKey'].to_numpy(), codes)
 
         # Select relevant columns for fact table
-        fact_gold_prices = fact_table[[
-            'GoldTypeKey', 'DateKey', 'BuyPrice', 'SellPrice',
-            'PriceDifference', 'PriceDifferencePercentage'
-        ]].copy()
+        fact_gold_prices = pd.DataFrame({
+            'GoldTypeKey': gold_type_keys,
+            'DateKey': df['DateKey'].to_numpy(),
+            'BuyPrice': df['BuyPrice'].to_numpy(),
+            'SellPrice': df['SellPrice'].to_numpy(),
+            'PriceDifference': df['PriceDifference'].to_numpy(),
+            'PriceDifferencePercentage': df['PriceDifferencePercentage'].to_numpy()
+        })
 
         return fact_gold_prices
 
@@ -119,8 +183,217 @@ class DataTransformer:
 
         return daily_agg, monthly_agg
 
+    @staticmethod
+    def parse_update_time(values):
+        """Chuyển cột UpdateTime sang datetime: mỗi giá trị khác nhau parse một lần (TimestampParser)"""
+        return parse_timestamps(values, source='transform')
+
+    @staticmethod
+    def _to_price(values):
+        if pd.api.types.is_numeric_dtype(values):
+            return values.astype('float64', copy=False)
+        return pd.to_numeric(values.astype(str).str.replace(',', ''), errors='coerce')
+
+    def _gold_type_codes(self, gold_types):
+        """Key GoldType cho từng dòng, GoldType mới được cấp key tiếp theo trong _gold_type_keys
+        gold_types là categorical: chỉ từ điển (vài chục tên) được tra, mỗi dòng chỉ là một mã số nguyên
+        Trả về (mảng key theo dòng, DataFrame gold_type_dim của các GoldType xuất hiện)
+        """
+        codes, uniques = pd.factorize(gold_types)
+        uniques = np.asarray(uniques, dtype=object)
+        keys = np.empty(len(uniques), dtype='int64')
+        for i, gold_type in enumerate(uniques):
+            key = self._gold_type_keys.get(gold_type)
+            if key is None:
+                key = self._gold_type_keys[gold_type] = len(self._gold_type_keys) + 1
+            keys[i] = key
+        gold_type_dim = pd.DataFrame({
+            'GoldTypeKey': keys,
+            'GoldType': uniques,
+            'Created_at': self.current_timestamp
+        })
+        return self._take_keys(keys, codes), gold_type_dim
+
+    @staticmethod
+    def _take_keys(keys, codes):
+        """keys[codes] theo từng dòng; mã -1 (GoldType rỗng / không có trong từ điển) -> NaN"""
+        if (codes >= 0).all():
+            return keys[codes]
+        return np.where(codes >= 0, keys[codes], np.nan)
+
+    def _clean_lean(self, df):
+        """Chuẩn hóa kiểu các cột tại chỗ: giá float64 (NaN -> 0), UpdateTime datetime, GoldType categorical"""
+        missing_columns = [col for col in REQUIRED_COLUMNS if col not in df.columns]
+        if missing_columns:
+            raise ValueError(f"Missing required columns: {missing_columns}")
+        df['BuyPrice'] = self._to_price(df['BuyPrice']).fillna(0)
+        df['SellPrice'] = self._to_price(df['SellPrice']).fillna(0)
+        df['UpdateTime'] = self.parse_update_time(df['UpdateTime']).fillna(pd.Timestamp.now())
+        df['GoldType'] = gold_type_category(df['GoldType'])
+
+    def _transform_lean(self, df):
+        """Transform một lượt trên df (bị sửa tại chỗ), trả về dict như transform_data nhưng không có aggregate"""
+        rows = len(df)
+        with self._stage('clean', rows):
+            self._clean_lean(df)
+
+        with self._stage('derive', rows):
+            # Derived fields tính trên mảng numpy, làm tròn tại chỗ
+            buy = df['BuyPrice'].to_numpy(dtype='float64')
+            sell = df['SellPrice'].to_numpy(dtype='float64')
+            difference = sell - buy
+            with np.errstate(divide='ignore', invalid='ignore'):
+                percentage = difference / buy * 100
+            np.round(difference, 2, out=difference)
+            np.round(percentage, 2, out=percentage)
+            # Mảng của cột (copy-on-write) chỉ đọc: làm tròn ra mảng mới rồi thay cột
+            buy = np.round(buy, 2)
+            sell = np.round(sell, 2)
+            df['BuyPrice'] = buy
+            df['SellPrice'] = sell
+            df['PriceDifference'] = difference
+            df['PriceDifferencePercentage'] = percentage
+
+        with self._stage('keys', rows):
+            # DateKey yyyymmdd tính bằng phép toán số nguyên; date_dim chỉ tính cho các ngày khác nhau
+            date_key_values = date_keys(df['UpdateTime'])
+            df['DateKey'] = date_key_values
+            date_dim = date_rows(np.sort(pd.unique(date_key_values)))
+            gold_type_keys, gold_type_dim = self._gold_type_codes(df['GoldType'])
+
+            fact_table = pd.DataFrame({
+                'GoldTypeKey': gold_type_keys,
+                'DateKey': date_key_values,
+                'BuyPrice': buy,
+                'SellPrice': sell,
+                'PriceDifference': difference,
+                'PriceDifferencePercentage': percentage
+            }, index=df.index)
+
+        return {
+            'clean_data': df,
+            'date_dim': date_dim,
+            'gold_type_dim': gold_type_dim,
+            'fact_table': fact_table
+        }
+
+    def _transform_columnar(self, df):
+        """transform_data trên engine self.backend: pandas chỉ chuẩn hóa kiểu và cấp GoldTypeKey
+        (tra trên từ điển categorical), phần tính theo dòng và group by do engine làm"""
+        rows = len(df)
+        with self._stage('clean', rows):
+            self._clean_lean(df)
+
+        with self._stage(self.backend, rows):
+            derived, daily_agg, monthly_agg = run_backend(self.backend, df)
+            for column in DERIVED_COLUMNS:
+                df[column] = derived[column].to_numpy()
+
+        with self._stage('keys', rows):
+            # Index của daily_agg là các DateKey khác nhau đã sắp xếp
+            date_dim = date_rows(daily_agg.index.to_numpy())
+            gold_type_keys, gold_type_dim = self._gold_type_codes(df['GoldType'])
+            # Fact dùng chung mảng với clean_data (copy-on-write), không copy lại cả cột
+            fact_table = pd.DataFrame(dict(GoldTypeKey=gold_type_keys, **{
+                column: df[column].to_numpy() for column in FACT_COLUMNS[1:]
+            }), index=df.index, copy=False)
+
+        return {
+            'clean_data': df,
+            'date_dim': date_dim,
+            'gold_type_dim': gold_type_dim,
+            'fact_table': fact_table,
+            'daily_agg': daily_agg,
+            'monthly_agg': monthly_agg
+        }
+
+    @staticmethod
+    def _partial_aggregates(fact_table):
+        """sum / count / min / max theo DateKey - cộng dồn được giữa các chunk"""
+        return fact_table.groupby('DateKey')[['BuyPrice', 'SellPrice', 'PriceDifference']] \
+            .agg(['sum', 'count', 'min', 'max'])
+
+    @staticmethod
+    def _reduce_partials(grouped, columns):
+        """Gộp partial theo nhóm: sum / count cộng lại, min / max lấy min / max"""
+        return grouped.agg({(col, stat): 'sum' if stat == 'count' else stat for col, stat in columns})
+
+    def _combine_partials(self, left, right):
+        return self._reduce_partials(pd.concat([left, right]).groupby(level=0), left.columns)
+
+    def _finish_aggregates(self, partials):
+        """Từ partial theo DateKey tính daily_agg và monthly_agg (cùng dạng với create_aggregates)"""
+        def finish(grouped):
+            result = pd.DataFrame({
+                ('BuyPrice', 'mean'): grouped[('BuyPrice', 'sum')] / grouped[('BuyPrice', 'count')],
+                ('BuyPrice', 'min'): grouped[('BuyPrice', 'min')],
+                ('BuyPrice', 'max'): grouped[('BuyPrice', 'max')],
+                ('SellPrice', 'mean'): grouped[('SellPrice', 'sum')] / grouped[('SellPrice', 'count')],
+                ('SellPrice', 'min'): grouped[('SellPrice', 'min')],
+                ('SellPrice', 'max'): grouped[('SellPrice', 'max')],
+                ('PriceDifference', 'mean'): grouped[('PriceDifference', 'sum')] / grouped[('PriceDifference', 'count')]
+            })
+            return result.round(2)
+
+        daily_agg = finish(partials)
+        date_numbers = partials.index.astype(int)
+        monthly = partials.groupby([pd.Index(date_numbers // 10000, name='Year'),
+                                    pd.Index(date_numbers // 100 % 100, name='Month')])
+        return daily_agg, finish(self._reduce_partials(monthly, partials.columns))
+
+    def transform_chunks(self, chunks):
+        """Transform lần lượt từng chunk (DataFrame hoặc list dict), bộ nhớ tạm chỉ phụ thuộc kích thước chunk
+        - GoldTypeKey giữ ổn định giữa các chunk
+        - daily_agg / monthly_agg của mỗi chunk là giá trị cộng dồn từ chunk đầu tiên cho các ngày / tháng
+          chunk đó chạm tới: ghi đè lần lượt từng chunk cho cùng kết quả với transform cả bảng một lần
+        - Luôn tính bằng pandas (partial cộng dồn), backend chỉ áp dụng cho transform_data
+        - Caller load từng chunk rồi bỏ đi (BulkLoader.load_star_schema_chunks), không gom lại
+        """
+        self.last_memory_report = []
+        self._gold_type_keys = {}
+        self.aggregate_totals = None
+        try:
+            for chunk in chunks:
+                df = chunk if isinstance(chunk, pd.DataFrame) else pd.DataFrame(chunk)
+                transformed_data = self._transform_lean(df)
+                del transformed_data['clean_data']
+                with self._stage('aggregate', len(df)):
+                    partials = self._partial_aggregates(transformed_data['fact_table'])
+                    totals = partials if self.aggregate_totals is None else \
+                        self._combine_partials(self.aggregate_totals, partials)
+                    self.aggregate_totals = totals
+                    # Mọi ngày của các tháng chunk này chạm tới, để monthly_agg tính trên cả tháng
+                    months = set(partials.index.astype(int) // 100)
+                    touched = totals[np.isin(totals.index.astype(int) // 100, list(months))]
+                    daily_agg, monthly_agg = self._finish_aggregates(touched)
+                    transformed_data['daily_agg'] = daily_agg.loc[partials.index]
+                    transformed_data['monthly_agg'] = monthly_agg
+                # Không giữ chunk đã yield khi đọc / transform chunk tiếp theo
+                del df, chunk
+                yield transformed_data
+                del transformed_data
+        finally:
+            self._stop_tracing()
+
     def transform_data(self, data):
-        """Transform dữ liệu từ dictionary thành DataFrame và xử lý"""
+        """Transform dữ liệu từ dictionary thành DataFrame và xử lý
+        Chế độ lean: DataFrame truyền vào được sửa tại chỗ và trả lại ở 'clean_data'
+        """
+        if self.lean:
+            self.last_memory_report = []
+            self._gold_type_keys = {}
+            df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+            try:
+                if self.backend != 'pandas':
+                    return self._transform_columnar(df)
+                transformed_data = self._transform_lean(df)
+                with self._stage('aggregate', len(df)):
+                    totals = self._partial_aggregates(transformed_data['fact_table'])
+                    transformed_data['daily_agg'], transformed_data['monthly_agg'] = self._finish_aggregates(totals)
+                return transformed_data
+            finally:
+                self._stop_tracing()
+
         try:
             # Convert data to DataFrame if it's not already
             if isinstance(data, pd.DataFrame):
@@ -144,18 +417,7 @@ class DataTransformer:
             df['SellPrice'] = pd.to_numeric(df['SellPrice'].astype(str).str.replace(',', ''), errors='coerce')
             
             # Convert UpdateTime to datetime
-            if df['UpdateTime'].dtype != 'datetime64[ns]':
-                # Try multiple datetime formats with dayfirst=True
-                for fmt in ['%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%Y-%m-%dT%H:%M:%S']:
-                    try:
-                        df['UpdateTime'] = pd.to_datetime(df['UpdateTime'], format=fmt, dayfirst=True)
-                        break
-                    except:
-                        continue
-                
-                # If all formats fail, try without format but with dayfirst=True
-                if df['UpdateTime'].dtype != 'datetime64[ns]':
-                    df['UpdateTime'] = pd.to_datetime(df['UpdateTime'], dayfirst=True, errors='coerce')
+            df['UpdateTime'] = self.parse_update_time(df['UpdateTime'])
             
             # Fill missing values
             df['BuyPrice'] = df['BuyPrice'].fillna(0)
@@ -171,14 +433,7 @@ class DataTransformer:
             df = self.calculate_derived_fields(df)
             
             # Create dimensions
-            date_dim = pd.DataFrame({
-                'DateKey': df['UpdateTime'].dt.strftime('%Y%m%d'),
-                'Date': df['UpdateTime'].dt.date,
-                'Year': df['UpdateTime'].dt.year,
-                'Month': df['UpdateTime'].dt.month,
-                'Day': df['UpdateTime'].dt.day,
-                'Quarter': df['UpdateTime'].dt.quarter
-            }).drop_duplicates()
+            date_dim = date_rows(np.sort(pd.unique(date_keys(df['UpdateTime']))))
             
             gold_type_dim = pd.DataFrame({
                 'GoldTypeKey': range(1, len(df['GoldType'].unique()) + 1),
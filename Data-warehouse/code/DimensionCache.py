@@ -0,0 +1,176 @@
+import threading
+import time
+import pandas as pd
+from BulkLoader import bulk_insert, drop_temp_tables, frame_to_rows
+
+
+class DimensionCache:
+    """Cache surrogate key của DimGoldType (GoldType -> GoldTypeKey) và DimDate (tập DateKey) trong process
+    - Nạp toàn bộ dimension một lần, các lần load sau tra key trong bộ nhớ (map cả cột fact một lần)
+    - Chỉ insert các key chưa có (miss), theo lô qua temp table
+    - Mỗi lần load so (COUNT, MAX key) của dimension với lần nạp trước; khác nhau nghĩa là
+      có writer khác thêm / xóa key hoặc transaction trước bị rollback -> nạp lại dimension đó
+    - Metrics: loads, reloads, hits, misses
+    """
+
+    def __init__(self):
+        self.gold_type_keys = {}
+        self.date_keys = set()
+        self._signatures = {'DimGoldType': None, 'DimDate': None}
+        self._lock = threading.Lock()
+        self.metrics = {'loads': 0, 'reloads': 0, 'hits': 0, 'misses': 0}
+
+    @staticmethod
+    def _read_signatures(cursor):
+        cursor.execute("""
+            SELECT (SELECT COUNT_BIG(*) FROM DimGoldType), (SELECT MAX(GoldTypeKey) FROM DimGoldType),
+                   (SELECT COUNT_BIG(*) FROM DimDate), (SELECT MAX(DateKey) FROM DimDate)
+        """)
+        row = cursor.fetchone()
+        return {'DimGoldType': (row[0], row[1]), 'DimDate': (row[2], row[3])}
+
+    def invalidate(self):
+        """Bỏ cache, lần load sau nạp lại toàn bộ"""
+        with self._lock:
+            self._signatures = {name: None for name in self._signatures}
+
+    def refresh(self, cursor):
+        """Nạp lại dimension nào đã thay đổi kể từ lần nạp trước"""
+        signatures = self._read_signatures(cursor)
+        if signatures['DimGoldType'] != self._signatures['DimGoldType']:
+            cursor.execute("SELECT GoldType, MIN(GoldTypeKey) FROM DimGoldType GROUP BY GoldType")
+            self.gold_type_keys = {gold_type: key for gold_type, key in cursor.fetchall()}
+            self._count_load('DimGoldType', len(self.gold_type_keys))
+        if signatures['DimDate'] != self._signatures['DimDate']:
+            cursor.execute("SELECT DateKey FROM DimDate")
+            self.date_keys = {row[0] for row in cursor.fetchall()}
+            self._count_load('DimDate', len(self.date_keys))
+        self._signatures = signatures
+
+    def _count_load(self, table_name, rows):
+        self.metrics['reloads' if self._signatures[table_name] is not None else 'loads'] += 1
+        print(f"Dimension cache: loaded {rows} keys from {table_name}")
+
+    def ensure_dates(self, conn, date_dim, batch_size=1000):
+        """Insert các dòng DimDate có DateKey chưa có trong cache, trả về số dòng mới"""
+        date_rows = date_dim.drop_duplicates(subset=['DateKey']).assign(DateKey=lambda d: d['DateKey'].astype(int))
+        missing = date_rows[~date_rows['DateKey'].isin(self.date_keys)]
+        self.metrics['hits'] += len(date_rows) - len(missing)
+        self.metrics['misses'] += len(missing)
+        if missing.empty:
+            return 0
+
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE #NewDate (DateKey INT PRIMARY KEY, Date DATE, Year INT, Month INT, Day INT, Quarter INT)")
+        try:
+            bulk_insert(conn, """
+                INSERT INTO #NewDate (DateKey, Date, Year, Month, Day, Quarter) VALUES (?, ?, ?, ?, ?, ?)
+            """, frame_to_rows(missing, ['DateKey', 'Date', 'Year', 'Month', 'Day', 'Quarter']),
+                batch_size, 'new date rows')
+            # NOT EXISTS: writer khác có thể vừa thêm cùng DateKey
+            cursor.execute("""
+                INSERT INTO DimDate (DateKey, Date, Year, Month, Day, Quarter)
+                SELECT n.DateKey, n.Date, n.Year, n.Month, n.Day, n.Quarter
+                FROM #NewDate n
+                WHERE NOT EXISTS (SELECT 1 FROM DimDate d WHERE d.DateKey = n.DateKey)
+            """)
+            inserted = cursor.rowcount
+        finally:
+            drop_temp_tables(cursor, '#NewDate')
+        self.date_keys.update(int(key) for key in missing['DateKey'])
+        return inserted
+
+    def resolve_gold_types(self, conn, gold_types, created_at=None, batch_size=1000):
+        """GoldType -> GoldTypeKey cho các giá trị trong gold_types, insert theo lô các GoldType mới"""
+        gold_types = pd.Series(pd.unique(pd.Series(gold_types).dropna()), dtype=object)
+        missing = gold_types[~gold_types.isin(self.gold_type_keys.keys())]
+        self.metrics['hits'] += len(gold_types) - len(missing)
+        self.metrics['misses'] += len(missing)
+        if not missing.empty:
+            cursor = conn.cursor()
+            cursor.execute("CREATE TABLE #NewGoldType (GoldType NVARCHAR(255) PRIMARY KEY, Created_at DATETIME)")
+            try:
+                created_at = created_at or pd.Timestamp.now().to_pydatetime()
+                bulk_insert(conn, "INSERT INTO #NewGoldType (GoldType, Created_at) VALUES (?, ?)",
+                            [(gold_type, created_at) for gold_type in missing], batch_size, 'new gold types')
+                cursor.execute("""
+                    INSERT INTO DimGoldType (GoldType, Created_at)
+                    SELECT n.GoldType, n.Created_at
+                    FROM #NewGoldType n
+                    WHERE NOT EXISTS (SELECT 1 FROM DimGoldType g WHERE g.GoldType = n.GoldType)
+                """)
+                # Lấy key theo GoldType của nguồn (collation có thể không phân biệt hoa / thường)
+                cursor.execute("""
+                    SELECT n.GoldType, MIN(g.GoldTypeKey)
+                    FROM #NewGoldType n
+                    JOIN DimGoldType g ON g.GoldType = n.GoldType
+                    GROUP BY n.GoldType
+                """)
+                self.gold_type_keys.update({gold_type: key for gold_type, key in cursor.fetchall()})
+            finally:
+                drop_temp_tables(cursor, '#NewGoldType')
+        return {gold_type: self.gold_type_keys[gold_type] for gold_type in gold_types}
+
+    def load_star_schema(self, conn, transformed_data, batch_size=1000):
+        """Load date_dim, gold_type_dim và fact_table dùng key trong cache
+        Fact được gán GoldTypeKey thật bằng một lần map trên cả cột rồi insert thẳng vào FactGoldPrices.
+        Không commit - caller tự commit. Trả về số dòng fact đã insert
+        """
+        started = time.perf_counter()
+        with self._lock:
+            cursor = conn.cursor()
+            self.refresh(cursor)
+            cursor.close()
+
+            self.ensure_dates(conn, transformed_data['date_dim'], batch_size)
+
+            # Key tạm của transformer -> GoldType -> GoldTypeKey thật
+            gold_type_dim = transformed_data['gold_type_dim']
+            created_at = gold_type_dim['Created_at'].iloc[0] if len(gold_type_dim) else None
+            keys = self.resolve_gold_types(
+                conn, gold_type_dim['GoldType'],
+                created_at.to_pydatetime() if isinstance(created_at, pd.Timestamp) else created_at,
+                batch_size)
+            temp_to_real = gold_type_dim.set_index('GoldTypeKey')['GoldType'].map(keys)
+
+            # Signature sau khi insert miss: lần load sau không nạp lại vì key của chính mình
+            cursor = conn.cursor()
+            self._signatures = self._read_signatures(cursor)
+            cursor.close()
+
+        fact_table = transformed_data['fact_table']
+        fact_rows = fact_table.assign(
+            GoldTypeKey=fact_table['GoldTypeKey'].map(temp_to_real),
+            DateKey=fact_table['DateKey'].astype(int)
+        )
+        if fact_rows['GoldTypeKey'].isna().any():
+            raise ValueError("Fact rows reference gold types missing from gold_type_dim")
+
+        bulk_insert(conn, """
+            INSERT INTO FactGoldPrices
+            (GoldTypeKey, DateKey, BuyPrice, SellPrice, PriceDifference, PriceDifferencePercentage)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, frame_to_rows(fact_rows.astype({'GoldTypeKey': 'int64'}),
+                           ['GoldTypeKey', 'DateKey', 'BuyPrice', 'SellPrice',
+                            'PriceDifference', 'PriceDifferencePercentage']),
+            batch_size, 'fact rows')
+        print(f"Star schema loaded with key cache in {time.perf_counter() - started:.2f}s ({self.stats()})")
+        return len(fact_rows)
+
+    def stats(self):
+        stats = dict(self.metrics)
+        stats.update({'gold_types': len(self.gold_type_keys), 'dates': len(self.date_keys)})
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_dimension_cache():
+    """Dimension cache dùng chung cho cả process"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = DimensionCache()
+        return _cache
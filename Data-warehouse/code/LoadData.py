@@ -1,7 +1,6 @@
 import json
 import csv
 from selenium import webdriver
-from selenium.webdriver.common.by import By
 import pyodbc
 import os
 import sys
@@ -14,6 +13,17 @@ import urllib.parse
 import schedule
 import logging
 from DataExtractor import DataExtractor
+from BulkLoader import load_star_schema_chunks, refresh_aggregates
+from ConnectionPool import configure_pools
+from LogSink import configure_log_sink, get_log_sink
+from BrowserPool import configure_browser_pool, get_browser_pool, PNJ_URL, PRICE_ROW_SELECTOR
+from ChangeDetector import price_fingerprint, record_skipped_job
+from DimensionCache import get_dimension_cache
+from TimestampParser import parse_timestamps, format_timestamps
+from CalendarDimension import calendar_years, populate_dim_date
+from SnapshotManager import (SnapshotManager, BACKUP_PREFIX, TIMESTAMP_FORMAT, ROW_HASH_EXPRESSION,
+                             ensure_row_hash, merge_new_rows)
+from Watermark import SCHEDULER_WAREHOUSE_UPDATE, ensure_row_version, get_watermark, set_watermark, staging_query
 
 # Class để tạo object connection và lấy connection_string
 class Connection:
@@ -89,86 +99,81 @@ def log_to_csv(log_data, csv_file_path):
 
 # Hàm chính để ghi log
 def create_log(name, action, source, level, csv_file_path):
-    """Hàm logging tổng hợp"""
-    max_retries = 3
-    retry_count = 0
+    """Hàm logging tổng hợp - ghi database và CSV bất đồng bộ qua log sink"""
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-    while retry_count < max_retries:
-        try:
-            # Ghi log vào database
-            connection = Connection(default_db='control_db')
-            conn = pyodbc.connect(connection.connection_string)
-            cursor = conn.cursor()
-            
-            sql_insert_log = """
-            INSERT INTO Logs (name, action, source, timestamp, level)
-            VALUES (?, ?, ?, ?, ?);
-            """
-            cursor.execute(sql_insert_log, (name, action, source, timestamp, level))
-            conn.commit()
-            
-            # Ghi log vào CSV
-            log_data = [None, name, action, source, timestamp, level, os.path.abspath(__file__)]
-            with open(csv_file_path, mode='a', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(log_data)
-            
-            conn.close()
-            break
-        except Exception as e:
-            retry_count += 1
-            if retry_count == max_retries:
-                print(f"Error creating log after {max_retries} attempts: {e}")
-                raise
-            time.sleep(2)
+    sink = get_log_sink()
+
+    # Ghi log vào database control_db
+    connection = Connection(default_db='control_db')
+    sink.log_db(connection.connection_string, """
+    INSERT INTO Logs (name, action, source, timestamp, level)
+    VALUES (?, ?, ?, ?, ?);
+    """, (name, action, source, timestamp, level))
+
+    # Ghi log vào CSV
+    log_data = [None, name, action, source, timestamp, level, os.path.abspath(__file__)]
+    sink.log_csv(csv_file_path, log_data)
+
+
+# Map tên cột nguồn -> tên cột chuẩn
+CSV_COLUMN_MAPPING = {
+    'GoldType': ['GoldType', 'type', 'Type'],
+    'BuyPrice': ['BuyPrice', 'buy', 'Buy'],
+    'SellPrice': ['SellPrice', 'sell', 'Sell'],
+    'UpdateTime': ['UpdateTime', 'update', 'Update']
+}
+
+
+def read_csv_chunks(file_path, chunk_size=100000):
+    """Đọc CSV theo từng chunk chunk_size dòng, mỗi chunk trả về list dict
+    (GoldType, BuyPrice, SellPrice, UpdateTime) - bộ nhớ không phụ thuộc kích thước file
+    """
+    actual_columns = None
+    total_rows = 0
+    for chunk_no, df in enumerate(pd.read_csv(file_path, chunksize=chunk_size), 1):
+        # Find actual column names
+        if actual_columns is None:
+            actual_columns = {}
+            for target, possible_names in CSV_COLUMN_MAPPING.items():
+                for name in possible_names:
+                    if name in df.columns:
+                        actual_columns[target] = name
+                        break
+            if len(actual_columns) != 4:
+                raise ValueError(f"Missing required columns. Found: {df.columns}")
+
+        # Parse update time theo giá trị khác nhau, giá trị lỗi lấy thời điểm hiện tại
+        update_time = parse_timestamps(df[actual_columns['UpdateTime']], source='csv')
+        if update_time.isna().any():
+            print(f"Cannot parse time from CSV for {update_time.isna().sum()} rows, using current time")
+            update_time = update_time.fillna(pd.Timestamp(datetime.now().replace(microsecond=0)))
+
+        # Convert prices, bỏ các dòng giá không hợp lệ
+        buy_price = pd.to_numeric(
+            df[actual_columns['BuyPrice']].astype(str).str.replace(',', '', regex=False), errors='coerce')
+        sell_price = pd.to_numeric(
+            df[actual_columns['SellPrice']].astype(str).str.replace(',', '', regex=False), errors='coerce')
+        valid = buy_price.notna() & sell_price.notna()
+        if not valid.all():
+            print(f"Error converting values in {(~valid).sum()} rows of chunk {chunk_no}, skipped")
+
+        chunk = pd.DataFrame({
+            'GoldType': df[actual_columns['GoldType']].astype(str),
+            'BuyPrice': buy_price,
+            'SellPrice': sell_price,
+            'UpdateTime': format_timestamps(update_time, '%Y-%m-%d %H:%M:%S')
+        })[valid]
+        total_rows += len(df)
+        print(f"CSV chunk {chunk_no}: {len(chunk)} valid rows (total {total_rows} rows read)")
+        yield chunk.to_dict('records')
 
 
 # Đọc CSV
-def read_csv(file_path):
+def read_csv(file_path, chunk_size=100000):
     try:
-        df = pd.read_csv(file_path)
         gold_prices = []
-        
-        # Map column names
-        column_mapping = {
-            'GoldType': ['GoldType', 'type', 'Type'],
-            'BuyPrice': ['BuyPrice', 'buy', 'Buy'],
-            'SellPrice': ['SellPrice', 'sell', 'Sell'],
-            'UpdateTime': ['UpdateTime', 'update', 'Update']
-        }
-        
-        # Find actual column names
-        actual_columns = {}
-        for target, possible_names in column_mapping.items():
-            for name in possible_names:
-                if name in df.columns:
-                    actual_columns[target] = name
-                    break
-                    
-        if len(actual_columns) != 4:
-            raise ValueError(f"Missing required columns. Found: {df.columns}")
-            
-        # Convert DataFrame to list of dictionaries
-        for _, row in df.iterrows():
-            try:
-                # Parse update time
-                update_str = str(row[actual_columns['UpdateTime']]).strip()
-                try:
-                    update_time = pd.to_datetime(update_str, format='%d/%m/%Y %H:%M:%S', dayfirst=True)
-                    update_time = update_time.strftime('%Y-%m-%d %H:%M:%S')
-                except ValueError:
-                    print(f"Cannot parse time from CSV. Value: '{update_str}'")
-                    update_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-
-                gold_prices.append({
-                    'GoldType': str(row[actual_columns['GoldType']]),
-                    'BuyPrice': float(str(row[actual_columns['BuyPrice']]).replace(',', '')),
-                    'SellPrice': float(str(row[actual_columns['SellPrice']]).replace(',', '')),
-                    'UpdateTime': update_time
-                })
-            except ValueError as e:
-                print(f"Error converting values in row: {row} - Error: {e}")
+        for records in read_csv_chunks(file_path, chunk_size):
+            gold_prices.extend(records)
         return gold_prices
     except Exception as e:
         print(f"Error reading CSV file: {e}")
@@ -203,22 +208,18 @@ def read_excel(file_path):
         if len(actual_columns) != 4:
             raise ValueError(f"Missing required columns. Found: {df.columns}")
             
+        # Parse update time một lần cho cả cột (mỗi giá trị khác nhau parse một lần)
+        update_times = parse_timestamps(df[actual_columns['UpdateTime']], source='excel')
+        unparsed = update_times.isna()
+        if unparsed.any():
+            print(f"Cannot parse time from Excel for {unparsed.sum()} rows, using current time")
+            update_times = update_times.fillna(pd.Timestamp.now())
+        update_times = format_timestamps(update_times, '%Y-%m-%d %H:%M:%S')
+
         # Convert DataFrame to list of dictionaries
-        for _, row in df.iterrows():
+        for index, row in df.iterrows():
             try:
-                update_str = str(row[actual_columns['UpdateTime']]).strip()
-                try:
-                    # First try with explicit format and dayfirst=True
-                    update_time = pd.to_datetime(update_str, format='%d/%m/%Y %H:%M:%S', dayfirst=True)
-                except ValueError:
-                    try:
-                        # Then try with just dayfirst=True
-                        update_time = pd.to_datetime(update_str, dayfirst=True)
-                    except ValueError:
-                        print(f"Cannot parse time from Excel. Value: '{update_str}'")
-                        update_time = pd.Timestamp.now()
-                
-                update_time = update_time.strftime('%Y-%m-%d %H:%M:%S')
+                update_time = update_times[index]
 
                 gold_prices.append({
                     'GoldType': str(row[actual_columns['GoldType']]).strip(),
@@ -260,19 +261,6 @@ def read_json(file_path):
                 if isinstance(sell_price, str):
                     sell_price = float(sell_price.replace(',', ''))
                     
-                # Convert update time to standard format
-                if isinstance(update_time, str):
-                    try:
-                        update_time = pd.to_datetime(update_time, format='%d/%m/%Y %H:%M:%S', dayfirst=True)
-                        update_time = update_time.strftime('%Y-%m-%d %H:%M:%S')
-                    except ValueError:
-                        try:
-                            update_time = pd.to_datetime(update_time, format='%Y-%m-%d %H:%M:%S')
-                            update_time = update_time.strftime('%Y-%m-%d %H:%M:%S')
-                        except ValueError:
-                            print(f"Cannot parse time: '{update_time}'")
-                            update_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                
                 gold_prices.append({
                     'GoldType': str(gold_type),
                     'BuyPrice': float(buy_price),
@@ -281,7 +269,17 @@ def read_json(file_path):
                 })
             except (ValueError, TypeError) as e:
                 print(f"Error converting values in item: {item} - Error: {e}")
-                
+
+        # Convert update time to standard format: parse cả cột một lần thay vì từng item
+        if gold_prices:
+            update_times = parse_timestamps(pd.Series([record['UpdateTime'] for record in gold_prices]), source='json')
+            unparsed = update_times.isna()
+            if unparsed.any():
+                print(f"Cannot parse time for {unparsed.sum()} items, using current time")
+                update_times = update_times.fillna(pd.Timestamp(datetime.now().replace(microsecond=0)))
+            for record, update_time in zip(gold_prices, format_timestamps(update_times, '%Y-%m-%d %H:%M:%S')):
+                record['UpdateTime'] = update_time
+
         return gold_prices
     except Exception as e:
         print(f"Error reading JSON file: {e}")
@@ -290,31 +288,26 @@ def read_json(file_path):
 # Crawl dữ liệu từ trang web
 def crawl_gold_prices(csv_file_path, connection_string):
     try:
-        options = webdriver.EdgeOptions()
-        options.add_argument('--headless')
-        driver = webdriver.Edge(options=options)
-
-        url = 'https://www.pnj.com.vn/blog/gia-vang'
-        driver.get(url)
-
-        rows = driver.find_elements(By.CSS_SELECTOR, '#content-price tr')
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        gold_prices = []
-
-        for row in rows:
-            columns = row.find_elements(By.TAG_NAME, 'td')
-            if len(columns) == 3:
-                gold_type = columns[0].text
-                buy_price = columns[1].text.replace(',', '')
-                sell_price = columns[2].text.replace(',', '')
-                gold_prices.append({
-                    "GoldType": gold_type,
-                    "BuyPrice": float(buy_price),
-                    "SellPrice": float(sell_price),
-                    "UpdateTime": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                })
-
-        driver.quit()
+        # Dùng lại browser trong pool, chờ bảng giá có dữ liệu thay vì mở browser mới mỗi lần
+        pool = get_browser_pool()
+        with pool.session() as driver:
+            pool.load_page(driver, PNJ_URL, PRICE_ROW_SELECTOR)
+
+            rows = pool.read_rows(driver, PRICE_ROW_SELECTOR)
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            gold_prices = []
+
+            for columns in rows:
+                if len(columns) == 3:
+                    gold_type = columns[0]
+                    buy_price = columns[1].replace(',', '')
+                    sell_price = columns[2].replace(',', '')
+                    gold_prices.append({
+                        "GoldType": gold_type,
+                        "BuyPrice": float(buy_price),
+                        "SellPrice": float(sell_price),
+                        "UpdateTime": datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    })
 
         # Sử dụng đường dẫn tuyệt đối
         base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -343,16 +336,18 @@ def load_data_to_database(data, connection_string, table_name):
 
         # Kiểm tra và tạo bảng nếu chưa tồn tại
         if table_name == 'GoldPrices_temp':
-            cursor.execute("""
+            cursor.execute(f"""
                 IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = 'GoldPrices_temp')
                 CREATE TABLE GoldPrices_temp (
                     gold_id INT IDENTITY(1,1) PRIMARY KEY,
                     GoldType NVARCHAR(255) NOT NULL,
                     BuyPrice FLOAT NULL,
                     SellPrice FLOAT NULL,
-                    UpdateTime DATETIME NULL
+                    UpdateTime DATETIME NULL,
+                    RowHash AS {ROW_HASH_EXPRESSION} PERSISTED
                 )
             """)
+            ensure_row_hash(cursor, 'GoldPrices_temp')
             conn.commit()
 
         # Thêm dữ liệu vào cơ sở dữ liệu
@@ -375,39 +370,20 @@ def load_data_to_database(data, connection_string, table_name):
 
 # Tối ưu hàm logging
 def create_log(name, action, source, level, csv_file_path):
-    """Hàm logging tổng hợp"""
-    max_retries = 3
-    retry_count = 0
+    """Hàm logging tổng hợp - ghi database và CSV bất đồng bộ qua log sink"""
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    sink = get_log_sink()
 
-    while retry_count < max_retries:
-        try:
-            # Ghi log vào database
-            connection = Connection(default_db='control_db')
-            conn = pyodbc.connect(connection.connection_string)
-            cursor = conn.cursor()
-            
-            sql_insert_log = """
-            INSERT INTO Logs (name, action, source, timestamp, level)
-            VALUES (?, ?, ?, ?, ?);
-            """
-            cursor.execute(sql_insert_log, (name, action, source, timestamp, level))
-            conn.commit()
-            
-            # Ghi log vào CSV
-            log_data = [None, name, action, source, timestamp, level, os.path.abspath(__file__)]
-            with open(csv_file_path, mode='a', newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow(log_data)
-            
-            conn.close()
-            break
-        except Exception as e:
-            retry_count += 1
-            if retry_count == max_retries:
-                print(f"Error creating log after {max_retries} attempts: {e}")
-                raise
-            time.sleep(2)
+    # Ghi log vào database control_db
+    connection = Connection(default_db='control_db')
+    sink.log_db(connection.connection_string, """
+    INSERT INTO Logs (name, action, source, timestamp, level)
+    VALUES (?, ?, ?, ?, ?);
+    """, (name, action, source, timestamp, level))
+
+    # Ghi log vào CSV
+    log_data = [None, name, action, source, timestamp, level, os.path.abspath(__file__)]
+    sink.log_csv(csv_file_path, log_data)
 
 # Cập nhật ETLScheduler
 class ETLScheduler:
@@ -438,8 +414,31 @@ class ETLScheduler:
             
             # Khởi tạo các components
             self.connection = Connection(self.config_path)
-            self.extractor = DataExtractor(output_dir=self.data_dir)
-            self.transformer = DataTransformer()
+            configure_pools(self.config['database'].get('pool', {}))
+            configure_log_sink(self.config.get('logging', {}))
+            configure_browser_pool(self.config.get('crawler', {}))
+            self.extractor = DataExtractor(
+                output_dir=self.data_dir,
+                staging_format=self.config.get('etl', {}).get('staging_format', 'json'),
+                crawl_mode=self.config.get('crawler', {}).get('mode', 'auto'),
+                http_timeout=self.config.get('crawler', {}).get('http_timeout_seconds', 10),
+                skip_unchanged=self.config.get('crawler', {}).get('skip_unchanged', True)
+            )
+            transform_config = self.config.get('etl', {}).get('transform', {})
+            self.transformer = DataTransformer(
+                lean=transform_config.get('mode', 'lean') == 'lean',
+                track_memory=transform_config.get('track_memory', False),
+                backend=transform_config.get('backend', 'pandas')
+            )
+            self.chunk_size = self.config.get('etl', {}).get('chunk_size') or 100000
+            self.key_cache = get_dimension_cache() if self.config.get('etl', {}).get('key_cache', True) else None
+            # Năm cần điền sẵn DimDate, None sau lần load warehouse thành công đầu tiên
+            self.pending_calendar = calendar_years(self.config.get('etl', {}).get('calendar', {}))
+            self.snapshot_manager = SnapshotManager.from_config(
+                self.connection.create_connection_string('staging_db'),
+                self.connection.create_connection_string('control_db'),
+                self.config.get('etl', {}).get('backups', {})
+            )
             
             # Thiết lập logging
             log_file = os.path.join(self.logs_dir, 'etl_scheduler.log')
@@ -460,7 +459,10 @@ class ETLScheduler:
             return json.load(f)
 
     def run_warehouse_update_task(self):
-        """Cập nhật warehouse từ staging"""
+        """Cập nhật warehouse từ staging
+        GoldPrices giữ toàn bộ lịch sử (compare_and_load_gold_prices chỉ thêm dòng mới): chỉ đọc các dòng
+        được ghi sau watermark 'scheduler_warehouse_update' (RowVer), watermark tiến sau khi load thành công
+        """
         try:
             self.logger.info("Starting warehouse update task")
             self.connection.switch_database('staging_db')
@@ -480,33 +482,58 @@ class ETLScheduler:
                     UpdateTime DATETIME NULL
                 )
             """)
+            ensure_row_version(cursor)
             conn.commit()
             
-            # Lấy dữ liệu từ staging
-            cursor.execute("SELECT GoldType, BuyPrice, SellPrice, UpdateTime FROM GoldPrices")
-            rows = cursor.fetchall()
-            
-            if not rows:
-                print("No data in staging database")
-                return
-            
-            # Chuyển đổi dữ liệu sang DataFrame
-            data = []
-            for row in rows:
-                data.append({
-                    'GoldType': row[0],
-                    'BuyPrice': float(row[1]),
-                    'SellPrice': float(row[2]),
-                    'UpdateTime': row[3]
-                })
-            
-            # Transform dữ liệu
-            transformed_data = self.transformer.transform_data(data)
-            
-            # Load vào warehouse
-            self.connection.switch_database('warehouse_db')
-            load_transformed_data_to_warehouse(transformed_data, self.connection.connection_string)
-            self.logger.info("Warehouse update completed")
+            # Lấy các dòng staging mới kể từ lần cập nhật trước
+            control_conn_str = self.connection.create_connection_string('control_db')
+            query, params = staging_query(get_watermark(control_conn_str, SCHEDULER_WAREHOUSE_UPDATE),
+                                          'GoldType, BuyPrice, SellPrice, UpdateTime, CAST(RowVer AS BIGINT) AS RowVer')
+            try:
+                cursor.execute(query, *params)
+                # Đọc từng chunk chunk_size dòng; chế độ lean transform và load lần lượt từng chunk
+                state = {'first': cursor.fetchmany(self.chunk_size), 'records': 0,
+                         'update_time': None, 'row_version': None}
+                if not state['first']:
+                    print("No new data in staging database")
+                    return
+
+                def staging_chunks():
+                    rows = state.pop('first')
+                    while rows:
+                        update_time = max((row[3] for row in rows if row[3] is not None), default=None)
+                        if update_time is not None:
+                            state['update_time'] = max(update_time, state['update_time'] or update_time)
+                        state['row_version'] = max(max(row[4] for row in rows), state['row_version'] or 0)
+                        state['records'] += len(rows)
+                        chunk = [{
+                            'GoldType': row[0],
+                            'BuyPrice': float(row[1]),
+                            'SellPrice': float(row[2]),
+                            'UpdateTime': row[3]
+                        } for row in rows]
+                        del rows
+                        yield chunk
+                        del chunk
+                        rows = cursor.fetchmany(self.chunk_size)
+
+                # Transform dữ liệu
+                if self.transformer.lean:
+                    transformed_data = self.transformer.transform_chunks(staging_chunks())
+                else:
+                    transformed_data = self.transformer.transform_data(
+                        [record for chunk in staging_chunks() for record in chunk])
+
+                # Load vào warehouse
+                self.connection.switch_database('warehouse_db')
+                load_transformed_data_to_warehouse(transformed_data, self.connection.connection_string,
+                                                   os.path.join(self.logs_dir, 'logs.csv'), key_cache=self.key_cache,
+                                                   calendar=self.pending_calendar)
+            finally:
+                conn.close()
+            self.pending_calendar = None
+            set_watermark(control_conn_str, SCHEDULER_WAREHOUSE_UPDATE, state['update_time'], state['row_version'])
+            self.logger.info(f"Warehouse update completed, {state['records']} new staging rows")
             
         except Exception as e:
             print(f"Error in warehouse update task: {str(e)}")
@@ -530,6 +557,13 @@ class ETLScheduler:
                 if file_ext in file_handlers:
                     self.logger.info(f"Processing {file_ext} file: {file}")
                     file_path = os.path.join(self.data_dir, file)
+                    if file_ext == '.csv':
+                        # CSV có thể rất lớn: load từng chunk vào staging
+                        for chunk_no, data in enumerate(read_csv_chunks(file_path, self.chunk_size), 1):
+                            if data:
+                                load_data_to_database(data, self.connection.connection_string, 'GoldPrices_temp')
+                            self.logger.info(f"Loaded chunk {chunk_no} of {file}: {len(data)} records")
+                        continue
                     data = file_handlers[file_ext](file_path)
                     if data:
                         load_data_to_database(data, self.connection.connection_string, 'GoldPrices_temp')
@@ -539,6 +573,15 @@ class ETLScheduler:
         except Exception as e:
             self.logger.error(f"Error in file processing task: {str(e)}")
 
+    def record_skipped_jobs(self, job_names, reason):
+        """Ghi các job bị bỏ qua vào Job_Status (status 'SKIPPED') trong control_db"""
+        control_conn_str = self.connection.create_connection_string('control_db')
+        for job_name in job_names:
+            try:
+                record_skipped_job(control_conn_str, job_name, reason)
+            except Exception as e:
+                self.logger.error(f"Could not record skipped job {job_name}: {str(e)}")
+
     def run_web_crawling_task(self):
         """Chạy task crawl dữ liệu từ web"""
         print("\nStarting web crawling task...")
@@ -555,9 +598,18 @@ class ETLScheduler:
             json_file = crawl_gold_prices(log_file, self.connection.connection_string)
             print(f"Web crawling completed. Data saved to: {json_file}")
             
+            # Bảng giá giống hệt snapshot đã load gần nhất thì không load lại staging / warehouse
+            data = read_json(json_file)
+            fingerprint = price_fingerprint(data) if data else None
+            if fingerprint and self.extractor.skip_unchanged and self.extractor.snapshots.is_unchanged('pnj', fingerprint):
+                reason = f"PNJ prices unchanged since last snapshot ({fingerprint[:12]})"
+                print(reason + ", skipping staging and warehouse load")
+                self.logger.info(reason)
+                self.record_skipped_jobs(['load_staging', 'transform_gold_data', 'load_warehouse'], reason)
+                return
+
             # Load dữ liệu vào staging
             print("Loading data to staging database...")
-            data = read_json(json_file)
             if data:
                 load_data_to_database(data, self.connection.connection_string, 'GoldPrices_temp')
                 print("Data loaded to staging database")
@@ -566,14 +618,28 @@ class ETLScheduler:
             print("Transforming and loading data to warehouse...")
             transformed_data = self.transformer.transform_data(data)
             self.connection.switch_database('warehouse_db')
-            load_transformed_data_to_warehouse(transformed_data, self.connection.connection_string, log_file)
+            load_transformed_data_to_warehouse(transformed_data, self.connection.connection_string, log_file,
+                                               key_cache=self.key_cache, calendar=self.pending_calendar)
+            self.pending_calendar = None
             print("Data loaded to warehouse database")
+            if fingerprint:
+                self.extractor.snapshots.save('pnj', fingerprint, len(data), json_file)
             
         except Exception as e:
             print(f"Error in web crawling task: {str(e)}")
             self.logger.error(f"Error in web crawling task: {str(e)}")
             raise
 
+    def run_backup_compaction_task(self):
+        """Gộp các bảng GoldPrices_backup_* vào history và drop các bản ngoài retention"""
+        try:
+            self.logger.info("Starting backup compaction task")
+            summary = self.snapshot_manager.compact()
+            self.logger.info(f"Backup compaction completed: {summary}")
+        except Exception as e:
+            print(f"Error in backup compaction task: {str(e)}")
+            self.logger.error(f"Error in backup compaction task: {str(e)}")
+
     def setup_schedules(self):
         """Thiết lập lịch chạy các task"""
         try:
@@ -599,6 +665,7 @@ class ETLScheduler:
             backup_time = scheduler_config['backup_time']
             print(f"Setting up daily backup task to run at {backup_time}")
             schedule.every().day.at(backup_time).do(self.run_warehouse_update_task)
+            schedule.every().day.at(backup_time).do(self.run_backup_compaction_task)
             
             print("All schedules have been set up")
             self.logger.info("Schedules have been set up")
@@ -629,7 +696,12 @@ class ETLScheduler:
             raise
 
 def compare_and_load_gold_prices(connection_string, log_file):
-    """So sánh và load dữ liệu từ bảng temp vào bảng chính"""
+    """So sánh và load dữ liệu từ bảng temp vào bảng chính
+    Dedupe theo RowHash (GoldType, BuyPrice, SellPrice, UpdateTime; có index): MERGE chỉ insert các dòng chưa có
+    trong GoldPrices, giá quay lại mức cũ ở thời điểm khác vẫn được insert.
+    backup GoldPrices_backup_<timestamp> chỉ chứa các dòng vừa insert (delta) thay vì cả bảng.
+    GoldPrices giữ toàn bộ lịch sử: run_warehouse_update_task chỉ đọc các dòng mới theo watermark RowVer
+    """
     max_retries = 3
     retry_count = 0
     conn = None
@@ -639,34 +711,43 @@ def compare_and_load_gold_prices(connection_string, log_file):
             conn = pyodbc.connect(connection_string)
             cursor = conn.cursor()
 
-            # So sánh dữ liệu trong bảng temp với bảng chính
+            # Bảng tạo trước khi có RowHash: thêm cột computed + index
+            ensure_row_hash(cursor, 'GoldPrices')
+            ensure_row_hash(cursor, 'GoldPrices_temp')
+            conn.commit()
+
+            # MERGE theo RowHash: chỉ insert dòng mới (mỗi hash lấy dòng mới nhất trong temp),
+            # các dòng vừa insert được ghi vào #NewRows
             cursor.execute("""
-                SELECT COUNT(*)
-                FROM GoldPrices_temp t
-                LEFT JOIN GoldPrices p
-                ON t.GoldType = p.GoldType
-                AND t.BuyPrice = p.BuyPrice
-                AND t.SellPrice = p.SellPrice
-                WHERE p.GoldType IS NULL
+                CREATE TABLE #NewRows (
+                    gold_id INT,
+                    GoldType NVARCHAR(255),
+                    BuyPrice FLOAT,
+                    SellPrice FLOAT,
+                    UpdateTime DATETIME,
+                    RowHash BINARY(32)
+                )
             """)
-            diff_count = cursor.fetchone()[0]
+            diff_count = merge_new_rows(cursor, 'GoldPrices_temp', '#NewRows')
 
+            backup_time = datetime.now()
+            backup_table = BACKUP_PREFIX + backup_time.strftime(TIMESTAMP_FORMAT)
             if diff_count > 0:
-                # Backup bảng cũ trước khi cập nhật
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+                # Backup incremental: chỉ lưu các dòng vừa thêm (gold_id để rollback lần load này)
                 cursor.execute(f"""
-                    SELECT * INTO GoldPrices_backup_{timestamp}
-                    FROM GoldPrices
-                """)
-                
-                # Cập nhật dữ liệu mới
-                cursor.execute("TRUNCATE TABLE GoldPrices")
-                cursor.execute("""
-                    INSERT INTO GoldPrices (GoldType, BuyPrice, SellPrice, UpdateTime)
-                    SELECT GoldType, BuyPrice, SellPrice, UpdateTime FROM GoldPrices_temp
+                    SELECT * INTO {backup_table}
+                    FROM #NewRows
                 """)
-                conn.commit()
+            cursor.execute("DROP TABLE #NewRows")
+            conn.commit()
 
+            if diff_count > 0:
+                # Ghi nhận backup trong control_db; lỗi ở đây không làm hỏng lần load (discover() ghi nhận sau)
+                try:
+                    SnapshotManager(connection_string, Connection(default_db='control_db').connection_string).register(
+                        backup_table, 'DELTA', backup_time.replace(microsecond=0), diff_count)
+                except Exception as register_error:
+                    print(f"Could not register backup {backup_table}: {str(register_error)}")
                 create_log(
                     "LoadGoldPricesSuccess",
                     f"Loaded {diff_count} new records",
@@ -701,121 +782,26 @@ def compare_and_load_gold_prices(connection_string, log_file):
             if conn:
                 conn.close()
 
-def load_transformed_data_to_warehouse(transformed_data, warehouse_connection_string, log_file):
-    """Load dữ liệu đã được transform vào warehouse"""
+def load_transformed_data_to_warehouse(transformed_data, warehouse_connection_string, log_file, batch_size=1000,
+                                       key_cache=None, calendar=None):
+    """Load dữ liệu đã được transform vào warehouse
+    transformed_data: dict của transform_data hoặc các chunk của transform_chunks (load lần lượt từng chunk)
+    Dữ liệu luôn là phần mới thêm vào fact: aggregate của các ngày / tháng vừa load được tính lại từ FactGoldPrices
+    key_cache (DimensionCache): tra surrogate key trong bộ nhớ thay cho MERGE dimension mỗi lần
+    calendar: (start_year, end_year) - điền sẵn DimDate trước khi load
+    """
     conn = None
     try:
         conn = pyodbc.connect(warehouse_connection_string)
-        cursor = conn.cursor()
 
-        # 1. Load Date Dimension
-        for _, row in transformed_data['date_dim'].iterrows():
-            try:
-                cursor.execute("""
-                    IF NOT EXISTS (SELECT 1 FROM DimDate WHERE DateKey = ?)
-                    INSERT INTO DimDate (DateKey, Date, Year, Month, Day, Quarter)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, row['DateKey'], row['DateKey'], row['Date'],
-                            row['Year'], row['Month'], row['Day'], row['Quarter'])
-            except Exception as e:
-                print(f"Error loading date dimension: {e}")
-                continue
+        if calendar:
+            populate_dim_date(conn, *calendar, batch_size)
 
-        # 2. Load Gold Type Dimension
-        for _, row in transformed_data['gold_type_dim'].iterrows():
-            try:
-                cursor.execute("""
-                    IF NOT EXISTS (SELECT 1 FROM DimGoldType WHERE GoldType = ?)
-                    INSERT INTO DimGoldType (GoldType)
-                    VALUES (?)
-                """, row['GoldType'], row['GoldType'])
-            except Exception as e:
-                print(f"Error loading gold type dimension: {e}")
-                continue
+        # 1-3. Load Date Dimension, Gold Type Dimension và Fact Table (set-based)
+        _, date_keys = load_star_schema_chunks(conn, transformed_data, batch_size, key_cache=key_cache)
 
-        # 3. Load Fact Table
-        for _, row in transformed_data['fact_table'].iterrows():
-            try:
-                cursor.execute("""
-                    INSERT INTO FactGoldPrices 
-                    (GoldTypeKey, DateKey, BuyPrice, SellPrice, PriceDifference, PriceDifferencePercentage)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, row['GoldTypeKey'], row['DateKey'], row['BuyPrice'],
-                            row['SellPrice'], row['PriceDifference'], row['PriceDifferencePercentage'])
-            except Exception as e:
-                print(f"Error loading fact table: {e}")
-                continue
-
-        # 4. Load Daily Aggregates
-        for date_key, row in transformed_data['daily_agg'].iterrows():
-            try:
-                cursor.execute("""
-                    MERGE INTO AggDailyGoldPrices AS target
-                    USING (VALUES (?, ?, ?, ?, ?, ?, ?, ?)) AS source 
-                    (DateKey, AvgBuyPrice, MinBuyPrice, MaxBuyPrice, 
-                     AvgSellPrice, MinSellPrice, MaxSellPrice, AvgPriceDifference)
-                    ON target.DateKey = source.DateKey
-                    WHEN MATCHED THEN
-                        UPDATE SET 
-                            AvgBuyPrice = source.AvgBuyPrice,
-                            MinBuyPrice = source.MinBuyPrice,
-                            MaxBuyPrice = source.MaxBuyPrice,
-                            AvgSellPrice = source.AvgSellPrice,
-                            MinSellPrice = source.MinSellPrice,
-                            MaxSellPrice = source.MaxSellPrice,
-                            AvgPriceDifference = source.AvgPriceDifference
-                    WHEN NOT MATCHED THEN
-                        INSERT (DateKey, AvgBuyPrice, MinBuyPrice, MaxBuyPrice, 
-                               AvgSellPrice, MinSellPrice, MaxSellPrice, AvgPriceDifference)
-                        VALUES (source.DateKey, source.AvgBuyPrice, source.MinBuyPrice, source.MaxBuyPrice,
-                               source.AvgSellPrice, source.MinSellPrice, source.MaxSellPrice, source.AvgPriceDifference);
-                """, date_key, 
-                    row[('BuyPrice', 'mean')], 
-                    row[('BuyPrice', 'min')],
-                    row[('BuyPrice', 'max')], 
-                    row[('SellPrice', 'mean')],
-                    row[('SellPrice', 'min')], 
-                    row[('SellPrice', 'max')],
-                    row[('PriceDifference', 'mean')])
-            except Exception as e:
-                print(f"Error loading daily aggregates: {e}")
-                continue
-
-        # 5. Load Monthly Aggregates
-        for (year, month), row in transformed_data['monthly_agg'].iterrows():
-            try:
-                cursor.execute("""
-                    MERGE INTO AggMonthlyGoldPrices AS target
-                    USING (VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)) AS source 
-                    (Year, Month, AvgBuyPrice, MinBuyPrice, MaxBuyPrice,
-                     AvgSellPrice, MinSellPrice, MaxSellPrice, AvgPriceDifference)
-                    ON target.Year = source.Year AND target.Month = source.Month
-                    WHEN MATCHED THEN
-                        UPDATE SET 
-                            AvgBuyPrice = source.AvgBuyPrice,
-                            MinBuyPrice = source.MinBuyPrice,
-                            MaxBuyPrice = source.MaxBuyPrice,
-                            AvgSellPrice = source.AvgSellPrice,
-                            MinSellPrice = source.MinSellPrice,
-                            MaxSellPrice = source.MaxSellPrice,
-                            AvgPriceDifference = source.AvgPriceDifference
-                    WHEN NOT MATCHED THEN
-                        INSERT (Year, Month, AvgBuyPrice, MinBuyPrice, MaxBuyPrice,
-                               AvgSellPrice, MinSellPrice, MaxSellPrice, AvgPriceDifference)
-                        VALUES (source.Year, source.Month, source.AvgBuyPrice, source.MinBuyPrice, 
-                               source.MaxBuyPrice, source.AvgSellPrice, source.MinSellPrice,
-                               source.MaxSellPrice, source.AvgPriceDifference);
-                """, year, month, 
-                    row[('BuyPrice', 'mean')], 
-                    row[('BuyPrice', 'min')],
-                    row[('BuyPrice', 'max')], 
-                    row[('SellPrice', 'mean')],
-                    row[('SellPrice', 'min')], 
-                    row[('SellPrice', 'max')],
-                    row[('PriceDifference', 'mean')])
-            except Exception as e:
-                print(f"Error loading monthly aggregates: {e}")
-                continue
+        # 4-5. Tính lại Daily / Monthly Aggregates của các ngày / tháng vừa load từ FactGoldPrices
+        refresh_aggregates(conn, date_keys)
 
         conn.commit()
         create_log(
@@ -830,6 +816,9 @@ def load_transformed_data_to_warehouse(transformed_data, warehouse_connection_st
     except Exception as e:
         if conn:
             conn.rollback()
+        if key_cache is not None:
+            # Key vừa insert đã bị rollback
+            key_cache.invalidate()
         create_log(
             "LoadTransformedDataError",
             str(e),
@@ -0,0 +1,188 @@
+import atexit
+import csv
+import queue
+import threading
+import time
+from collections import defaultdict
+from ConnectionPool import pooled_connection
+
+_STOP = object()
+
+
+class AsyncLogSink:
+    """Ghi log bất đồng bộ theo lô
+    - Các hàm log chỉ đưa bản ghi vào hàng đợi có giới hạn rồi trả về ngay
+    - Worker thread gom bản ghi và flush khi đủ batch_size hoặc sau flush_interval giây:
+      mỗi (database, câu INSERT) một executemany + commit, mỗi file CSV một lần mở file
+    - Khi hàng đợi đầy: policy 'drop' bỏ bản ghi ngay, 'block' chờ tối đa block_timeout rồi mới bỏ;
+      số bản ghi bị bỏ được đếm trong counters['dropped'], log không bao giờ làm treo pipeline
+    """
+
+    def __init__(self, max_queue=10000, batch_size=100, flush_interval=2.0,
+                 policy='drop', block_timeout=0.5):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.policy = policy
+        self.block_timeout = block_timeout
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._closed = False
+        self.counters = {
+            'submitted': 0,
+            'written': 0,
+            'dropped': 0,
+            'write_errors': 0,
+            'batches': 0
+        }
+
+        self._worker = threading.Thread(target=self._run, name='AsyncLogSink', daemon=True)
+        self._worker.start()
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self.counters[name] += value
+
+    def _put(self, item):
+        if self._closed:
+            self._count('dropped')
+            return False
+        try:
+            if self.policy == 'block':
+                self._queue.put(item, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(item)
+        except queue.Full:
+            self._count('dropped')
+            return False
+        self._count('submitted')
+        return True
+
+    def log_db(self, connection_string, sql, params):
+        """Đưa một dòng INSERT log vào hàng đợi"""
+        return self._put(('db', connection_string, sql, tuple(params)))
+
+    def log_csv(self, csv_file_path, row):
+        """Đưa một dòng log CSV vào hàng đợi"""
+        return self._put(('csv', csv_file_path, None, list(row)))
+
+    def _run(self):
+        pending = []
+        last_flush = time.monotonic()
+        while True:
+            timeout = max(self.flush_interval - (time.monotonic() - last_flush), 0.01)
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._flush(pending)
+                return
+            if isinstance(item, threading.Event):
+                # Yêu cầu flush đồng bộ từ flush()
+                self._flush(pending)
+                pending = []
+                last_flush = time.monotonic()
+                item.set()
+                continue
+            if item is not None:
+                pending.append(item)
+
+            if len(pending) >= self.batch_size or time.monotonic() - last_flush >= self.flush_interval:
+                self._flush(pending)
+                pending = []
+                last_flush = time.monotonic()
+
+    def _flush(self, pending):
+        if not pending:
+            return
+
+        db_groups = defaultdict(list)
+        csv_groups = defaultdict(list)
+        for kind, target, sql, payload in pending:
+            if kind == 'db':
+                db_groups[(target, sql)].append(payload)
+            else:
+                csv_groups[target].append(payload)
+
+        for (connection_string, sql), rows in db_groups.items():
+            try:
+                with pooled_connection(connection_string) as conn:
+                    cursor = conn.cursor()
+                    cursor.executemany(sql, rows)
+                    conn.commit()
+                self._count('written', len(rows))
+                self._count('batches')
+            except Exception as e:
+                self._count('write_errors', len(rows))
+                print(f"Error flushing {len(rows)} log rows to database: {e}")
+
+        for csv_file_path, rows in csv_groups.items():
+            try:
+                with open(csv_file_path, mode='a', newline='') as file:
+                    csv.writer(file).writerows(rows)
+                self._count('written', len(rows))
+                self._count('batches')
+            except Exception as e:
+                self._count('write_errors', len(rows))
+                print(f"Error flushing {len(rows)} log rows to {csv_file_path}: {e}")
+
+    def flush(self, timeout=10):
+        """Chờ worker ghi hết các bản ghi đang có trong hàng đợi"""
+        if self._closed:
+            return False
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout=10):
+        """Flush toàn bộ và dừng worker (gọi khi tắt chương trình)"""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._worker.join(timeout)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        stats['queued'] = self._queue.qsize()
+        return stats
+
+
+_sink = None
+_sink_lock = threading.Lock()
+_sink_options = {}
+
+
+def configure_log_sink(options):
+    """Thiết lập tham số log sink từ config.json (logging) - gọi trước lần log đầu tiên"""
+    _sink_options.update({
+        'max_queue': options.get('queue_size', 10000),
+        'batch_size': options.get('batch_size', 100),
+        'flush_interval': options.get('flush_interval_seconds', 2.0),
+        'policy': options.get('overflow_policy', 'drop'),
+        'block_timeout': options.get('block_timeout_seconds', 0.5)
+    })
+
+
+def get_log_sink():
+    """Log sink dùng chung cho cả process"""
+    global _sink
+    with _sink_lock:
+        if _sink is None:
+            _sink = AsyncLogSink(**_sink_options)
+        return _sink
+
+
+@atexit.register
+def close_log_sink():
+    if _sink is not None:
+        _sink.close()
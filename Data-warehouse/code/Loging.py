@@ -1,46 +1,31 @@
-import csv
 import os
 import json
-import pyodbc
+from LogSink import get_log_sink
 from datetime import datetime
 
-def load_config(file_path='config.json'):
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
-    
-# Ghi log vào cơ sở dữ liệu
-def log_to_database(conn, name, action, source, level, file_path):
-    sql_insert_log = """
+# Câu INSERT log duy nhất: log sink gom các dòng cùng câu lệnh thành một executemany
+INSERT_LOG_SQL = """
     INSERT INTO logs (name, action, source, level, file_path)
     VALUES (?, ?, ?, ?, ?);
-    """
-    conn.execute(sql_insert_log, (name, action, source, level, file_path))
-    conn.commit()
+"""
 
-# Ghi log ra file CSV
-def log_to_csv(log_data, csv_file_path):
-    with open(csv_file_path, mode='a', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(log_data)
+def load_config(file_path='config.json'):
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
 # Hàm chính để ghi log
 def create_log(name, action, source, level, csv_file_path, connection_string):
-    # Kết nối đến cơ sở dữ liệu
-    conn = pyodbc.connect(connection_string)
-
     timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
 
     file_path = os.path.abspath(__file__)
 
-    # Ghi log vào cơ sở dữ liệu
-    log_to_database(conn, name, action, source, level, file_path)
+    # Ghi log vào cơ sở dữ liệu và CSV qua log sink (ghi theo lô ở background thread)
+    sink = get_log_sink()
+    sink.log_db(connection_string, INSERT_LOG_SQL, (name, action, source, level, file_path))
 
     # Dữ liệu log để ghi vào CSV
     log_data = [None, name, action, source, timestamp, level, file_path]  # ID sẽ tự động tăng
-    log_to_csv(log_data, csv_file_path)
-
-    # Đóng kết nối
-    conn.close()
+    sink.log_csv(csv_file_path, log_data)
 
 if __name__ == "__main__":
     config = load_config()
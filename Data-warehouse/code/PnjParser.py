@@ -0,0 +1,94 @@
+import os
+from html.parser import HTMLParser
+import requests
+from BrowserPool import PNJ_URL
+
+PRICE_TABLE_ID = 'content-price'
+
+HTTP_HEADERS = {
+    'User-Agent': ('Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 '
+                   '(KHTML, like Gecko) Chrome/120.0 Safari/537.36 Edg/120.0'),
+    'Accept-Language': 'vi-VN,vi;q=0.9,en;q=0.8'
+}
+
+
+class PriceTableParser(HTMLParser):
+    """Lấy text các ô <td> của từng dòng <tr> bên trong phần tử có id table_id
+    (tương đương CSS selector '#content-price tr' + 'td' của crawler Selenium)
+    """
+
+    def __init__(self, table_id=PRICE_TABLE_ID):
+        super().__init__(convert_charrefs=True)
+        self.table_id = table_id
+        self.rows = []
+        self._container_tag = None
+        self._container_depth = 0
+        self._row = None
+        self._cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if self._container_tag is None:
+            if dict(attrs).get('id') == self.table_id:
+                self._container_tag = tag
+                self._container_depth = 1
+            return
+
+        if tag == self._container_tag:
+            self._container_depth += 1
+        if tag == 'tr':
+            self._row = []
+        elif tag == 'td' and self._row is not None:
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if self._container_tag is None:
+            return
+
+        if tag == 'td' and self._cell is not None:
+            self._row.append(' '.join(''.join(self._cell).split()))
+            self._cell = None
+        elif tag == 'tr' and self._row is not None:
+            self.rows.append(self._row)
+            self._row = None
+        if tag == self._container_tag:
+            self._container_depth -= 1
+            if self._container_depth == 0:
+                self._container_tag = None
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            self._cell.append(data)
+
+
+def parse_price_rows(html, table_id=PRICE_TABLE_ID):
+    """Parse HTML trang giá vàng, trả về list dòng, mỗi dòng là list text các ô <td>"""
+    parser = PriceTableParser(table_id)
+    parser.feed(html)
+    parser.close()
+    return parser.rows
+
+
+def fetch_price_page(url=PNJ_URL, timeout=10, session=None):
+    """Tải HTML trang giá bằng HTTP client thường; url có thể là file HTML lưu sẵn (file:// hoặc đường dẫn)"""
+    if url.startswith('file://') or os.path.exists(url):
+        path = url[len('file://'):] if url.startswith('file://') else url
+        if os.name == 'nt' and path.startswith('/'):
+            path = path.lstrip('/')
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    response = (session or requests).get(url, headers=HTTP_HEADERS, timeout=timeout)
+    response.raise_for_status()
+    if not response.encoding or response.encoding.lower() == 'iso-8859-1':
+        response.encoding = 'utf-8'
+    return response.text
+
+
+def fetch_price_rows(url=PNJ_URL, timeout=10, session=None):
+    """Tải và parse bảng giá không cần browser
+    Raise ValueError nếu trang không có dòng giá nào (vd. bảng được render bằng JavaScript)
+    """
+    rows = parse_price_rows(fetch_price_page(url, timeout, session))
+    if not any(len(row) == 3 for row in rows):
+        raise ValueError(f"No price rows found in #{PRICE_TABLE_ID} at {url}")
+    return rows
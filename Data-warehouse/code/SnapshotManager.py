@@ -0,0 +1,354 @@
+import argparse
+import json
+import os
+from datetime import datetime
+from ConnectionPool import pooled_connection
+
+BACKUP_PREFIX = 'GoldPrices_backup_'
+RESTORE_PREFIX = 'GoldPrices_restore_'
+HISTORY_TABLE = 'GoldPrices_history'
+TIMESTAMP_FORMAT = '%Y%m%d_%H%M%S'
+
+# Hash nội dung dòng (GoldType, BuyPrice, SellPrice, UpdateTime) - cùng điều kiện so sánh khi dedupe staging
+# UpdateTime nằm trong hash: giá quay lại mức (loại, mua, bán) đã gặp ở thời điểm khác vẫn là một quan sát mới
+ROW_HASH_EXPRESSION = (
+    "CAST(HASHBYTES('SHA2_256', CONCAT(GoldType, N'|', CONVERT(VARCHAR(30), BuyPrice, 2), N'|', "
+    "CONVERT(VARCHAR(30), SellPrice, 2), N'|', CONVERT(VARCHAR(23), UpdateTime, 121))) AS BINARY(32))"
+)
+
+
+def ensure_row_hash(cursor, table_name):
+    """Thêm cột RowHash (computed, PERSISTED) và index cho bảng staging cũ chưa có
+    RowHash kiểu cũ (không có UpdateTime) được drop và tạo lại theo ROW_HASH_EXPRESSION
+    """
+    cursor.execute(f"""
+        IF EXISTS (
+            SELECT 1 FROM sys.computed_columns
+            WHERE object_id = OBJECT_ID('{table_name}') AND name = 'RowHash' AND definition NOT LIKE '%UpdateTime%'
+        )
+        BEGIN
+            IF EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_{table_name}_RowHash')
+                DROP INDEX IX_{table_name}_RowHash ON {table_name};
+            ALTER TABLE {table_name} DROP COLUMN RowHash;
+        END
+    """)
+    cursor.execute(f"""
+        IF COL_LENGTH('{table_name}', 'RowHash') IS NULL
+            ALTER TABLE {table_name} ADD RowHash AS {ROW_HASH_EXPRESSION} PERSISTED
+    """)
+    cursor.execute(f"""
+        IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_{table_name}_RowHash')
+            CREATE INDEX IX_{table_name}_RowHash ON {table_name} (RowHash)
+    """)
+
+
+def merge_new_rows(cursor, source_table, output_table=None):
+    """MERGE các dòng của source_table (gold_id, GoldType, BuyPrice, SellPrice, UpdateTime, RowHash) vào GoldPrices
+    theo RowHash: chỉ insert dòng chưa có (mỗi hash lấy dòng mới nhất trong source), dòng đã có giữ nguyên gold_id / RowVer
+    output_table: bảng (gold_id, GoldType, BuyPrice, SellPrice, UpdateTime, RowHash) nhận các dòng vừa insert
+    Trả về số dòng vừa insert
+    """
+    output = f"""
+        OUTPUT inserted.gold_id, inserted.GoldType, inserted.BuyPrice, inserted.SellPrice, inserted.UpdateTime,
+               inserted.RowHash
+        INTO {output_table}""" if output_table else ""
+    cursor.execute(f"""
+        MERGE GoldPrices AS target
+        USING (
+            SELECT GoldType, BuyPrice, SellPrice, UpdateTime, RowHash
+            FROM (
+                SELECT GoldType, BuyPrice, SellPrice, UpdateTime, RowHash,
+                       ROW_NUMBER() OVER (PARTITION BY RowHash ORDER BY UpdateTime DESC, gold_id DESC) AS rn
+                FROM {source_table}
+            ) t
+            WHERE rn = 1
+        ) AS source
+        ON target.RowHash = source.RowHash
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT (GoldType, BuyPrice, SellPrice, UpdateTime)
+            VALUES (source.GoldType, source.BuyPrice, source.SellPrice, source.UpdateTime){output};
+    """)
+    return cursor.rowcount
+
+
+def ensure_history_table(cursor):
+    """Tạo bảng GoldPrices_history nếu chưa có (mỗi dòng một khoảng hiệu lực valid_from / valid_to)"""
+    cursor.execute(f"""
+        IF NOT EXISTS (SELECT * FROM sys.tables WHERE name = '{HISTORY_TABLE}')
+        BEGIN
+            CREATE TABLE {HISTORY_TABLE} (
+                history_id BIGINT IDENTITY(1,1) PRIMARY KEY,
+                gold_id INT NULL,
+                GoldType NVARCHAR(255) NOT NULL,
+                BuyPrice FLOAT NULL,
+                SellPrice FLOAT NULL,
+                UpdateTime DATETIME NULL,
+                RowHash BINARY(32) NOT NULL,
+                valid_from DATETIME NOT NULL,
+                valid_to DATETIME NULL,
+                snapshot_id INT NULL,
+                closed_by_snapshot_id INT NULL
+            );
+            CREATE INDEX IX_{HISTORY_TABLE}_Open ON {HISTORY_TABLE} (RowHash) WHERE valid_to IS NULL;
+            CREATE INDEX IX_{HISTORY_TABLE}_Validity ON {HISTORY_TABLE} (valid_from, valid_to);
+        END
+    """)
+
+
+def select_retained(snapshots, keep_last=10, keep_daily=7, keep_monthly=12):
+    """snapshot_id các bản backup được giữ lại:
+    keep_last bản mới nhất + bản mới nhất của keep_daily ngày gần nhất + của keep_monthly tháng gần nhất
+    """
+    ordered = sorted(snapshots, key=lambda s: s['snapshot_time'], reverse=True)
+    retained = {s['snapshot_id'] for s in ordered[:keep_last]}
+    days, months = set(), set()
+    for snapshot in ordered:
+        snapshot_time = snapshot['snapshot_time']
+        day = snapshot_time.date()
+        month = (snapshot_time.year, snapshot_time.month)
+        if day not in days and len(days) < keep_daily:
+            days.add(day)
+            retained.add(snapshot['snapshot_id'])
+        if month not in months and len(months) < keep_monthly:
+            months.add(month)
+            retained.add(snapshot['snapshot_id'])
+    return retained
+
+
+class SnapshotManager:
+    """Quản lý các bảng GoldPrices_backup_<timestamp> trong staging_db
+    - Ghi nhận backup vào control_db.Backup_Snapshots (DELTA: các dòng vừa thêm, FULL: bản copy cả bảng kiểu cũ)
+    - Gộp mọi backup theo thứ tự thời gian vào GoldPrices_history: mỗi dòng lưu một lần
+      kèm khoảng hiệu lực valid_from / valid_to (SCD2) thay vì lặp lại ở mỗi bản copy
+    - Giữ keep_last bản mới nhất + điểm ngày / tháng, các bảng backup khác bị drop sau khi đã gộp
+    - Restore trạng thái GoldPrices tại một thời điểm ra bảng GoldPrices_restore_<timestamp>
+    """
+
+    def __init__(self, staging_conn_str, control_conn_str, keep_last=10, keep_daily=7, keep_monthly=12):
+        self.staging_conn_str = staging_conn_str
+        self.control_conn_str = control_conn_str
+        self.keep_last = keep_last
+        self.keep_daily = keep_daily
+        self.keep_monthly = keep_monthly
+
+    @classmethod
+    def from_config(cls, staging_conn_str, control_conn_str, options):
+        """Khởi tạo từ config.json (etl.backups)"""
+        return cls(
+            staging_conn_str, control_conn_str,
+            keep_last=options.get('keep_last', 10),
+            keep_daily=options.get('keep_daily', 7),
+            keep_monthly=options.get('keep_monthly', 12)
+        )
+
+    def register(self, table_name, snapshot_type, snapshot_time, row_count):
+        """Ghi nhận một bảng backup (bỏ qua nếu đã có)"""
+        with pooled_connection(self.control_conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                IF NOT EXISTS (SELECT 1 FROM Backup_Snapshots WHERE table_name = ?)
+                INSERT INTO Backup_Snapshots (table_name, snapshot_type, snapshot_time, row_count)
+                VALUES (?, ?, ?, ?)
+            """, table_name, table_name, snapshot_type, snapshot_time, row_count)
+            conn.commit()
+
+    def snapshots(self, status=None):
+        """Danh sách backup trong control_db, cũ trước mới sau"""
+        query = """
+            SELECT snapshot_id, table_name, snapshot_type, snapshot_time, row_count, history_applied, status
+            FROM Backup_Snapshots
+        """
+        params = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY snapshot_time, snapshot_id"
+        with pooled_connection(self.control_conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, *params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def discover(self):
+        """Ghi nhận các bảng GoldPrices_backup_* chưa có trong Backup_Snapshots
+        Bảng không có cột RowHash là bản copy cả bảng tạo trước khi có dedupe theo hash (FULL)
+        """
+        registered = {s['table_name'] for s in self.snapshots()}
+        discovered = 0
+        with pooled_connection(self.staging_conn_str) as conn:
+            cursor = conn.cursor()
+            cursor.execute(r"SELECT name FROM sys.tables WHERE name LIKE 'GoldPrices\_backup\_%' ESCAPE '\'")
+            tables = [row[0] for row in cursor.fetchall()]
+            for table_name in sorted(set(tables) - registered):
+                try:
+                    snapshot_time = datetime.strptime(table_name[len(BACKUP_PREFIX):], TIMESTAMP_FORMAT)
+                except ValueError:
+                    print(f"Skipping backup table with unexpected name: {table_name}")
+                    continue
+                has_hash = cursor.execute("SELECT COL_LENGTH(?, 'RowHash')", table_name).fetchone()[0]
+                row_count = cursor.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+                snapshot_type = 'DELTA' if has_hash else 'FULL'
+                self.register(table_name, snapshot_type, snapshot_time, row_count)
+                print(f"Registered {snapshot_type} backup {table_name} ({row_count} rows)")
+                discovered += 1
+        return discovered
+
+    def _apply_snapshot(self, cursor, snapshot):
+        """Gộp một backup vào GoldPrices_history
+        - Dòng có RowHash chưa mở trong history: thêm với valid_from = snapshot_time
+        - FULL: dòng đang mở nhưng không có trong bản copy được đóng (valid_to = snapshot_time)
+        Chạy lại trên cùng backup không làm thay đổi history
+        """
+        snapshot_id = snapshot['snapshot_id']
+        snapshot_time = snapshot['snapshot_time']
+        ensure_history_table(cursor)
+        cursor.execute(f"""
+            SELECT gold_id, GoldType, BuyPrice, SellPrice, UpdateTime, {ROW_HASH_EXPRESSION} AS RowHash
+            INTO #Snapshot
+            FROM {snapshot['table_name']}
+        """)
+        cursor.execute("CREATE INDEX IX_Snapshot_RowHash ON #Snapshot (RowHash)")
+        cursor.execute(f"""
+            INSERT INTO {HISTORY_TABLE} (gold_id, GoldType, BuyPrice, SellPrice, UpdateTime, RowHash, valid_from, snapshot_id)
+            SELECT gold_id, GoldType, BuyPrice, SellPrice, UpdateTime, RowHash, ?, ?
+            FROM (
+                SELECT *, ROW_NUMBER() OVER (PARTITION BY RowHash ORDER BY UpdateTime DESC, gold_id DESC) AS rn
+                FROM #Snapshot
+            ) s
+            WHERE s.rn = 1
+                AND NOT EXISTS (
+                    SELECT 1 FROM {HISTORY_TABLE} h
+                    WHERE h.RowHash = s.RowHash AND h.valid_to IS NULL
+                )
+        """, snapshot_time, snapshot_id)
+        added = cursor.rowcount
+        closed = 0
+        if snapshot['snapshot_type'] == 'FULL':
+            cursor.execute(f"""
+                UPDATE h
+                SET valid_to = ?, closed_by_snapshot_id = ?
+                FROM {HISTORY_TABLE} h
+                WHERE h.valid_to IS NULL
+                    AND NOT EXISTS (SELECT 1 FROM #Snapshot s WHERE s.RowHash = h.RowHash)
+            """, snapshot_time, snapshot_id)
+            closed = cursor.rowcount
+        cursor.execute("DROP TABLE #Snapshot")
+        return added, closed
+
+    def fold_pending(self):
+        """Gộp các backup chưa được đưa vào history, theo thứ tự thời gian; trả về số backup đã gộp"""
+        snapshots = self.snapshots()
+        applied_times = [s['snapshot_time'] for s in snapshots if s['history_applied']]
+        last_applied = max(applied_times) if applied_times else None
+        folded = 0
+        for snapshot in snapshots:
+            if snapshot['history_applied'] or snapshot['status'] != 'ACTIVE':
+                continue
+            if last_applied and snapshot['snapshot_time'] < last_applied:
+                # Backup cũ hơn history hiện có: giữ nguyên bảng, không gộp để không làm sai khoảng hiệu lực
+                print(f"Backup {snapshot['table_name']} is older than the compacted history, leaving it as is")
+                continue
+            with pooled_connection(self.staging_conn_str) as conn:
+                cursor = conn.cursor()
+                try:
+                    added, closed = self._apply_snapshot(cursor, snapshot)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            with pooled_connection(self.control_conn_str) as conn:
+                conn.cursor().execute(
+                    "UPDATE Backup_Snapshots SET history_applied = 1 WHERE snapshot_id = ?", snapshot['snapshot_id'])
+                conn.commit()
+            print(f"Folded {snapshot['table_name']} into {HISTORY_TABLE}: {added} added, {closed} closed")
+            last_applied = snapshot['snapshot_time']
+            folded += 1
+        return folded
+
+    def compact(self):
+        """Ghi nhận backup mới, gộp vào history rồi drop các bảng backup ngoài retention"""
+        discovered = self.discover()
+        folded = self.fold_pending()
+
+        active = self.snapshots(status='ACTIVE')
+        retained = select_retained(active, self.keep_last, self.keep_daily, self.keep_monthly)
+        dropped = 0
+        for snapshot in active:
+            if snapshot['snapshot_id'] in retained or not snapshot['history_applied']:
+                continue
+            with pooled_connection(self.staging_conn_str) as conn:
+                conn.cursor().execute(f"DROP TABLE IF EXISTS {snapshot['table_name']}")
+                conn.commit()
+            with pooled_connection(self.control_conn_str) as conn:
+                conn.cursor().execute("""
+                    UPDATE Backup_Snapshots SET status = 'COMPACTED', compacted_at = GETDATE()
+                    WHERE snapshot_id = ?
+                """, snapshot['snapshot_id'])
+                conn.commit()
+            dropped += 1
+        summary = {'discovered': discovered, 'folded': folded, 'dropped': dropped, 'retained': len(retained)}
+        print(f"Backup compaction: {summary}")
+        return summary
+
+    def restore(self, at, target_table=None):
+        """Dựng lại nội dung GoldPrices tại thời điểm at từ history ra bảng mới (không ghi đè GoldPrices)
+        Trả về (tên bảng, số dòng)
+        """
+        self.discover()
+        self.fold_pending()
+        target_table = target_table or f"{RESTORE_PREFIX}{at.strftime(TIMESTAMP_FORMAT)}"
+        with pooled_connection(self.staging_conn_str) as conn:
+            cursor = conn.cursor()
+            ensure_history_table(cursor)
+            cursor.execute(f"""
+                SELECT gold_id, GoldType, BuyPrice, SellPrice, UpdateTime
+                INTO {target_table}
+                FROM {HISTORY_TABLE}
+                WHERE valid_from <= ? AND (valid_to IS NULL OR valid_to > ?)
+            """, at, at)
+            rows = cursor.rowcount
+            conn.commit()
+        print(f"Restored {rows} rows as of {at} into {target_table}")
+        return target_table, rows
+
+
+def create_snapshot_manager(config_path=None):
+    """SnapshotManager theo config.json (database + etl.backups)"""
+    if config_path is None:
+        config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    db_config = config['database']
+
+    def connection_string(db_name):
+        return (
+            f"DRIVER={{{db_config['driver']}}};"
+            f"SERVER={db_config['server']};"
+            f"DATABASE={db_name};"
+            "Trusted_Connection=yes;"
+            "Connection Timeout=30;"
+        )
+
+    return SnapshotManager.from_config(connection_string('staging_db'), connection_string('control_db'),
+                                       config.get('etl', {}).get('backups', {}))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage GoldPrices_backup_* tables")
+    parser.add_argument('--list', action='store_true', help="List registered backups")
+    parser.add_argument('--compact', action='store_true', help="Fold backups into history and apply retention")
+    parser.add_argument('--restore', metavar='TIMESTAMP', help="Restore GoldPrices as of 'YYYY-MM-DD HH:MM:SS'")
+    parser.add_argument('--target-table', help="Table name for --restore")
+    args = parser.parse_args()
+
+    manager = create_snapshot_manager()
+    if args.compact:
+        manager.compact()
+    if args.restore:
+        manager.restore(datetime.fromisoformat(args.restore), args.target_table)
+    if args.list or not (args.compact or args.restore):
+        manager.discover()
+        for snapshot in manager.snapshots():
+            print(f"{snapshot['snapshot_time']}  {snapshot['table_name']}  {snapshot['snapshot_type']}  "
+                  f"{snapshot['row_count']} rows  {snapshot['status']}"
+                  f"{'' if snapshot['history_applied'] else '  (not folded)'}")
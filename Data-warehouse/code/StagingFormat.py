@@ -0,0 +1,180 @@
+import argparse
+import json
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from TimestampParser import parse_timestamps
+
+# Định dạng file staging -> phần mở rộng
+STAGING_FORMATS = {
+    'json': '.json',
+    'parquet': '.parquet',
+    'arrow': '.arrow'
+}
+
+STAGING_COLUMNS = ['GoldType', 'BuyPrice', 'SellPrice', 'UpdateTime']
+
+# UpdateTime trong staging JSON lưu dạng chuỗi dd/mm/yyyy HH:MM:SS
+JSON_TIME_FORMAT = '%d/%m/%Y %H:%M:%S'
+
+
+def parse_update_time(values):
+    """Parse cột UpdateTime: định dạng staging dd/mm/yyyy HH:MM:SS, giá trị khác parse tự động
+    (mỗi giá trị khác nhau parse một lần - file staging PNJ dùng chung một UpdateTime cho cả bảng)
+    """
+    return parse_timestamps(values, source='staging')
+
+
+def gold_type_category(values):
+    """GoldType -> categorical (mã số nguyên + từ điển tên loại vàng)
+    Strip khoảng trắng trên từ điển các giá trị khác nhau thay vì trên từng dòng; NaN giữ là NaN
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values
+    codes, uniques = pd.factorize(values)
+    names = pd.Index(uniques).astype(str).str.strip()
+    # Hai giá trị chỉ khác khoảng trắng gộp về cùng một mã
+    name_codes, categories = pd.factorize(names)
+    codes = np.where(codes >= 0, name_codes[codes], -1)
+    return pd.Series(pd.Categorical.from_codes(codes, categories), index=values.index, name=values.name)
+
+
+def to_staging_frame(df):
+    """Ép kiểu DataFrame staging: GoldType categorical, giá float64, UpdateTime datetime64"""
+    return pd.DataFrame({
+        'GoldType': gold_type_category(df['GoldType']),
+        'BuyPrice': df['BuyPrice'].astype('float64'),
+        'SellPrice': df['SellPrice'].astype('float64'),
+        'UpdateTime': parse_update_time(df['UpdateTime']).astype('datetime64[ns]')
+    })
+
+
+def staging_format_of(path):
+    """Định dạng của file staging theo phần mở rộng, None nếu không phải file staging"""
+    extension = os.path.splitext(path)[1].lower()
+    for staging_format, format_extension in STAGING_FORMATS.items():
+        if extension == format_extension:
+            return staging_format
+    return None
+
+
+def list_staging_files(staging_dir):
+    """Tất cả file staging (mọi định dạng) trong thư mục, sắp theo tên
+    File JSON đã được chuyển sang parquet / arrow (cùng tên) chỉ lấy bản cột để không load trùng
+    """
+    preference = ['parquet', 'arrow', 'json']
+    files = {}
+    for f in sorted(os.listdir(staging_dir)):
+        staging_format = staging_format_of(f)
+        if not staging_format:
+            continue
+        stem = os.path.splitext(f)[0]
+        current = files.get(stem)
+        if current is None or preference.index(staging_format) < preference.index(staging_format_of(current)):
+            files[stem] = f
+    return [os.path.join(staging_dir, files[stem]) for stem in sorted(files)]
+
+
+def write_staging(df, staging_dir, source_name, staging_format='json', timestamp=None):
+    """Ghi DataFrame (GoldType, BuyPrice, SellPrice, UpdateTime) ra staging_<source>_<timestamp>.<ext>
+    - json: list record như trước, UpdateTime dạng dd/mm/yyyy HH:MM:SS
+    - parquet / arrow: cột có kiểu (float64, timestamp), arrow là Arrow IPC file đọc được qua memory map
+    Thiếu pyarrow thì ghi JSON. Trả về đường dẫn file
+    """
+    if staging_format not in STAGING_FORMATS:
+        raise ValueError(f"Unsupported staging format: {staging_format}")
+    if not os.path.exists(staging_dir):
+        os.makedirs(staging_dir)
+    if staging_format != 'json':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print(f"pyarrow is not installed, writing JSON staging instead of {staging_format}")
+            staging_format = 'json'
+
+    timestamp = timestamp or datetime.now().strftime('%Y%m%d_%H%M%S')
+    path = os.path.join(staging_dir, f'staging_{source_name}_{timestamp}{STAGING_FORMATS[staging_format]}')
+    frame = to_staging_frame(df)
+
+    if staging_format == 'json':
+        records = frame.assign(UpdateTime=frame['UpdateTime'].dt.strftime(JSON_TIME_FORMAT)).to_dict('records')
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(records, f, ensure_ascii=False, indent=4)
+    elif staging_format == 'parquet':
+        frame.to_parquet(path, index=False)
+    else:
+        import pyarrow as pa
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        with pa.OSFile(path, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+    return path
+
+
+def read_staging(path):
+    """Đọc một file staging bất kỳ định dạng về DataFrame có kiểu (UpdateTime datetime64)
+    Parquet / Arrow được đọc qua memory map thay vì nạp cả file vào list Python
+    """
+    staging_format = staging_format_of(path)
+    if staging_format == 'json':
+        with open(path, 'r', encoding='utf-8') as f:
+            df = pd.DataFrame(json.load(f), columns=STAGING_COLUMNS)
+        return to_staging_frame(df)
+    if staging_format == 'parquet':
+        return pd.read_parquet(path, memory_map=True)
+    if staging_format == 'arrow':
+        import pyarrow as pa
+        with pa.memory_map(path, 'r') as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+    raise ValueError(f"Not a staging file: {path}")
+
+
+def read_staging_files(paths):
+    """Đọc và nối nhiều file staging"""
+    frames = [read_staging(path) for path in paths]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=STAGING_COLUMNS)
+    # Từ điển GoldType của mỗi file khác nhau: hợp lại để cột nối vẫn là categorical
+    gold_types = union_categoricals([gold_type_category(frame['GoldType']) for frame in frames])
+    df = pd.concat([frame.drop(columns='GoldType') for frame in frames], ignore_index=True)
+    df.insert(0, 'GoldType', gold_types)
+    return df
+
+
+def convert_json_staging(staging_dir, staging_format='parquet', remove_json=False):
+    """Chuyển các file staging JSON hiện có sang parquet / arrow (giữ nguyên tên file)
+    Trả về danh sách (file JSON, file mới, kích thước JSON, kích thước mới)
+    """
+    if staging_format == 'json':
+        raise ValueError("Target format must be parquet or arrow")
+
+    results = []
+    json_files = [os.path.join(staging_dir, f) for f in sorted(os.listdir(staging_dir))
+                  if staging_format_of(f) == 'json']
+    for json_path in json_files:
+        # staging_<source>_<timestamp>.json -> giữ nguyên source và timestamp
+        name = os.path.splitext(os.path.basename(json_path))[0]
+        _, source_name, timestamp = name.split('_', 2)
+        new_path = write_staging(read_staging(json_path), staging_dir, source_name, staging_format, timestamp)
+        results.append((json_path, new_path, os.path.getsize(json_path), os.path.getsize(new_path)))
+        print(f"Converted {json_path} -> {new_path} "
+              f"({os.path.getsize(json_path)} -> {os.path.getsize(new_path)} bytes)")
+        if remove_json and new_path != json_path:
+            os.remove(json_path)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert JSON staging files to a columnar format")
+    parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet')
+    parser.add_argument('--staging-dir',
+                        default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'staging'))
+    parser.add_argument('--remove-json', action='store_true', help="Delete the JSON files after converting")
+    args = parser.parse_args()
+
+    converted = convert_json_staging(args.staging_dir, args.format, args.remove_json)
+    print(f"Converted {len(converted)} file(s): "
+          f"{sum(r[2] for r in converted)} -> {sum(r[3] for r in converted)} bytes")
@@ -0,0 +1,122 @@
+import threading
+import numpy as np
+import pandas as pd
+
+# Các định dạng UpdateTime gặp ở các nguồn (PNJ, CSV, Excel, JSON, staging), thử theo thứ tự
+KNOWN_FORMATS = [
+    '%d/%m/%Y %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S',
+    '%d/%m/%Y %H:%M',
+    '%d/%m/%Y'
+]
+
+
+class TimestampParser:
+    """Parse cột thời gian theo các giá trị khác nhau thay vì theo từng dòng
+    - Mỗi chuỗi khác nhau chỉ parse một lần (factorize), kết quả map lại về cả cột
+    - Định dạng parse được nhiều giá trị nhất được cache theo source, lần sau thử định dạng đó trước
+    - Giá trị không khớp định dạng nào mới để pandas tự đoán (dayfirst), từng giá trị một
+    - Metrics: rows, unique, inferred
+    """
+
+    def __init__(self, formats=None, dayfirst=True):
+        self.formats = list(formats or KNOWN_FORMATS)
+        self.dayfirst = dayfirst
+        self._source_formats = {}
+        self._lock = threading.Lock()
+        self.metrics = {'rows': 0, 'unique': 0, 'inferred': 0}
+
+    def detected_format(self, source):
+        """Định dạng đã nhận ra cho source, None nếu chưa có"""
+        with self._lock:
+            return self._source_formats.get(source)
+
+    def _candidates(self, source):
+        cached = self.detected_format(source)
+        return ([cached] if cached else []) + [fmt for fmt in self.formats if fmt != cached]
+
+    def parse_unique(self, values, source=None):
+        """Parse mảng chuỗi (không trùng), trả về DatetimeIndex cùng độ dài, NaT nếu không parse được"""
+        values = pd.Index(values, dtype=object)
+        parsed = pd.Series(pd.NaT, index=range(len(values)), dtype='datetime64[ns]')
+        remaining = np.ones(len(values), dtype=bool)
+        best_format, best_count = None, 0
+
+        for fmt in self._candidates(source):
+            if not remaining.any():
+                break
+            attempt = pd.to_datetime(values[remaining], format=fmt, errors='coerce')
+            matched = ~attempt.isna()
+            if matched.any():
+                positions = np.flatnonzero(remaining)[matched]
+                parsed.iloc[positions] = attempt[matched]
+                remaining[positions] = False
+                if matched.sum() > best_count:
+                    best_format, best_count = fmt, matched.sum()
+
+        # Không khớp định dạng nào: pandas tự đoán từng giá trị
+        inferred = 0
+        for position in np.flatnonzero(remaining):
+            value = pd.to_datetime(values[position], dayfirst=self.dayfirst, errors='coerce')
+            if not pd.isna(value):
+                parsed.iloc[position] = value
+                inferred += 1
+
+        with self._lock:
+            self.metrics['inferred'] += inferred
+            if source is not None and best_format is not None:
+                self._source_formats[source] = best_format
+        return pd.DatetimeIndex(parsed)
+
+    def parse(self, values, source=None):
+        """Parse một cột (Series) thời gian, trả về Series datetime64 cùng index
+        Cột đã là datetime thì trả lại nguyên
+        """
+        values = pd.Series(values)
+        if pd.api.types.is_datetime64_any_dtype(values):
+            return values
+        codes, uniques = pd.factorize(values)
+        with self._lock:
+            self.metrics['rows'] += len(values)
+            self.metrics['unique'] += len(uniques)
+
+        texts = pd.Index(uniques).astype(str).str.strip()
+        parsed = self.parse_unique(texts, source)
+        # codes = -1 (NaN / None) -> NaT
+        result = parsed.take(codes, allow_fill=True, fill_value=pd.NaT)
+        return pd.Series(result, index=values.index, name=values.name)
+
+    def stats(self):
+        stats = dict(self.metrics)
+        with self._lock:
+            stats['formats'] = dict(self._source_formats)
+        return stats
+
+
+def format_timestamps(values, fmt):
+    """strftime cho cột datetime, mỗi thời điểm khác nhau chỉ format một lần (NaT -> None)"""
+    codes, uniques = pd.factorize(pd.Series(values))
+    texts = np.asarray(pd.DatetimeIndex(uniques).strftime(fmt), dtype=object)
+    result = np.full(len(codes), None, dtype=object)
+    found = codes >= 0
+    result[found] = texts[codes[found]]
+    return pd.Series(result, index=getattr(values, 'index', None), name=getattr(values, 'name', None), dtype=object)
+
+
+_parser = None
+_parser_lock = threading.Lock()
+
+
+def get_timestamp_parser():
+    """Timestamp parser dùng chung cho cả process (cache định dạng theo source)"""
+    global _parser
+    with _parser_lock:
+        if _parser is None:
+            _parser = TimestampParser()
+        return _parser
+
+
+def parse_timestamps(values, source=None):
+    """Parse cột thời gian bằng parser dùng chung"""
+    return get_timestamp_parser().parse(values, source)
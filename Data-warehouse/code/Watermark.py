@@ -0,0 +1,69 @@
+from ConnectionPool import pooled_connection
+
+# Tên watermark dùng trong control_db.ETL_Watermarks
+WAREHOUSE_FACT_LOAD = 'warehouse_fact_load'
+RELOAD_WAREHOUSE = 'reload_warehouse'
+SCHEDULER_WAREHOUSE_UPDATE = 'scheduler_warehouse_update'
+
+
+def get_watermark(control_conn_str, name):
+    """Đọc high-water mark (last_update_time, last_row_version); (None, None) nếu chưa có"""
+    with pooled_connection(control_conn_str) as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT last_update_time, last_row_version
+            FROM ETL_Watermarks
+            WHERE watermark_name = ?
+        """, name)
+        row = cursor.fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+
+def set_watermark(control_conn_str, name, last_update_time, last_row_version=None):
+    """Ghi high-water mark sau khi load thành công"""
+    with pooled_connection(control_conn_str) as conn:
+        cursor = conn.cursor()
+        cursor.execute("EXEC sp_SetWatermark @watermark_name = ?, @last_update_time = ?, @last_row_version = ?",
+                       name, last_update_time, last_row_version)
+        conn.commit()
+
+
+def reset_watermark(control_conn_str, name):
+    """Xóa high-water mark để lần chạy tiếp theo đọc lại toàn bộ staging"""
+    with pooled_connection(control_conn_str) as conn:
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM ETL_Watermarks WHERE watermark_name = ?", name)
+        conn.commit()
+
+
+def ensure_row_version(cursor, table_name='GoldPrices'):
+    """Thêm cột RowVer (rowversion) và index cho bảng staging cũ chưa có"""
+    cursor.execute(f"""
+        IF COL_LENGTH('{table_name}', 'RowVer') IS NULL
+            ALTER TABLE {table_name} ADD RowVer ROWVERSION
+    """)
+    cursor.execute(f"""
+        IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_{table_name}_RowVer')
+            CREATE INDEX IX_{table_name}_RowVer ON {table_name} (RowVer)
+    """)
+
+
+# Cột đọc từ staging GoldPrices (bỏ cột computed RowHash), RowVer đọc dưới dạng số
+STAGING_COLUMNS = 'gold_id, GoldType, BuyPrice, SellPrice, UpdateTime, CAST(RowVer AS BIGINT) AS RowVer'
+
+
+def staging_query(watermark, columns=STAGING_COLUMNS):
+    """SQL + tham số để đọc các dòng staging được ghi sau watermark (last_update_time, last_row_version)
+    - Lọc theo RowVer (thứ tự ghi, không bị TRUNCATE reset) thay vì UpdateTime: dòng backfill CSV / Excel
+      hoặc file đến muộn có UpdateTime cũ hơn vẫn được đọc, dòng trùng UpdateTime với mark không bị bỏ
+    - Chỉ đọc dòng có RowVer < MIN_ACTIVE_ROWVERSION(): dòng của transaction chưa commit được đọc ở lần sau
+    - Watermark ghi trước khi có RowVer (chỉ có last_update_time): lọc theo UpdateTime như cũ một lần
+    """
+    last_update_time, last_row_version = watermark
+    if last_row_version is not None:
+        return (f"SELECT {columns} FROM GoldPrices WHERE RowVer > CAST(CAST(? AS BIGINT) AS BINARY(8)) "
+                "AND RowVer < MIN_ACTIVE_ROWVERSION()", [last_row_version])
+    if last_update_time is not None:
+        return (f"SELECT {columns} FROM GoldPrices WHERE UpdateTime > ? AND RowVer < MIN_ACTIVE_ROWVERSION()",
+                [last_update_time])
+    return f"SELECT {columns} FROM GoldPrices WHERE RowVer < MIN_ACTIVE_ROWVERSION()", []
@@ -0,0 +1,44 @@
+import argparse
+import os
+import time
+from BrowserPool import get_browser_pool, FIXTURE_PATH
+from DataExtractor import DataExtractor
+from PnjParser import fetch_price_rows
+
+
+def benchmark(label, fetch_rows, runs):
+    """Chạy fetch_rows runs lần, in thời gian trung bình / nhỏ nhất"""
+    timings = []
+    rows = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        rows = fetch_rows()
+        timings.append(time.perf_counter() - started)
+    print(f"{label}: {len(rows)} rows, avg {sum(timings) / len(timings) * 1000:.1f} ms, "
+          f"min {min(timings) * 1000:.1f} ms over {runs} runs")
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the HTTP parser and the Selenium path on the PNJ price table")
+    parser.add_argument('--url', help="Page to crawl (default: local fixture data/fixtures/pnj_gia_vang.html)")
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--skip-browser', action='store_true', help="Only benchmark the HTTP parser")
+    args = parser.parse_args()
+
+    url = args.url or 'file:///' + FIXTURE_PATH.replace(os.sep, '/').lstrip('/')
+    print(f"Benchmarking PNJ extraction on {url}")
+
+    http_rows = benchmark("HTTP + HTMLParser", lambda: fetch_price_rows(url), args.runs)
+
+    if not args.skip_browser:
+        # Khởi động browser trước để chỉ đo thời gian tải trang + đọc bảng
+        get_browser_pool().warm()
+        extractor = DataExtractor(output_dir=os.path.dirname(os.path.dirname(FIXTURE_PATH)))
+        pool = get_browser_pool()
+        pool.bulk_extraction = True
+        browser_rows = benchmark("Selenium, one execute_script", lambda: extractor._fetch_pnj_rows_browser(url), args.runs)
+        pool.bulk_extraction = False
+        element_rows = benchmark("Selenium, find_elements per cell", lambda: extractor._fetch_pnj_rows_browser(url), args.runs)
+        print(f"Same rows from all paths: {http_rows == browser_rows == element_rows}")
+        print(f"Browser pool stats: {get_browser_pool().stats()}")
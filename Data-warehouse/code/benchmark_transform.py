@@ -0,0 +1,146 @@
+import argparse
+import importlib
+import time
+import numpy as np
+import pandas as pd
+from ColumnarBackend import BACKENDS
+from DataTransformer import DataTransformer
+
+# Tên loại vàng giống dữ liệu crawl (PNJ / gold_price.csv)
+GOLD_TYPES = [
+    'SJC', 'PNJ', 'Nhẫn Trơn PNJ 999.9', 'Vàng Kim Bảo 999.9', 'Vàng Phúc Lộc Tài 999.9',
+    'Vàng nữ trang 999.9', 'Vàng nữ trang 999', 'Vàng nữ trang 99', 'Vàng 916 (22K)', 'Vàng 750 (18K)',
+    'Vàng 680 (16.3K)', 'Vàng 650 (15.6K)', 'Vàng 610 (14.6K)', 'Vàng 585 (14K)', 'Vàng 416 (10K)',
+    'Vàng 375 (9K)', 'Vàng 333 (8K)', 'Vàng miếng SJC', 'Vàng Kim Bảo', 'Vàng Phúc Lộc Tài'
+]
+
+
+def synthetic_rows(rows, seed=0):
+    """DataFrame rows dòng giống staging (GoldType categorical, giá float64, UpdateTime datetime)
+    trải trên 2014-2025; khoảng 0.1% giá bị thiếu để đi qua nhánh fillna"""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2014-06-01').value // 10**9
+    end = pd.Timestamp('2025-12-31').value // 10**9
+    buy = np.round(rng.uniform(3_000, 90_000, rows), 3)
+    sell = buy + np.round(rng.uniform(0, 2_000, rows), 3)
+    buy[rng.random(rows) < 0.001] = np.nan
+    return pd.DataFrame({
+        'GoldType': pd.Categorical.from_codes(rng.integers(0, len(GOLD_TYPES), rows), categories=GOLD_TYPES),
+        'BuyPrice': buy,
+        'SellPrice': sell,
+        'UpdateTime': pd.to_datetime(rng.integers(start, end, rows) // 60 * 60, unit='s')
+    })
+
+
+def compare_results(expected, actual, tolerance=0.011):
+    """So kết quả của một backend với pandas, trả về danh sách khác biệt (rỗng nếu giống)
+    Số thực được so với sai số tolerance (một đơn vị làm tròn 0.01): engine cộng song song theo thứ tự khác
+    nên mean sát ranh giới làm tròn có thể lệch 0.01"""
+    differences = []
+
+    def close(name, left, right):
+        left, right = np.asarray(left, dtype='float64'), np.asarray(right, dtype='float64')
+        if left.shape != right.shape:
+            differences.append(f"{name}: shape {left.shape} != {right.shape}")
+        elif not np.allclose(left, right, rtol=0, atol=tolerance, equal_nan=True):
+            differences.append(f"{name}: {int((~np.isclose(left, right, rtol=0, atol=tolerance, equal_nan=True)).sum())} values differ")
+
+    for name in ['fact_table', 'daily_agg', 'monthly_agg']:
+        if not expected[name].index.equals(actual[name].index):
+            differences.append(f"{name}: index differs")
+        if list(expected[name].columns) != list(actual[name].columns):
+            differences.append(f"{name}: columns {list(actual[name].columns)}")
+            continue
+        for column in expected[name].columns:
+            close(f"{name}.{column}", expected[name][column], actual[name][column])
+
+    if not expected['date_dim'].reset_index(drop=True).equals(actual['date_dim'].reset_index(drop=True)):
+        differences.append("date_dim differs")
+    if not expected['gold_type_dim'][['GoldTypeKey', 'GoldType']].equals(actual['gold_type_dim'][['GoldTypeKey', 'GoldType']]):
+        differences.append("gold_type_dim differs")
+    if list(expected['clean_data'].columns) != list(actual['clean_data'].columns):
+        differences.append(f"clean_data: columns {list(actual['clean_data'].columns)}")
+    return differences
+
+
+def require_backends(backends):
+    """Dừng với lỗi rõ ràng nếu một backend được yêu cầu chưa cài (không âm thầm bỏ qua hay chạy bằng pandas)"""
+    missing = []
+    for backend in backends:
+        if backend == 'pandas':
+            continue
+        try:
+            importlib.import_module(backend)
+        except ImportError:
+            missing.append(backend)
+    if missing:
+        raise SystemExit(f"Requested backend(s) not installed: {', '.join(missing)}")
+
+
+def run_transform(backend, frame):
+    """Transform một bản sao của frame (chế độ lean sửa tại chỗ), trả về (kết quả, giây, bộ nhớ đỉnh MB)
+    Bộ nhớ đỉnh đo bằng tracemalloc: chỉ thấy phần cấp phát qua Python / numpy, không thấy bộ nhớ riêng của engine"""
+    transformer = DataTransformer(lean=True, track_memory=True, backend=backend)
+    if transformer.backend != backend:
+        raise SystemExit(f"DataTransformer fell back to {transformer.backend} instead of {backend}")
+    df = frame.copy()
+    started = time.perf_counter()
+    transformed_data = transformer.transform_data(df)
+    return transformed_data, time.perf_counter() - started, transformer.peak_memory_mb()
+
+
+def check_parity(backends, rows=10_000, seed=0):
+    """So kết quả từng backend với pandas trên rows dòng (mặc định 10k, vài giây)
+    Trả về {backend: danh sách khác biệt}; backend chưa cài thì dừng với lỗi"""
+    require_backends(backends)
+    frame = synthetic_rows(rows, seed)
+    expected = run_transform('pandas', frame)[0]
+    return {
+        backend: compare_results(expected, run_transform(backend, frame)[0])
+        for backend in backends if backend != 'pandas'
+    }
+
+
+def benchmark(backends, row_counts, seed=0):
+    """In thời gian / bộ nhớ đỉnh / tốc độ so với pandas và kết quả so sánh, trả về True nếu mọi backend khớp pandas"""
+    require_backends(backends)
+    # Chạy thử trên ít dòng để không tính thời gian import / khởi động engine
+    for backend in set(backends) | {'pandas'}:
+        run_transform(backend, synthetic_rows(1000, seed))
+    print(f"{'rows':>12}{'backend':>10}{'seconds':>10}{'peak MB':>10}{'speedup':>10}  parity")
+    matched = True
+    for rows in row_counts:
+        frame = synthetic_rows(rows, seed)
+        expected, pandas_seconds, peak = run_transform('pandas', frame)
+        print(f"{rows:>12}{'pandas':>10}{pandas_seconds:>10.2f}{peak or 0:>10.1f}{'1.0x':>10}  -")
+        for backend in backends:
+            if backend == 'pandas':
+                continue
+            actual, seconds, peak = run_transform(backend, frame)
+            differences = compare_results(expected, actual)
+            matched = matched and not differences
+            print(f"{rows:>12}{backend:>10}{seconds:>10.2f}{peak or 0:>10.1f}{pandas_seconds / seconds:>9.1f}x  "
+                  f"{'ok' if not differences else '; '.join(differences)}")
+            del actual
+        del frame, expected
+    return matched
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check DataTransformer backends against pandas; "
+                                                 "--benchmark also times them on large synthetic data")
+    parser.add_argument('--backends', nargs='+', default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument('--parity-rows', type=int, default=10_000, help="Rows for the parity check")
+    parser.add_argument('--benchmark', action='store_true', help="Run the benchmark after the parity check")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1_000_000, 10_000_000, 100_000_000],
+                        help="Benchmark row counts (100M rows needs roughly 30 GB of RAM)")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    results = check_parity(args.backends, args.parity_rows, args.seed)
+    for backend, differences in results.items():
+        print(f"parity {backend} ({args.parity_rows} rows): {'ok' if not differences else '; '.join(differences)}")
+    if any(results.values()):
+        raise SystemExit("Backend results differ from pandas")
+    if args.benchmark and not benchmark(args.backends, args.rows, args.seed):
+        raise SystemExit("Backend results differ from pandas")
@@ -5,6 +5,81 @@ import os
 from datetime import datetime
 import csv
 
+# Các truy vấn export cho BI (migrate_warehouse.py dùng lại để benchmark trước / sau khi thêm index)
+BI_QUERIES = {
+    'fact_data': """
+        SELECT 
+            f.FactID,
+            d.Date,
+            d.Year,
+            d.Month,
+            d.Quarter,
+            g.GoldType,
+            f.BuyPrice,
+            f.SellPrice,
+            f.PriceDifference,
+            f.PriceDifferencePercentage
+        FROM FactGoldPrices f
+        JOIN DimDate d ON f.DateKey = d.DateKey
+        JOIN DimGoldType g ON f.GoldTypeKey = g.GoldTypeKey
+        ORDER BY d.Date DESC
+    """,
+    'daily_aggregates': """
+        SELECT 
+            d.Date,
+            d.Year,
+            d.Month,
+            d.Quarter,
+            a.AvgBuyPrice,
+            a.MinBuyPrice,
+            a.MaxBuyPrice,
+            a.AvgSellPrice,
+            a.MinSellPrice,
+            a.MaxSellPrice,
+            a.AvgPriceDifference
+        FROM AggDailyGoldPrices a
+        JOIN DimDate d ON a.DateKey = d.DateKey
+        ORDER BY d.Date DESC
+    """,
+    'monthly_aggregates': """
+        SELECT 
+            Year,
+            Month,
+            AvgBuyPrice,
+            MinBuyPrice,
+            MaxBuyPrice,
+            AvgSellPrice,
+            MinSellPrice,
+            MaxSellPrice,
+            AvgPriceDifference
+        FROM AggMonthlyGoldPrices
+        ORDER BY Year DESC, Month DESC
+    """,
+    'gold_type_analysis': """
+        WITH GoldTypeStats AS (
+            SELECT 
+                g.GoldType,
+                AVG(f.BuyPrice) as AvgBuyPrice,
+                AVG(f.SellPrice) as AvgSellPrice,
+                AVG(f.PriceDifference) as AvgPriceDiff,
+                AVG(f.PriceDifferencePercentage) as AvgPriceDiffPct,
+                COUNT(*) as TotalRecords
+            FROM FactGoldPrices f
+            JOIN DimGoldType g ON f.GoldTypeKey = g.GoldTypeKey
+            GROUP BY g.GoldType
+        )
+        SELECT 
+            GoldType,
+            ROUND(AvgBuyPrice, 2) as AvgBuyPrice,
+            ROUND(AvgSellPrice, 2) as AvgSellPrice,
+            ROUND(AvgPriceDiff, 2) as AvgPriceDiff,
+            ROUND(AvgPriceDiffPct, 2) as AvgPriceDiffPct,
+            TotalRecords
+        FROM GoldTypeStats
+        ORDER BY TotalRecords DESC
+    """
+}
+
 class BIDataExporter:
     def __init__(self, config_path):
         with open(config_path, 'r') as f:
@@ -32,23 +107,7 @@ class BIDataExporter:
         print("Exporting fact data...")
         conn = pyodbc.connect(self.warehouse_conn_str)
         
-        query = """
-            SELECT 
-                f.FactID,
-                d.Date,
-                d.Year,
-                d.Month,
-                d.Quarter,
-                g.GoldType,
-                f.BuyPrice,
-                f.SellPrice,
-                f.PriceDifference,
-                f.PriceDifferencePercentage
-            FROM FactGoldPrices f
-            JOIN DimDate d ON f.DateKey = d.DateKey
-            JOIN DimGoldType g ON f.GoldTypeKey = g.GoldTypeKey
-            ORDER BY d.Date DESC
-        """
+        query = BI_QUERIES['fact_data']
         
         df = pd.read_sql(query, conn)
         output_file = os.path.join(self.export_dir, 'fact_gold_prices.csv')
@@ -63,23 +122,7 @@ class BIDataExporter:
         print("Exporting daily aggregates...")
         conn = pyodbc.connect(self.warehouse_conn_str)
         
-        query = """
-            SELECT 
-                d.Date,
-                d.Year,
-                d.Month,
-                d.Quarter,
-                a.AvgBuyPrice,
-                a.MinBuyPrice,
-                a.MaxBuyPrice,
-                a.AvgSellPrice,
-                a.MinSellPrice,
-                a.MaxSellPrice,
-                a.AvgPriceDifference
-            FROM AggDailyGoldPrices a
-            JOIN DimDate d ON a.DateKey = d.DateKey
-            ORDER BY d.Date DESC
-        """
+        query = BI_QUERIES['daily_aggregates']
         
         df = pd.read_sql(query, conn)
         output_file = os.path.join(self.export_dir, 'daily_aggregates.csv')
@@ -94,20 +137,7 @@ class BIDataExporter:
         print("Exporting monthly aggregates...")
         conn = pyodbc.connect(self.warehouse_conn_str)
         
-        query = """
-            SELECT 
-                Year,
-                Month,
-                AvgBuyPrice,
-                MinBuyPrice,
-                MaxBuyPrice,
-                AvgSellPrice,
-                MinSellPrice,
-                MaxSellPrice,
-                AvgPriceDifference
-            FROM AggMonthlyGoldPrices
-            ORDER BY Year DESC, Month DESC
-        """
+        query = BI_QUERIES['monthly_aggregates']
         
         df = pd.read_sql(query, conn)
         output_file = os.path.join(self.export_dir, 'monthly_aggregates.csv')
@@ -122,29 +152,7 @@ class BIDataExporter:
         print("Exporting gold type analysis...")
         conn = pyodbc.connect(self.warehouse_conn_str)
         
-        query = """
-            WITH GoldTypeStats AS (
-                SELECT 
-                    g.GoldType,
-                    AVG(f.BuyPrice) as AvgBuyPrice,
-                    AVG(f.SellPrice) as AvgSellPrice,
-                    AVG(f.PriceDifference) as AvgPriceDiff,
-                    AVG(f.PriceDifferencePercentage) as AvgPriceDiffPct,
-                    COUNT(*) as TotalRecords
-                FROM FactGoldPrices f
-                JOIN DimGoldType g ON f.GoldTypeKey = g.GoldTypeKey
-                GROUP BY g.GoldType
-            )
-            SELECT 
-                GoldType,
-                ROUND(AvgBuyPrice, 2) as AvgBuyPrice,
-                ROUND(AvgSellPrice, 2) as AvgSellPrice,
-                ROUND(AvgPriceDiff, 2) as AvgPriceDiff,
-                ROUND(AvgPriceDiffPct, 2) as AvgPriceDiffPct,
-                TotalRecords
-            FROM GoldTypeStats
-            ORDER BY TotalRecords DESC
-        """
+        query = BI_QUERIES['gold_type_analysis']
         
         df = pd.read_sql(query, conn)
         output_file = os.path.join(self.export_dir, 'gold_type_analysis.csv')
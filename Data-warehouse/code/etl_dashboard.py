@@ -122,6 +122,8 @@ def main():
                         return 'background-color: #90EE90'
                     elif val == 'FAILED':
                         return 'background-color: #FFB6C1'
+                    elif val == 'SKIPPED':
+                        return 'background-color: #D3D3D3'
                     return ''
                 
                 styled_status = job_status.style.map(color_status, subset=['status'])
@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import re
+import time
+import pyodbc
+from bi_report import BI_QUERIES
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRATION_FILE = os.path.join(BASE_DIR, 'sql', 'warehouse_indexes.sql')
+
+# Truy vấn chỉ đọc tương đương phần SELECT của các procedure mart và lookup dimension khi load
+MART_QUERIES = {
+    'daily_mart': """
+        SELECT f.DateKey, AVG(f.BuyPrice), MIN(f.BuyPrice), MAX(f.BuyPrice),
+               AVG(f.SellPrice), MIN(f.SellPrice), MAX(f.SellPrice), AVG(f.PriceDifference)
+        FROM FactGoldPrices f
+        GROUP BY f.DateKey
+    """,
+    'monthly_mart': """
+        SELECT d.Year, d.Month, AVG(f.BuyPrice), MIN(f.BuyPrice), MAX(f.BuyPrice),
+               AVG(f.SellPrice), MIN(f.SellPrice), MAX(f.SellPrice), AVG(f.PriceDifference)
+        FROM FactGoldPrices f
+        JOIN DimDate d ON f.DateKey = d.DateKey
+        GROUP BY d.Year, d.Month
+    """,
+    'latest_month_refresh': """
+        SELECT COUNT(*), AVG(f.BuyPrice), AVG(f.SellPrice)
+        FROM FactGoldPrices f
+        WHERE f.DateKey BETWEEN (SELECT MAX(DateKey) / 100 * 100 + 1 FROM FactGoldPrices)
+                            AND (SELECT MAX(DateKey) / 100 * 100 + 31 FROM FactGoldPrices)
+    """,
+    'gold_type_lookup': """
+        SELECT g.GoldTypeKey
+        FROM DimGoldType g
+        WHERE g.GoldType = (SELECT MAX(GoldType) FROM DimGoldType)
+    """
+}
+
+
+def create_connection_string(config, db_name):
+    db_config = config['database']
+    return (
+        f"DRIVER={{{db_config['driver']}}};"
+        f"SERVER={db_config['server']};"
+        f"DATABASE={db_name};"
+        "Trusted_Connection=yes;"
+        "Connection Timeout=30;"
+    )
+
+
+def split_batches(sql):
+    """Tách script theo dòng GO (giống sqlcmd / SSMS)"""
+    batches = re.split(r'^\s*GO\s*$', sql, flags=re.MULTILINE | re.IGNORECASE)
+    return [batch.strip() for batch in batches if batch.strip()]
+
+
+def run_migration(conn, path=MIGRATION_FILE):
+    """Chạy từng batch của file migration, trả về số batch đã chạy"""
+    with open(path, 'r', encoding='utf-8') as f:
+        batches = split_batches(f.read())
+    cursor = conn.cursor()
+    for number, batch in enumerate(batches, 1):
+        started = time.perf_counter()
+        cursor.execute(batch)
+        # Đọc hết các result / message (PRINT) của batch
+        while cursor.nextset():
+            pass
+        print(f"Batch {number}/{len(batches)} done in {time.perf_counter() - started:.2f}s")
+    return len(batches)
+
+
+def benchmark_queries(conn, queries, runs=5, cold=False):
+    """Chạy mỗi truy vấn runs lần, trả về {tên: {'rows', 'avg_ms', 'min_ms'}}
+    cold=True xóa buffer pool trước mỗi lần chạy (cần quyền sysadmin)
+    """
+    cursor = conn.cursor()
+    results = {}
+    for name, query in queries.items():
+        timings = []
+        rows = 0
+        for _ in range(runs):
+            if cold:
+                cursor.execute("CHECKPOINT; DBCC DROPCLEANBUFFERS WITH NO_INFOMSGS;")
+            started = time.perf_counter()
+            cursor.execute(query)
+            rows = len(cursor.fetchall())
+            timings.append((time.perf_counter() - started) * 1000)
+        results[name] = {
+            'rows': rows,
+            'avg_ms': round(sum(timings) / len(timings), 2),
+            'min_ms': round(min(timings), 2)
+        }
+        print(f"{name}: {rows} rows, avg {results[name]['avg_ms']} ms, min {results[name]['min_ms']} ms")
+    return results
+
+
+def print_comparison(before, after):
+    print(f"\n{'query':<24}{'before ms':>12}{'after ms':>12}{'speedup':>10}")
+    for name in before:
+        before_ms, after_ms = before[name]['avg_ms'], after[name]['avg_ms']
+        speedup = f"{before_ms / after_ms:.1f}x" if after_ms else '-'
+        print(f"{name:<24}{before_ms:>12}{after_ms:>12}{speedup:>10}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply warehouse_indexes.sql and benchmark the BI queries before/after")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--cold', action='store_true', help="Drop clean buffers before each run (sysadmin only)")
+    parser.add_argument('--benchmark-only', action='store_true', help="Only run the benchmark, do not migrate")
+    parser.add_argument('--skip-benchmark', action='store_true', help="Only run the migration")
+    parser.add_argument('--output', help="Write benchmark results to this JSON file")
+    args = parser.parse_args()
+
+    with open(os.path.join(BASE_DIR, 'config.json'), 'r') as f:
+        config = json.load(f)
+    conn = pyodbc.connect(create_connection_string(config, 'warehouse_db'), autocommit=True)
+    queries = dict(BI_QUERIES, **MART_QUERIES)
+
+    try:
+        results = {}
+        if not args.skip_benchmark:
+            print("Benchmark before migration:")
+            results['before'] = benchmark_queries(conn, queries, args.runs, args.cold)
+        if not args.benchmark_only:
+            print(f"\nApplying {MIGRATION_FILE}")
+            run_migration(conn)
+            if not args.skip_benchmark:
+                print("\nBenchmark after migration:")
+                results['after'] = benchmark_queries(conn, queries, args.runs, args.cold)
+                print_comparison(results['before'], results['after'])
+        if args.output and results:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=4)
+            print(f"Benchmark results saved to: {args.output}")
+    finally:
+        conn.close()
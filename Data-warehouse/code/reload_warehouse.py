@@ -2,56 +2,85 @@ import pyodbc
 import pandas as pd
 import json
 import os
+import sys
 from datetime import datetime
+from BulkLoader import bulk_insert
+from Watermark import RELOAD_WAREHOUSE, ensure_row_version, get_watermark, set_watermark, staging_query
 
 def load_config():
     config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.json')
     with open(config_path, 'r') as f:
         return json.load(f)
 
-def create_connection(db_name):
+def create_connection_string(db_name):
     config = load_config()
     db_config = config['database']
-    conn_str = (
+    return (
         f"DRIVER={{{db_config['driver']}}};"
         f"SERVER={db_config['server']};"
         f"DATABASE={db_name};"
         "Trusted_Connection=yes;"
     )
-    return pyodbc.connect(conn_str)
 
-def main():
+def create_connection(db_name):
+    return pyodbc.connect(create_connection_string(db_name))
+
+def main(full_rebuild=False):
+    """Đưa dữ liệu staging vào warehouse GoldPrices
+    Mặc định chỉ load các dòng staging được ghi sau watermark 'reload_warehouse' (RowVer) trong control_db;
+    full_rebuild=True xóa toàn bộ bảng warehouse rồi load lại
+    """
     try:
+        # Đọc watermark từ control_db
+        control_conn_str = create_connection_string('control_db')
+        watermark = (None, None)
+        if not full_rebuild:
+            watermark = get_watermark(control_conn_str, RELOAD_WAREHOUSE)
+            print(f"Incremental reload since watermark: row version {watermark[1]} ({watermark[0]})")
+
         # Kết nối đến staging database
         print("Connecting to staging database...")
         staging_conn = create_connection('staging_db')
         staging_cursor = staging_conn.cursor()
+        ensure_row_version(staging_cursor)
+        staging_conn.commit()
         
         # Lấy dữ liệu từ staging
         print("Fetching data from staging...")
-        staging_cursor.execute("SELECT * FROM GoldPrices")
+        query, params = staging_query(watermark)
+        staging_cursor.execute(query, *params)
         staging_data = staging_cursor.fetchall()
         print(f"Found {len(staging_data)} records in staging")
+
+        if not staging_data:
+            print("No new data to reload")
+            staging_conn.close()
+            return
         
         # Kết nối đến warehouse database
         print("\nConnecting to warehouse database...")
         warehouse_conn = create_connection('warehouse_db')
         warehouse_cursor = warehouse_conn.cursor()
         
-        # Xóa dữ liệu cũ trong warehouse
-        print("Clearing old data from warehouse...")
-        warehouse_cursor.execute("DELETE FROM GoldPrices")
-        warehouse_conn.commit()
+        # Xóa dữ liệu cũ trong warehouse (chỉ khi full rebuild)
+        if full_rebuild:
+            print("Clearing old data from warehouse...")
+            warehouse_cursor.execute("DELETE FROM GoldPrices")
         
-        # Insert dữ liệu mới
+        # Insert dữ liệu mới theo lô
         print("Inserting new data to warehouse...")
-        for row in staging_data:
-            warehouse_cursor.execute("""
-                INSERT INTO GoldPrices (GoldType, BuyPrice, SellPrice, UpdateTime)
-                VALUES (?, ?, ?, ?)
-            """, (row.GoldType, row.BuyPrice, row.SellPrice, row.UpdateTime))
+        rows = [(row.GoldType, row.BuyPrice, row.SellPrice, row.UpdateTime) for row in staging_data]
+        bulk_insert(warehouse_conn, """
+            INSERT INTO GoldPrices (GoldType, BuyPrice, SellPrice, UpdateTime)
+            VALUES (?, ?, ?, ?)
+        """, rows, load_config()['etl'].get('batch_size', 1000), 'warehouse rows')
         
         warehouse_conn.commit()
+
+        # Cập nhật watermark
+        update_times = [row.UpdateTime for row in staging_data if row.UpdateTime is not None]
+        set_watermark(control_conn_str, RELOAD_WAREHOUSE, max(update_times) if update_times else None,
+                      max(row.RowVer for row in staging_data))
         
         # Kiểm tra dữ liệu mới
         print("\nChecking new data in warehouse...")
@@ -78,4 +107,4 @@ def main():
         print(f"Error: {str(e)}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main(full_rebuild='--full-rebuild' in sys.argv)
@@ -1,6 +1,19 @@
 from DataExtractor import DataExtractor
-from DataTransformer import DataTransformer
+from DataTransformer import DataTransformer, chunk_rows_for_budget
 from mart_etl import MartETL
+from BulkLoader import (bulk_insert, frame_to_rows, summarize_batches, load_star_schema_chunks, drop_temp_tables,
+                        refresh_aggregates)
+from SnapshotManager import ROW_HASH_EXPRESSION, ensure_row_hash, merge_new_rows
+from Watermark import WAREHOUSE_FACT_LOAD, ensure_row_version, get_watermark, set_watermark, staging_query
+from ConnectionPool import configure_pools, pooled_connection, pool_stats
+from LogSink import configure_log_sink, get_log_sink
+from BrowserPool import configure_browser_pool, get_browser_pool
+from ArtifactStore import ArtifactStore
+from StagingFormat import list_staging_files, read_staging
+from DagScheduler import DagExecutor, load_job_graph, root_jobs, downstream_closure
+from ChangeDetector import record_skipped_job
+from DimensionCache import get_dimension_cache
+from CalendarDimension import calendar_years, populate_dim_date
 import pyodbc
 import json
 import os
@@ -9,23 +22,86 @@ import pandas as pd
 import schedule
 import time
 import sys
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+def staging_watermark(df):
+    """(UpdateTime, RowVer) lớn nhất của một DataFrame staging
+    RowVer là điều kiện đọc incremental, UpdateTime chỉ để theo dõi - hai giá trị không cần cùng một dòng
+    """
+    return pd.to_datetime(df['UpdateTime']).max().to_pydatetime(), int(df['RowVer'].max())
+
 
 class ETLRunner:
-    def __init__(self, config_path):
+    def __init__(self, config_path, staging_load_mode=None):
         with open(config_path, 'r') as f:
             self.config = json.load(f)
+
+        # Cấu hình load staging: 'bulk' hoặc 'row', batch size lấy từ etl.batch_size
+        etl_config = self.config.get('etl', {})
+        self.batch_size = etl_config.get('batch_size', 1000)
+        self.staging_load_mode = staging_load_mode or etl_config.get('staging_load_mode', 'bulk')
+        self.last_staging_stats = []
+        self.last_staging_mode = self.staging_load_mode
+        # Số dòng mỗi chunk khi đọc CSV lớn (None = đọc cả file một lần)
+        self.chunk_size = etl_config.get('chunk_size')
+        # Số worker chạy song song các job extract (None = mỗi nguồn một worker)
+        self.extract_workers = etl_config.get('extract_workers')
+        # Số job chạy song song khi chạy theo Job_Dependencies (--dag)
+        self.dag_workers = etl_config.get('dag_workers', 4)
+        # High-water mark chờ ghi sau khi warehouse load thành công: (UpdateTime, RowVer)
+        self.pending_watermark = None
+        # Mart refresh: 'incremental' hoặc 'full'; DateKey thay đổi chờ refresh (None = refresh toàn bộ)
+        self.mart_refresh_mode = etl_config.get('mart_refresh_mode', 'incremental')
+        self.pending_mart_keys = {'daily': None, 'monthly': None}
+        # Cache surrogate key DimGoldType / DimDate dùng chung giữa các lần load trong process
+        self.key_cache = get_dimension_cache() if etl_config.get('key_cache', True) else None
+        # DimDate được điền sẵn cho các năm etl.calendar ở lần load warehouse đầu tiên của process
+        self.calendar_years = calendar_years(etl_config.get('calendar', {}))
+        self.calendar_ready = False
             
         self.base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         self.data_dir = os.path.join(self.base_dir, 'data')
+
+        # Kết quả transform theo run_id, job load_warehouse chạy riêng lấy lại từ đây
+        artifact_config = etl_config.get('artifacts', {})
+        self.artifacts = ArtifactStore(
+            os.path.join(self.data_dir, 'artifacts'),
+            spill=artifact_config.get('spill', False),
+            spill_format=artifact_config.get('format', 'parquet'),
+            max_in_memory=artifact_config.get('max_in_memory', 3),
+            keep_runs=artifact_config.get('keep_runs', 10)
+        )
+        self.last_run_id = None
         
-        # Initialize connections
+        # Initialize connections (control_db dùng chung pool cho job bookkeeping và logging)
+        configure_pools(self.config['database'].get('pool', {}))
+        configure_log_sink(self.config.get('logging', {}))
+        configure_browser_pool(self.config.get('crawler', {}))
+        self.log_sink = get_log_sink()
         self.control_conn_str = self.create_connection_string('control_db')
         self.staging_conn_str = self.create_connection_string('staging_db')
         self.warehouse_conn_str = self.create_connection_string('warehouse_db')
         
         # Initialize components
-        self.extractor = DataExtractor(output_dir=self.data_dir)
-        self.transformer = DataTransformer()
+        self.extractor = DataExtractor(
+            output_dir=self.data_dir,
+            staging_format=etl_config.get('staging_format', 'json'),
+            crawl_mode=self.config.get('crawler', {}).get('mode', 'auto'),
+            http_timeout=self.config.get('crawler', {}).get('http_timeout_seconds', 10),
+            skip_unchanged=self.config.get('crawler', {}).get('skip_unchanged', True)
+        )
+        # Transform 'lean' (không copy, một lượt) hoặc 'legacy';
+        # memory_budget_mb: đọc và transform staging theo chunk để bộ nhớ tạm không tăng theo số dòng
+        # backend: 'pandas', 'polars' hoặc 'duckdb' cho transform cả bảng ở chế độ lean
+        transform_config = etl_config.get('transform', {})
+        self.transformer = DataTransformer(
+            lean=transform_config.get('mode', 'lean') == 'lean',
+            track_memory=transform_config.get('track_memory', False),
+            backend=transform_config.get('backend', 'pandas')
+        )
+        budget = transform_config.get('memory_budget_mb')
+        self.transform_chunk_rows = chunk_rows_for_budget(budget) if budget and self.transformer.lean else None
         self.mart_etl = MartETL(self.warehouse_conn_str)
 
     def create_connection_string(self, db_name):
@@ -40,238 +116,375 @@ class ETLRunner:
 
     def start_job(self, job_name):
         """Record job start in control database"""
-        conn = pyodbc.connect(self.control_conn_str)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT job_id FROM ETL_Jobs WHERE job_name = ?", job_name)
-        job_id = cursor.fetchone()[0]
-        
-        cursor.execute("""
-            INSERT INTO Job_Status (job_id, status)
-            VALUES (?, 'RUNNING')
-        """, job_id)
-        
-        conn.commit()
-        status_id = cursor.execute("SELECT @@IDENTITY").fetchone()[0]
-        
+        with pooled_connection(self.control_conn_str) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute("SELECT job_id FROM ETL_Jobs WHERE job_name = ?", job_name)
+            job_id = cursor.fetchone()[0]
+            
+            cursor.execute("""
+                INSERT INTO Job_Status (job_id, status)
+                VALUES (?, 'RUNNING')
+            """, job_id)
+            
+            conn.commit()
+            status_id = cursor.execute("SELECT @@IDENTITY").fetchone()[0]
+            
         # Thêm log khi bắt đầu job
-        cursor.execute("""
-            INSERT INTO Logs (job_id, status_id, message, level)
-            VALUES (?, ?, ?, ?)
-        """, job_id, status_id, f"Starting job: {job_name}", "INFO")
-        conn.commit()
-        
-        conn.close()
+        self.log_message(job_id, status_id, f"Starting job: {job_name}")
         return job_id, status_id
 
     def end_job(self, job_id, status_id, success, records=0, error_message=None):
         """Record job completion in control database"""
-        conn = pyodbc.connect(self.control_conn_str)
-        cursor = conn.cursor()
-        
-        # Get job name for logging
-        cursor.execute("SELECT job_name FROM ETL_Jobs WHERE job_id = ?", job_id)
-        job_name = cursor.fetchone()[0]
-        
-        # Update status
-        cursor.execute("""
-            UPDATE Job_Status 
-            SET status = ?, end_time = GETDATE(), 
-                records_processed = ?, error_message = ?
-            WHERE status_id = ?
-        """, 'SUCCESS' if success else 'FAILED', records, error_message, status_id)
-        
-        # Add completion log
-        log_message = f"Job completed: {job_name}" if success else f"Job failed: {job_name} - {error_message}"
-        log_level = "INFO" if success else "ERROR"
-        
-        cursor.execute("""
-            INSERT INTO Logs (job_id, status_id, message, level)
-            VALUES (?, ?, ?, ?)
-        """, job_id, status_id, log_message, log_level)
-        
-        # Add notification if configured
-        cursor.execute("""
-            INSERT INTO Job_Notifications (job_id, status_id, notification_type, recipient, message)
-            SELECT 
-                ?, ?, nc.notification_type, nc.email_recipient,
-                ? + CASE WHEN ? = 1 THEN ' - Success' ELSE ' - Failed: ' + ISNULL(?, 'Unknown error') END
-            FROM Notification_Config nc
-            WHERE nc.job_id = ?
-                AND ((? = 1 AND nc.notify_on_success = 1) 
-                    OR (? = 0 AND nc.notify_on_failure = 1))
-        """, job_id, status_id, f"Job {job_name}", success, error_message, job_id, success, success)
-        
-        conn.commit()
-        conn.close()
-
-    def log_message(self, job_id, status_id, message, level="INFO"):
-        """Add a log entry"""
-        try:
-            conn = pyodbc.connect(self.control_conn_str)
+        with pooled_connection(self.control_conn_str) as conn:
             cursor = conn.cursor()
             
+            # Get job name for logging
+            cursor.execute("SELECT job_name FROM ETL_Jobs WHERE job_id = ?", job_id)
+            job_name = cursor.fetchone()[0]
+            
+            # Update status
             cursor.execute("""
-                INSERT INTO Logs (job_id, status_id, message, level)
-                VALUES (?, ?, ?, ?)
-            """, job_id, status_id, message, level)
+                UPDATE Job_Status 
+                SET status = ?, end_time = GETDATE(), 
+                    records_processed = ?, error_message = ?
+                WHERE status_id = ?
+            """, 'SUCCESS' if success else 'FAILED', records, error_message, status_id)
+            
+            # Add completion log
+            log_message = f"Job completed: {job_name}" if success else f"Job failed: {job_name} - {error_message}"
+            log_level = "INFO" if success else "ERROR"
+            self.log_message(job_id, status_id, log_message, log_level)
+            
+            # Add notification if configured
+            cursor.execute("""
+                INSERT INTO Job_Notifications (job_id, status_id, notification_type, recipient, message)
+                SELECT 
+                    ?, ?, nc.notification_type, nc.email_recipient,
+                    ? + CASE WHEN ? = 1 THEN ' - Success' ELSE ' - Failed: ' + ISNULL(?, 'Unknown error') END
+                FROM Notification_Config nc
+                WHERE nc.job_id = ?
+                    AND ((? = 1 AND nc.notify_on_success = 1) 
+                        OR (? = 0 AND nc.notify_on_failure = 1))
+            """, job_id, status_id, f"Job {job_name}", success, error_message, job_id, success, success)
             
             conn.commit()
-            conn.close()
-        except Exception as e:
-            print(f"Error logging message: {str(e)}")
 
-    def load_staging_data(self, json_files):
-        """Load data from staging JSON files into staging database"""
-        all_data = []
-        for json_file in json_files:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                all_data.extend(data)
+    def skip_job(self, job_name, reason):
+        """Ghi nhận job không chạy (status 'SKIPPED' trong Job_Status) kèm lý do"""
+        job_id, status_id = record_skipped_job(self.control_conn_str, job_name, reason)
+        self.log_message(job_id, status_id, f"Job skipped: {job_name} - {reason}")
+        print(f"Skipping {job_name}: {reason}")
 
-        if not all_data:
-            raise ValueError("No data found in staging files")
+    def skip_jobs(self, job_names, reason):
+        for job_name in job_names:
+            self.skip_job(job_name, reason)
 
-        # Convert to DataFrame
-        df = pd.DataFrame(all_data)
+    def log_message(self, job_id, status_id, message, level="INFO"):
+        """Add a log entry (ghi bất đồng bộ qua log sink, không chặn job)"""
+        self.log_sink.log_db(self.control_conn_str, """
+            INSERT INTO Logs (job_id, status_id, message, level)
+            VALUES (?, ?, ?, ?)
+        """, (job_id, status_id, message, level))
+
+    def load_staging_data(self, staging_files, load_mode=None):
+        """Load data from staging files (json / parquet / arrow) into staging database
+        load_mode: 'bulk' (executemany theo lô etl.batch_size) hoặc 'row' (INSERT từng dòng)
+        GoldPrices chỉ được thêm dòng: mỗi file vào temp table #StageGoldPrices rồi MERGE theo RowHash,
+        dòng đã có (lần extract trước) giữ nguyên RowVer nên không bị warehouse load đọc lại.
+        Trả về số dòng mới trong GoldPrices
+        """
+        load_mode = load_mode or self.staging_load_mode
+        self.last_staging_mode = load_mode
+        self.last_staging_stats = []
 
         # Connect to staging database and load data
         conn = pyodbc.connect(self.staging_conn_str)
         cursor = conn.cursor()
 
-        # Clear existing data
-        cursor.execute("TRUNCATE TABLE GoldPrices")
-
-        # Insert new data
-        for _, row in df.iterrows():
-            cursor.execute("""
-                INSERT INTO GoldPrices (GoldType, BuyPrice, SellPrice, UpdateTime)
-                VALUES (?, ?, ?, ?)
-            """, row['GoldType'], row['BuyPrice'], row['SellPrice'], 
-                pd.to_datetime(row['UpdateTime']).strftime('%Y-%m-%d %H:%M:%S'))
-
-        conn.commit()
-        conn.close()
-        return len(df)
-
-    def run_extraction(self):
-        """Run all extraction jobs"""
-        staging_files = []
-
-        # Extract from PNJ website
-        job_id, status_id = self.start_job('extract_pnj')
+        insert_sql = """
+            INSERT INTO #StageGoldPrices (GoldType, BuyPrice, SellPrice, UpdateTime)
+            VALUES (?, ?, ?, ?)
+        """
+        # Load từng file một (mỗi file là một chunk khi extract theo chunk) để bộ nhớ không tăng theo tổng dữ liệu
+        total_rows = new_rows = 0
+        started = time.perf_counter()
         try:
-            self.log_message(job_id, status_id, "Starting PNJ web extraction")
-            json_file = self.extractor.extract_from_pnj()
-            staging_files.append(json_file)
-            self.log_message(job_id, status_id, f"PNJ extraction completed, file saved: {json_file}")
-            self.end_job(job_id, status_id, True)
-        except Exception as e:
-            self.log_message(job_id, status_id, f"PNJ extraction failed: {str(e)}", "ERROR")
-            self.end_job(job_id, status_id, False, error_message=str(e))
+            ensure_row_hash(cursor, 'GoldPrices')
+            ensure_row_version(cursor)
+            cursor.execute(f"""
+                CREATE TABLE #StageGoldPrices (
+                    gold_id INT IDENTITY(1,1) PRIMARY KEY,
+                    GoldType NVARCHAR(255) NOT NULL,
+                    BuyPrice FLOAT NULL,
+                    SellPrice FLOAT NULL,
+                    UpdateTime DATETIME NULL,
+                    RowHash AS {ROW_HASH_EXPRESSION} PERSISTED
+                )
+            """)
+            for file_no, staging_file in enumerate(staging_files, 1):
+                # Đọc thẳng thành DataFrame có kiểu, UpdateTime đã là datetime64
+                df = read_staging(staging_file)
+                if df.empty:
+                    continue
+                df['UpdateTime'] = df['UpdateTime'].dt.strftime('%Y-%m-%d %H:%M:%S')
+                rows = frame_to_rows(df, ['GoldType', 'BuyPrice', 'SellPrice', 'UpdateTime'])
+
+                if load_mode == 'bulk':
+                    self.last_staging_stats.extend(
+                        bulk_insert(conn, insert_sql, rows, self.batch_size, 'staging rows'))
+                else:
+                    # Insert new data
+                    file_started = time.perf_counter()
+                    for row in rows:
+                        cursor.execute(insert_sql, row)
+                    self.last_staging_stats.append({
+                        'batch': file_no, 'rows': len(rows),
+                        'seconds': round(time.perf_counter() - file_started, 4)
+                    })
+                # Chỉ dòng chưa có trong GoldPrices được thêm
+                file_new_rows = merge_new_rows(cursor, '#StageGoldPrices')
+                cursor.execute("TRUNCATE TABLE #StageGoldPrices")
+                total_rows += len(rows)
+                new_rows += file_new_rows
+                print(f"Staging file {file_no}/{len(staging_files)}: {len(rows)} rows, {file_new_rows} new "
+                      f"(total {total_rows} rows, {new_rows} new) in {time.perf_counter() - started:.1f}s")
+
+            if not total_rows:
+                raise ValueError("No data found in staging files")
+            conn.commit()
+        except Exception:
+            conn.rollback()
             raise
+        finally:
+            drop_temp_tables(cursor, '#StageGoldPrices')
+            conn.close()
+        return new_rows
 
-        # Extract from CSV
-        job_id, status_id = self.start_job('extract_csv')
-        try:
-            csv_file = os.path.join(self.data_dir, "gold_price.csv")
-            self.log_message(job_id, status_id, f"Starting CSV extraction from: {csv_file}")
-            if os.path.exists(csv_file):
-                json_file = self.extractor.extract_from_csv(csv_file)
-                staging_files.append(json_file)
-                self.log_message(job_id, status_id, f"CSV extraction completed, file saved: {json_file}")
-                self.end_job(job_id, status_id, True)
-        except Exception as e:
-            self.log_message(job_id, status_id, f"CSV extraction failed: {str(e)}", "ERROR")
-            self.end_job(job_id, status_id, False, error_message=str(e))
-            raise
+    @staticmethod
+    def collect_staging_files(results):
+        """Gom file staging từ kết quả các job extract (một file, hoặc list file khi extract theo chunk)"""
+        staging_files = []
+        for result in results:
+            if isinstance(result, (list, tuple)):
+                staging_files.extend(result)
+            elif result:
+                staging_files.append(result)
+        return staging_files
+
+    def describe_staging_stats(self):
+        """Mô tả ngắn gọn thống kê lần load staging gần nhất để ghi log"""
+        total_rows, batches, seconds = summarize_batches(self.last_staging_stats)
+        return f"{total_rows} rows in {batches} batch(es), {seconds}s ({self.last_staging_mode} mode)"
+
+    def run_extraction(self):
+        """Run all extraction jobs
+        Các job extract độc lập (cùng là upstream của load_staging trong Job_Dependencies) chạy song song,
+        lỗi của một nguồn không làm dừng các nguồn còn lại.
+        Trả về False (load_staging SKIPPED) nếu không nguồn nào có dữ liệu thay đổi
+        """
+        extraction_jobs = {
+            'extract_pnj': self.run_pnj_extraction,
+            'extract_csv': self.run_csv_extraction
+        }
+        results = {}
+        failures = {}
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.extract_workers or len(extraction_jobs)) as executor:
+            futures = {executor.submit(job): job_name for job_name, job in extraction_jobs.items()}
+            for future in as_completed(futures):
+                job_name = futures[future]
+                try:
+                    results[job_name] = future.result()
+                except Exception as e:
+                    failures[job_name] = str(e)
+                    print(f"Extraction job {job_name} failed: {str(e)}")
+        print(f"Extraction finished in {time.perf_counter() - started:.2f}s "
+              f"({len(results)} succeeded, {len(failures)} failed)")
+
+        # Giữ thứ tự file staging theo thứ tự job
+        staging_files = self.collect_staging_files(results[job_name] for job_name in extraction_jobs
+                                                   if results.get(job_name))
+        if not staging_files:
+            if failures:
+                raise RuntimeError(f"No staging files extracted, failed sources: {failures}")
+            # Các nguồn đều chạy xong nhưng không đổi so với snapshot đã load
+            self.skip_job('load_staging', "Source data unchanged since last snapshot")
+            return False
 
         # Load staging data into database
         job_id, status_id = self.start_job('load_staging')
         try:
             self.log_message(job_id, status_id, "Starting staging data load")
+            if failures:
+                self.log_message(job_id, status_id, f"Loading partial extraction, failed sources: {failures}", "WARNING")
             records = self.load_staging_data(staging_files)
-            self.log_message(job_id, status_id, f"Loaded {records} records to staging")
+            self.log_message(job_id, status_id, f"Loaded {records} new records to staging: {self.describe_staging_stats()}")
             self.end_job(job_id, status_id, True, records=records)
+            return True
         except Exception as e:
             self.log_message(job_id, status_id, f"Staging load failed: {str(e)}", "ERROR")
             self.end_job(job_id, status_id, False, error_message=str(e))
             raise
 
-    def run_transformation(self):
-        """Run transformation job"""
+    def run_transformation(self, full_rebuild=False):
+        """Run transformation job
+        Mặc định chỉ transform các dòng staging được ghi sau high-water mark (RowVer) trong control_db;
+        full_rebuild=True đọc lại toàn bộ staging. Trả về None nếu không có dữ liệu mới
+        Chế độ chunk: mỗi chunk được load thẳng vào warehouse (stream_staging_chunks), artifact chỉ có metadata
+        """
         job_id, status_id = self.start_job('transform_gold_data')
         try:
             self.log_message(job_id, status_id, "Starting data transformation")
             # Get data from staging
+            watermark = (None, None)
+            if not full_rebuild:
+                watermark = get_watermark(self.control_conn_str, WAREHOUSE_FACT_LOAD)
+                self.log_message(job_id, status_id,
+                                 f"Incremental load since watermark: row version {watermark[1]} ({watermark[0]})")
+            query, params = staging_query(watermark)
             conn = pyodbc.connect(self.staging_conn_str)
-            df = pd.read_sql("SELECT * FROM GoldPrices", conn)
-            conn.close()
+            try:
+                ensure_row_version(conn.cursor())
+                conn.commit()
+                if self.transform_chunk_rows:
+                    self.log_message(job_id, status_id, f"Transforming staging in chunks of {self.transform_chunk_rows} rows, "
+                                                        f"loading each chunk into the warehouse")
+                    records, watermark = self.stream_staging_chunks(conn, query, params, full_rebuild)
+                    transformed_data = {}
+                else:
+                    df = pd.read_sql(query, conn, params=params)
+                    records = len(df)
+                    transformed_data = watermark = None
+                    if records:
+                        # Lấy watermark trước khi transform (chế độ lean sửa df tại chỗ)
+                        watermark = staging_watermark(df)
+                        transformed_data = self.transformer.transform_data(df)
+            finally:
+                conn.close()
 
-            # Transform data
-            transformed_data = self.transformer.transform_data(df)
-            self.log_message(job_id, status_id, f"Transformation completed, {len(df)} records processed")
-            self.end_job(job_id, status_id, True, len(df))
+            if not records:
+                self.pending_watermark = None
+                # Các dòng vừa extract đều đã có trong staging / warehouse
+                self.extractor.commit_snapshots()
+                self.log_message(job_id, status_id, "No new staging rows since last watermark")
+                self.end_job(job_id, status_id, True, 0)
+                return None
+
+            # Watermark mới chỉ được ghi sau khi warehouse load thành công (chế độ chunk: đã ghi khi load xong)
+            streamed = not transformed_data
+            self.pending_watermark = None if streamed else watermark
+            self.log_transform_memory(job_id, status_id)
+            watermark_time, watermark_row_version = watermark
+            self.last_run_id = self.artifacts.put(transformed_data, metadata={
+                'records': records,
+                'full_rebuild': full_rebuild,
+                'watermark': [watermark_time.isoformat(), watermark_row_version],
+                'streamed': streamed
+            })
+            self.log_message(job_id, status_id, f"Transformation completed, {records} records processed, artifact {self.last_run_id}")
+            self.end_job(job_id, status_id, True, records)
             return transformed_data
         except Exception as e:
+            self.pending_watermark = None
             self.log_message(job_id, status_id, f"Transformation failed: {str(e)}", "ERROR")
             self.end_job(job_id, status_id, False, error_message=str(e))
             raise
 
-    def run_warehouse_load(self, transformed_data):
-        """Run warehouse loading job"""
+    def stream_staging_chunks(self, conn, query, params, full_rebuild=False):
+        """Đọc staging theo từng chunk transform_chunk_rows dòng, transform và load lần lượt từng chunk
+        vào warehouse trong một transaction - không chunk nào được giữ lại sau khi load
+        Trả về (số dòng, watermark (UpdateTime, RowVer)), (0, None) nếu không có dòng mới
+        """
+        reader = iter(pd.read_sql(query, conn, params=params, chunksize=self.transform_chunk_rows))
+        first = next(reader, None)
+        if first is None or first.empty:
+            return 0, None
+        state = {'first': first, 'records': 0, 'watermark': None}
+        del first
+
+        def chunks():
+            df = state.pop('first')
+            while df is not None:
+                chunk_watermark = staging_watermark(df)
+                state['records'] += len(df)
+                previous = state['watermark'] or chunk_watermark
+                state['watermark'] = (max(previous[0], chunk_watermark[0]), max(previous[1], chunk_watermark[1]))
+                # run_warehouse_load ghi watermark sau commit, khi mọi chunk đã được đọc
+                self.pending_watermark = state['watermark']
+                yield df
+                del df
+                df = next(reader, None)
+
+        self.pending_watermark = None
+        self.run_warehouse_load(self.transformer.transform_chunks(chunks()), full_rebuild=full_rebuild)
+        return state['records'], state['watermark']
+
+    def log_transform_memory(self, job_id, status_id):
+        """Ghi thời gian / bộ nhớ đỉnh từng stage của lần transform vừa chạy (khi bật track_memory)"""
+        if not self.transformer.track_memory:
+            return
+        stages = ', '.join(
+            f"{entry['stage']} {entry['seconds']}s/{entry['peak_mb']}MB" for entry in self.transformer.last_memory_report
+        )
+        self.log_message(job_id, status_id, f"Transform peak memory {self.transformer.peak_memory_mb()} MB ({stages})")
+
+    def run_warehouse_load(self, transformed_data, full_rebuild=False, run_id=None):
+        """Run warehouse loading job
+        transformed_data: dict của transform_data hoặc các chunk của transform_chunks (load lần lượt);
+        full_rebuild=True xóa FactGoldPrices trước khi load lại toàn bộ;
+        run_id: artifact được đánh dấu consumed sau khi load thành công
+        """
         job_id, status_id = self.start_job('load_warehouse')
+        conn = None
         try:
             self.log_message(job_id, status_id, "Starting warehouse load")
             conn = pyodbc.connect(self.warehouse_conn_str)
-            cursor = conn.cursor()
-            
-            # Load dimensions
-            date_dim = transformed_data['date_dim']
-            gold_type_dim = transformed_data['gold_type_dim']
-            fact_table = transformed_data['fact_table']
-            
-            # Load date dimension
-            self.log_message(job_id, status_id, "Loading date dimension")
-            for _, row in date_dim.iterrows():
-                cursor.execute("""
-                    IF NOT EXISTS (SELECT 1 FROM DimDate WHERE DateKey = ?)
-                    INSERT INTO DimDate (DateKey, Date, Year, Month, Day, Quarter)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, row['DateKey'], row['DateKey'], row['Date'], 
-                    row['Year'], row['Month'], row['Day'], row['Quarter'])
-
-            # Load gold type dimension
-            self.log_message(job_id, status_id, "Loading gold type dimension")
-            for _, row in gold_type_dim.iterrows():
-                cursor.execute("""
-                    IF NOT EXISTS (SELECT 1 FROM DimGoldType WHERE GoldType = ?)
-                    INSERT INTO DimGoldType (GoldType, Created_at)
-                    VALUES (?, ?)
-                """, row['GoldType'], row['GoldType'], row['Created_at'])
-                
-                # Get the actual GoldTypeKey
-                cursor.execute("SELECT GoldTypeKey FROM DimGoldType WHERE GoldType = ?", row['GoldType'])
-                actual_key = cursor.fetchone()[0]
-                # Update the key in our DataFrame for fact table loading
-                fact_table.loc[fact_table['GoldTypeKey'] == row['GoldTypeKey'], 'GoldTypeKey'] = actual_key
-
-            # Load fact table
-            self.log_message(job_id, status_id, "Loading fact table")
-            for _, row in fact_table.iterrows():
-                cursor.execute("""
-                    INSERT INTO FactGoldPrices 
-                    (GoldTypeKey, DateKey, BuyPrice, SellPrice, PriceDifference, PriceDifferencePercentage)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, row['GoldTypeKey'], row['DateKey'], row['BuyPrice'], 
-                    row['SellPrice'], row['PriceDifference'], row['PriceDifferencePercentage'])
-            
+
+            if full_rebuild:
+                self.log_message(job_id, status_id, "Full rebuild: clearing fact table")
+                # TRUNCATE thay cho DELETE: không để lại delete bitmap trong columnstore
+                conn.cursor().execute("TRUNCATE TABLE FactGoldPrices")
+
+            if not self.calendar_ready:
+                start_year, end_year = self.calendar_years
+                days = populate_dim_date(conn, start_year, end_year, self.batch_size)
+                self.log_message(job_id, status_id, f"DimDate populated for {start_year}-{end_year}: {days} new days")
+
+            # Load dimensions và fact theo kiểu set-based (temp table + MERGE / INSERT...SELECT)
+            self.log_message(job_id, status_id, "Loading date dimension, gold type dimension and fact table")
+            records, date_keys = load_star_schema_chunks(conn, transformed_data, self.batch_size,
+                                                         key_cache=self.key_cache)
+
             conn.commit()
-            self.log_message(job_id, status_id, f"Warehouse load completed, {len(fact_table)} records loaded")
-            self.end_job(job_id, status_id, True, len(fact_table))
+            self.calendar_ready = True
+
+            # Ghi nhận DateKey thay đổi cho bước mart; full rebuild thì mart tính lại toàn bộ
+            if full_rebuild:
+                self.pending_mart_keys = {mart: None for mart in self.pending_mart_keys}
+            else:
+                self.track_changed_date_keys(date_keys)
+
+            # Cập nhật high-water mark sau khi commit
+            if self.pending_watermark:
+                set_watermark(self.control_conn_str, WAREHOUSE_FACT_LOAD, *self.pending_watermark)
+                self.log_message(job_id, status_id, f"Watermark advanced to row version {self.pending_watermark[1]} "
+                                                    f"({self.pending_watermark[0]})")
+                self.pending_watermark = None
+            if run_id:
+                self.artifacts.mark_consumed(run_id)
+            # Snapshot giá vừa crawl đã vào warehouse, lần crawl sau giống hệt sẽ được bỏ qua
+            self.extractor.commit_snapshots()
+            self.log_message(job_id, status_id, f"Warehouse load completed, {records} records loaded")
+            self.end_job(job_id, status_id, True, records)
+            return records
         except Exception as e:
             if conn:
                 conn.rollback()
+            if self.key_cache is not None:
+                # Key vừa insert đã bị rollback
+                self.key_cache.invalidate()
             self.log_message(job_id, status_id, f"Warehouse load failed: {str(e)}", "ERROR")
             self.end_job(job_id, status_id, False, error_message=str(e))
             raise
@@ -279,63 +492,156 @@ class ETLRunner:
             if conn:
                 conn.close()
 
+    def run_warehouse_load_artifact(self, run_id=None):
+        """Load artifact của job transform vào warehouse
+        run_id=None: lấy artifact mới nhất chưa được load. Trả về số dòng fact, 0 nếu không có artifact
+        """
+        run_id = run_id or self.artifacts.latest()
+        artifact = self.artifacts.get(run_id) if run_id else None
+        if artifact is None:
+            print("No pending transform artifact, skipping warehouse load")
+            return 0
+
+        transformed_data, metadata = artifact
+        if metadata.get('consumed_at'):
+            print(f"Artifact {run_id} already loaded at {metadata['consumed_at']}, skipping warehouse load")
+            return 0
+        if metadata.get('streamed'):
+            # Job transform chạy chế độ chunk đã load từng chunk vào warehouse và ghi watermark
+            print(f"Artifact {run_id} was loaded while transforming ({metadata['records']} records)")
+            self.artifacts.mark_consumed(run_id)
+            return metadata['records']
+        # Watermark đi kèm artifact (job transform có thể đã chạy ở process khác)
+        watermark_time, watermark_row_version = metadata['watermark']
+        self.pending_watermark = (datetime.fromisoformat(watermark_time), watermark_row_version)
+        print(f"Loading transform artifact {run_id} ({metadata.get('records')} records)")
+        return self.run_warehouse_load(transformed_data, full_rebuild=metadata.get('full_rebuild', False), run_id=run_id)
+
     def run_mart_creation(self):
         """Run data mart creation jobs"""
         # Create daily mart
-        job_id, status_id = self.start_job('create_daily_mart')
-        try:
-            self.log_message(job_id, status_id, "Starting daily mart creation")
-            success, message = self.mart_etl.create_daily_mart_sp()
-            if success:
-                self.log_message(job_id, status_id, "Daily mart created successfully")
-            self.end_job(job_id, status_id, success, error_message=None if success else message)
-        except Exception as e:
-            self.log_message(job_id, status_id, f"Daily mart creation failed: {str(e)}", "ERROR")
-            self.end_job(job_id, status_id, False, error_message=str(e))
-            raise
+        self.run_daily_mart()
 
         # Create monthly mart
-        job_id, status_id = self.start_job('create_monthly_mart')
-        try:
-            self.log_message(job_id, status_id, "Starting monthly mart creation")
-            success, message = self.mart_etl.create_monthly_mart_sp()
-            if success:
-                self.log_message(job_id, status_id, "Monthly mart created successfully")
-            self.end_job(job_id, status_id, success, error_message=None if success else message)
-        except Exception as e:
-            self.log_message(job_id, status_id, f"Monthly mart creation failed: {str(e)}", "ERROR")
-            self.end_job(job_id, status_id, False, error_message=str(e))
-            raise
+        self.run_monthly_mart()
 
-    def run_full_etl(self):
-        """Run the complete ETL process"""
+    def run_full_etl(self, full_rebuild=False):
+        """Run the complete ETL process
+        full_rebuild=True bỏ qua watermark và load lại toàn bộ staging vào warehouse
+        """
         try:
             print("Starting ETL process...")
             
             # Run extraction
             print("Running extraction...")
-            self.run_extraction()
+            if not self.run_extraction():
+                self.skip_jobs(['transform_gold_data', 'load_warehouse', 'create_daily_mart', 'create_monthly_mart'],
+                               "Source data unchanged since last snapshot")
+                return
             
             # Run transformation
             print("Running transformation...")
-            transformed_data = self.run_transformation()
+            transformed_data = self.run_transformation(full_rebuild=full_rebuild)
+            if transformed_data is None:
+                self.skip_jobs(['load_warehouse', 'create_daily_mart', 'create_monthly_mart'],
+                               "No new staging data since last load")
+                return
             
             # Load to warehouse
             print("Loading to warehouse...")
-            self.run_warehouse_load(transformed_data)
+            self.run_warehouse_load_artifact(self.last_run_id)
             
             # Create marts
             print("Creating data marts...")
             self.run_mart_creation()
             
             print("ETL process completed successfully!")
+            print(f"Connection pool stats: {pool_stats()}")
+            print(f"Log sink stats: {self.log_sink.stats()}")
+            print(f"Browser pool stats: {get_browser_pool().stats()}")
             
         except Exception as e:
             print(f"ETL process failed: {str(e)}")
             raise
 
-    def schedule_jobs(self):
-        """Schedule jobs based on configuration in control_db"""
+    # Job extract có thể lỗi riêng lẻ, load_staging vẫn chạy với các nguồn thành công (như run_extraction)
+    DAG_PARTIAL_JOBS = ('load_staging',)
+
+    def run_dag_job(self, job_name, upstream_results, full_rebuild=False):
+        """Chạy một job trong DAG, upstream_results là kết quả các job upstream trong cùng lần chạy"""
+        if job_name == 'extract_pnj':
+            return self.run_pnj_extraction()
+        if job_name == 'extract_csv':
+            return self.run_csv_extraction()
+        if job_name == 'extract_excel':
+            return self.run_excel_extraction()
+        if job_name == 'load_staging':
+            # Chỉ load file của các job extract vừa chạy; chạy riêng thì load toàn bộ thư mục staging
+            json_files = self.collect_staging_files(upstream_results.values())
+            if upstream_results and not json_files:
+                # Các job extract đều trả về None: dữ liệu không đổi so với snapshot
+                self.skip_job(job_name, "Source data unchanged since last snapshot")
+                return None
+            return self.run_staging_load(json_files or None)
+        if job_name == 'transform_gold_data':
+            if 'load_staging' in upstream_results and upstream_results['load_staging'] is None:
+                self.skip_job(job_name, "Staging load was skipped")
+                return None
+            # Truyền run_id của artifact cho job phía sau, None nếu không có dữ liệu mới
+            return self.last_run_id if self.run_transformation(full_rebuild=full_rebuild) is not None else None
+        if job_name == 'load_warehouse':
+            if 'transform_gold_data' in upstream_results and upstream_results['transform_gold_data'] is None:
+                self.skip_job(job_name, "No new transformed data")
+                return 0
+            return self.run_warehouse_load_artifact(upstream_results.get('transform_gold_data'))
+        if job_name in ('create_daily_mart', 'create_monthly_mart'):
+            if upstream_results.get('load_warehouse', True) == 0:
+                self.skip_job(job_name, "No new warehouse data")
+                return None
+            return self.run_mart('daily' if job_name == 'create_daily_mart' else 'monthly')
+        raise ValueError(f"Unknown job: {job_name}")
+
+    def run_dag(self, jobs=None, full_rebuild=False, max_workers=None):
+        """Chạy các job theo Job_Dependencies trong control_db
+        Job nào có đủ upstream thì chạy ngay (song song tối đa dag_workers job);
+        jobs=None chạy toàn bộ đồ thị, nếu không chỉ chạy các job cho trước
+        """
+        graph = load_job_graph(self.control_conn_str)
+        executor = DagExecutor(
+            graph,
+            lambda job_name, upstream_results: self.run_dag_job(job_name, upstream_results, full_rebuild),
+            max_workers=max_workers or self.dag_workers,
+            partial_jobs=self.DAG_PARTIAL_JOBS
+        )
+        print(f"Running DAG: {' -> '.join(job for job in executor.order if jobs is None or job in jobs)}")
+        started = time.perf_counter()
+        result = executor.run(jobs)
+        print(f"DAG finished in {time.perf_counter() - started:.2f}s: "
+              f"{len(result['succeeded'])} succeeded, {len(result['failed'])} failed, "
+              f"{len(result['skipped'])} skipped")
+        for job_name, error in result['failed'].items():
+            print(f"- {job_name} failed: {error}")
+        for job_name in result['skipped']:
+            print(f"- {job_name} skipped")
+        print(f"Connection pool stats: {pool_stats()}")
+        print(f"Log sink stats: {self.log_sink.stats()}")
+        print(f"Browser pool stats: {get_browser_pool().stats()}")
+        return result
+
+    def run_dag_from(self, job_name):
+        """Chạy một job gốc cùng toàn bộ các job phía sau nó (dùng cho scheduler --dag)"""
+        try:
+            graph = load_job_graph(self.control_conn_str)
+            return self.run_dag(downstream_closure(graph, [job_name]))
+        except Exception as e:
+            print(f"Error running DAG from {job_name}: {str(e)}")
+            return None
+
+    def schedule_jobs(self, dag=False):
+        """Schedule jobs based on configuration in control_db
+        dag=True: chỉ đặt lịch cho các job gốc (không có upstream), các job phía sau
+        được kích hoạt ngay khi upstream xong thay vì chờ đến giờ trong Job_Schedule
+        """
         try:
             print("Fetching job schedules from control_db...")
             conn = pyodbc.connect(self.control_conn_str)
@@ -350,19 +656,26 @@ class ETLRunner:
             """)
             schedules = cursor.fetchall()
             print(f"Found {len(schedules)} active job schedules")
+
+            run_job = self.run_single_job
+            if dag:
+                roots = root_jobs(load_job_graph(self.control_conn_str))
+                schedules = [row for row in schedules if row[0] in roots]
+                run_job = self.run_dag_from
+                print(f"DAG mode: scheduling root jobs {roots}, downstream jobs run when upstream completes")
             
             for job_name, schedule_type, schedule_time in schedules:
                 print(f"Scheduling {job_name} to run {schedule_type} at {schedule_time}")
                 if schedule_type == 'DAILY':
                     # Schedule daily job
-                    schedule.every().day.at(schedule_time.strftime('%H:%M')).do(self.run_single_job, job_name)
+                    schedule.every().day.at(schedule_time.strftime('%H:%M')).do(run_job, job_name)
                 elif schedule_type == 'WEEKLY':
                     # Schedule weekly job (runs on Monday)
-                    schedule.every().monday.at(schedule_time.strftime('%H:%M')).do(self.run_single_job, job_name)
+                    schedule.every().monday.at(schedule_time.strftime('%H:%M')).do(run_job, job_name)
                 elif schedule_type == 'MONTHLY':
                     # Schedule monthly job (runs on first day of month)
                     schedule.every().day.at(schedule_time.strftime('%H:%M')).do(
-                        self.run_monthly_job, job_name
+                        self.run_monthly_job, job_name, run_job
                     )
             
             conn.close()
@@ -371,10 +684,10 @@ class ETLRunner:
             print(f"Error scheduling jobs: {str(e)}")
             return False
 
-    def run_monthly_job(self, job_name):
+    def run_monthly_job(self, job_name, run_job=None):
         """Wrapper to run monthly jobs only on first day of month"""
         if datetime.now().day == 1:
-            self.run_single_job(job_name)
+            (run_job or self.run_single_job)(job_name)
 
     def run_single_job(self, job_name):
         """Run a single ETL job"""
@@ -383,13 +696,15 @@ class ETLRunner:
                 self.run_pnj_extraction()
             elif job_name == 'extract_csv':
                 self.run_csv_extraction()
+            elif job_name == 'extract_excel':
+                self.run_excel_extraction()
             elif job_name == 'load_staging':
                 self.run_staging_load()
             elif job_name == 'transform_gold_data':
                 transformed_data = self.run_transformation()
                 return transformed_data
             elif job_name == 'load_warehouse':
-                self.run_warehouse_load(self.last_transformed_data)
+                self.run_warehouse_load_artifact()
             elif job_name == 'create_daily_mart':
                 self.run_daily_mart()
             elif job_name == 'create_monthly_mart':
@@ -399,10 +714,10 @@ class ETLRunner:
             print(f"Error running job {job_name}: {str(e)}")
             return False
 
-    def run_scheduler(self):
+    def run_scheduler(self, dag=False):
         """Run the scheduler"""
         print("Starting ETL scheduler...")
-        if not self.schedule_jobs():
+        if not self.schedule_jobs(dag=dag):
             print("Failed to schedule jobs. Exiting...")
             return
         
@@ -428,7 +743,10 @@ class ETLRunner:
         try:
             self.log_message(job_id, status_id, "Starting PNJ web extraction")
             json_file = self.extractor.extract_from_pnj()
-            self.log_message(job_id, status_id, f"PNJ extraction completed, file saved: {json_file}")
+            if json_file is None:
+                self.log_message(job_id, status_id, "PNJ prices unchanged since last snapshot, no staging file written")
+            else:
+                self.log_message(job_id, status_id, f"PNJ extraction completed, file saved: {json_file}")
             self.end_job(job_id, status_id, True)
             return json_file
         except Exception as e:
@@ -442,8 +760,17 @@ class ETLRunner:
         try:
             csv_file = os.path.join(self.data_dir, "gold_price.csv")
             self.log_message(job_id, status_id, f"Starting CSV extraction from: {csv_file}")
-            json_file = self.extractor.extract_from_csv(csv_file)
-            self.log_message(job_id, status_id, f"CSV extraction completed, file saved: {json_file}")
+            if self.chunk_size:
+                # File lớn: mỗi chunk một file staging
+                json_file = self.extractor.extract_from_csv_chunked(csv_file, self.chunk_size)
+            else:
+                json_file = self.extractor.extract_from_csv(csv_file)
+            if json_file is None:
+                self.log_message(job_id, status_id, "CSV file unchanged since last snapshot, no staging file written")
+            elif self.chunk_size:
+                self.log_message(job_id, status_id, f"CSV extraction completed, {len(json_file)} chunk files saved")
+            else:
+                self.log_message(job_id, status_id, f"CSV extraction completed, file saved: {json_file}")
             self.end_job(job_id, status_id, True)
             return json_file
         except Exception as e:
@@ -451,54 +778,100 @@ class ETLRunner:
             self.end_job(job_id, status_id, False, error_message=str(e))
             raise
 
-    def run_staging_load(self):
-        """Run staging load job"""
+    def run_excel_extraction(self):
+        """Run Excel extraction job"""
+        job_id, status_id = self.start_job('extract_excel')
+        try:
+            excel_file = os.path.join(self.data_dir, "gold_price.xlsx")
+            self.log_message(job_id, status_id, f"Starting Excel extraction from: {excel_file}")
+            json_file = self.extractor.extract_from_excel(excel_file)
+            if json_file is None:
+                self.log_message(job_id, status_id, "Excel file unchanged since last snapshot, no staging file written")
+            else:
+                self.log_message(job_id, status_id, f"Excel extraction completed, file saved: {json_file}")
+            self.end_job(job_id, status_id, True)
+            return json_file
+        except Exception as e:
+            self.log_message(job_id, status_id, f"Excel extraction failed: {str(e)}", "ERROR")
+            self.end_job(job_id, status_id, False, error_message=str(e))
+            raise
+
+    def run_staging_load(self, json_files=None):
+        """Run staging load job
+        json_files=None: load toàn bộ file trong thư mục staging
+        """
         job_id, status_id = self.start_job('load_staging')
         try:
             self.log_message(job_id, status_id, "Starting staging data load")
-            # Get latest staging files
-            staging_dir = os.path.join(self.data_dir, 'staging')
-            json_files = [
-                os.path.join(staging_dir, f) 
-                for f in os.listdir(staging_dir) 
-                if f.endswith('.json')
-            ]
+            if json_files is None:
+                # Get latest staging files
+                json_files = list_staging_files(os.path.join(self.data_dir, 'staging'))
             records = self.load_staging_data(json_files)
-            self.log_message(job_id, status_id, f"Loaded {records} records to staging")
+            self.log_message(job_id, status_id, f"Loaded {records} new records to staging: {self.describe_staging_stats()}")
             self.end_job(job_id, status_id, True, records=records)
+            return records
         except Exception as e:
             self.log_message(job_id, status_id, f"Staging load failed: {str(e)}", "ERROR")
             self.end_job(job_id, status_id, False, error_message=str(e))
             raise
 
-    def run_daily_mart(self):
-        """Run daily mart creation"""
-        job_id, status_id = self.start_job('create_daily_mart')
+    def track_changed_date_keys(self, date_keys):
+        """Ghi nhận các DateKey vừa được load để mart refresh incremental"""
+        for mart, pending in self.pending_mart_keys.items():
+            self.pending_mart_keys[mart] = (pending or set()) | set(date_keys)
+
+    def refresh_mart_incremental(self, mart, date_keys):
+        """Refresh mart chỉ cho các DateKey thay đổi, trả về (success, message)"""
+        conn = pyodbc.connect(self.warehouse_conn_str)
         try:
-            self.log_message(job_id, status_id, "Starting daily mart creation")
-            success, message = self.mart_etl.create_daily_mart_sp()
-            if success:
-                self.log_message(job_id, status_id, "Daily mart created successfully")
-            self.end_job(job_id, status_id, success, error_message=None if success else message)
+            refresh_aggregates(conn, date_keys, [mart])
+            conn.commit()
+            return True, f"Refreshed {len(date_keys)} date keys"
         except Exception as e:
-            self.log_message(job_id, status_id, f"Daily mart creation failed: {str(e)}", "ERROR")
-            self.end_job(job_id, status_id, False, error_message=str(e))
-            raise
+            conn.rollback()
+            return False, str(e)
+        finally:
+            conn.close()
 
-    def run_monthly_mart(self):
-        """Run monthly mart creation"""
-        job_id, status_id = self.start_job('create_monthly_mart')
+    def run_mart(self, mart):
+        """Run daily/monthly mart creation
+        Chế độ incremental chỉ tính lại các DateKey / (Year, Month) thay đổi từ lần refresh trước;
+        nếu chưa biết các key thay đổi (vd. sau full rebuild) thì tính lại toàn bộ
+        """
+        job_name = f'create_{mart}_mart'
+        title = mart.capitalize()
+        job_id, status_id = self.start_job(job_name)
         try:
-            self.log_message(job_id, status_id, "Starting monthly mart creation")
-            success, message = self.mart_etl.create_monthly_mart_sp()
+            self.log_message(job_id, status_id, f"Starting {mart} mart creation")
+            date_keys = self.pending_mart_keys[mart]
+            if self.mart_refresh_mode == 'incremental' and date_keys is not None:
+                if not date_keys:
+                    self.log_message(job_id, status_id, f"No changed date keys, {mart} mart is up to date")
+                    self.end_job(job_id, status_id, True)
+                    return
+                self.log_message(job_id, status_id, f"Incremental refresh for {len(date_keys)} date keys")
+                success, message = self.refresh_mart_incremental(mart, date_keys)
+            elif mart == 'daily':
+                success, message = self.mart_etl.create_daily_mart_sp()
+            else:
+                success, message = self.mart_etl.create_monthly_mart_sp()
             if success:
-                self.log_message(job_id, status_id, "Monthly mart created successfully")
+                self.pending_mart_keys[mart] = set()
+                self.log_message(job_id, status_id, f"{title} mart created successfully")
             self.end_job(job_id, status_id, success, error_message=None if success else message)
         except Exception as e:
-            self.log_message(job_id, status_id, f"Monthly mart creation failed: {str(e)}", "ERROR")
+            self.log_message(job_id, status_id, f"{title} mart creation failed: {str(e)}", "ERROR")
             self.end_job(job_id, status_id, False, error_message=str(e))
             raise
 
+    def run_daily_mart(self):
+        """Run daily mart creation"""
+        self.run_mart('daily')
+
+    def run_monthly_mart(self):
+        """Run monthly mart creation"""
+        self.run_mart('monthly')
+
     def load_to_warehouse(self, staging_data):
         """Load data from staging to warehouse"""
         print("Loading to warehouse...")
@@ -550,12 +923,29 @@ class ETLRunner:
             return False
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the gold price ETL pipeline")
+    parser.add_argument('--schedule', action='store_true', help="Run in scheduler mode")
+    parser.add_argument('--staging-load', choices=['bulk', 'row'],
+                        help="Staging load mode (default: etl.staging_load_mode in config.json)")
+    parser.add_argument('--full-rebuild', action='store_true',
+                        help="Ignore the watermark and reload the whole staging history into the warehouse")
+    parser.add_argument('--dag', action='store_true',
+                        help="Run jobs following Job_Dependencies in control_db, independent jobs in parallel")
+    parser.add_argument('--dag-workers', type=int,
+                        help="Max jobs running at once in DAG mode (default: etl.dag_workers in config.json)")
+    args = parser.parse_args()
+
     config_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'config.json')
-    runner = ETLRunner(config_path)
+    runner = ETLRunner(config_path, staging_load_mode=args.staging_load)
+    if args.dag_workers:
+        runner.dag_workers = args.dag_workers
     
-    if len(sys.argv) > 1 and sys.argv[1] == '--schedule':
+    if args.schedule:
         # Run in scheduler mode
-        runner.run_scheduler()
+        runner.run_scheduler(dag=args.dag)
+    elif args.dag:
+        # Run immediately theo dependency graph
+        runner.run_dag(full_rebuild=args.full_rebuild)
     else:
         # Run immediately
-        runner.run_full_etl() 
\ No newline at end of file
+        runner.run_full_etl(full_rebuild=args.full_rebuild)
@@ -21,7 +21,7 @@ CREATE TABLE Job_Status (
     job_id INT FOREIGN KEY REFERENCES ETL_Jobs(job_id),
     start_time DATETIME DEFAULT GETDATE(),
     end_time DATETIME,
-    status VARCHAR(50), -- 'RUNNING', 'SUCCESS', 'FAILED', 'PENDING'
+    status VARCHAR(50), -- 'RUNNING', 'SUCCESS', 'FAILED', 'PENDING', 'SKIPPED' (dữ liệu nguồn không đổi)
     records_processed INT DEFAULT 0,
     error_message VARCHAR(MAX),
     created_at DATETIME DEFAULT GETDATE()
@@ -80,6 +80,27 @@ CREATE TABLE Job_Notifications (
     is_sent BIT DEFAULT 0
 );
 
+-- Bảng lưu high-water mark cho các lần load incremental
+CREATE TABLE ETL_Watermarks (
+    watermark_name VARCHAR(100) PRIMARY KEY, -- 'warehouse_fact_load', 'reload_warehouse'
+    last_update_time DATETIME NULL,          -- UpdateTime lớn nhất đã load (để theo dõi)
+    last_row_version BIGINT NULL,            -- RowVer staging lớn nhất đã load (điều kiện đọc incremental)
+    updated_at DATETIME DEFAULT GETDATE()
+);
+
+-- Bảng ghi nhận các bảng backup GoldPrices_backup_<timestamp> trong staging_db
+CREATE TABLE Backup_Snapshots (
+    snapshot_id INT IDENTITY(1,1) PRIMARY KEY,
+    table_name VARCHAR(255) NOT NULL UNIQUE,
+    snapshot_type VARCHAR(20) NOT NULL,        -- 'DELTA' (dòng vừa thêm), 'FULL' (bản copy cả bảng kiểu cũ)
+    snapshot_time DATETIME NOT NULL,
+    row_count INT DEFAULT 0,
+    history_applied BIT DEFAULT 0,             -- đã gộp vào staging_db.GoldPrices_history
+    status VARCHAR(20) DEFAULT 'ACTIVE',       -- 'ACTIVE', 'COMPACTED' (bảng backup đã drop)
+    compacted_at DATETIME NULL,
+    created_at DATETIME DEFAULT GETDATE()
+);
+
 -- Insert sample ETL jobs
 INSERT INTO ETL_Jobs (job_name, description, source_type) VALUES
 ('extract_pnj', 'Extract data from PNJ website', 'WEB'),
@@ -125,6 +125,34 @@ BEGIN
 END;
 GO
 
+-- ETL_Watermarks tạo trước khi có last_row_version: thêm cột (watermark theo RowVer staging)
+IF COL_LENGTH('ETL_Watermarks', 'last_row_version') IS NULL
+    ALTER TABLE ETL_Watermarks ADD last_row_version BIGINT NULL;
+GO
+
+-- Procedure để cập nhật high-water mark sau mỗi lần load incremental
+CREATE OR ALTER PROCEDURE sp_SetWatermark
+    @watermark_name VARCHAR(100),
+    @last_update_time DATETIME,
+    @last_row_version BIGINT = NULL
+AS
+BEGIN
+    IF EXISTS (SELECT 1 FROM ETL_Watermarks WHERE watermark_name = @watermark_name)
+    BEGIN
+        UPDATE ETL_Watermarks
+        SET last_update_time = @last_update_time,
+            last_row_version = @last_row_version,
+            updated_at = GETDATE()
+        WHERE watermark_name = @watermark_name;
+    END
+    ELSE
+    BEGIN
+        INSERT INTO ETL_Watermarks (watermark_name, last_update_time, last_row_version)
+        VALUES (@watermark_name, @last_update_time, @last_row_version);
+    END
+END;
+GO
+
 -- Procedure để thiết lập cấu hình ETL ban đầu
 CREATE OR ALTER PROCEDURE sp_InitializeETLConfiguration
 AS
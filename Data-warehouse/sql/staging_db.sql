@@ -11,9 +11,19 @@ CREATE TABLE GoldPrices (
     GoldType NVARCHAR(255) NOT NULL,
     BuyPrice FLOAT NULL,
     SellPrice FLOAT NULL,
-    UpdateTime DATETIME NULL
+    UpdateTime DATETIME NULL,
+    -- Hash nội dung dòng kèm UpdateTime để dedupe (MERGE theo RowHash thay cho LEFT JOIN trên cột FLOAT)
+    RowHash AS CAST(HASHBYTES('SHA2_256', CONCAT(GoldType, N'|', CONVERT(VARCHAR(30), BuyPrice, 2), N'|',
+        CONVERT(VARCHAR(30), SellPrice, 2), N'|', CONVERT(VARCHAR(23), UpdateTime, 121))) AS BINARY(32)) PERSISTED,
+    -- Thứ tự ghi trong database: watermark của warehouse load đọc theo cột này
+    -- (GoldPrices chỉ được thêm dòng qua MERGE theo RowHash, dòng đã có giữ nguyên RowVer)
+    RowVer ROWVERSION
 );
 GO
+CREATE INDEX IX_GoldPrices_RowHash ON GoldPrices (RowHash);
+GO
+CREATE INDEX IX_GoldPrices_RowVer ON GoldPrices (RowVer);
+GO
 
 DROP TABLE IF EXISTS GoldPrices_temp;
 GO
@@ -22,6 +32,33 @@ CREATE TABLE GoldPrices_temp (
     GoldType NVARCHAR(255) NOT NULL,
     BuyPrice FLOAT NULL,
     SellPrice FLOAT NULL,
-    UpdateTime DATETIME NULL
+    UpdateTime DATETIME NULL,
+    -- Hash nội dung dòng kèm UpdateTime để dedupe (MERGE theo RowHash thay cho LEFT JOIN trên cột FLOAT)
+    RowHash AS CAST(HASHBYTES('SHA2_256', CONCAT(GoldType, N'|', CONVERT(VARCHAR(30), BuyPrice, 2), N'|',
+        CONVERT(VARCHAR(30), SellPrice, 2), N'|', CONVERT(VARCHAR(23), UpdateTime, 121))) AS BINARY(32)) PERSISTED
 );
-GO
\ No newline at end of file
+GO
+CREATE INDEX IX_GoldPrices_temp_RowHash ON GoldPrices_temp (RowHash);
+GO
+
+-- Lịch sử GoldPrices gộp từ các bảng backup: mỗi dòng một lần kèm khoảng hiệu lực (SCD2)
+DROP TABLE IF EXISTS GoldPrices_history;
+GO
+CREATE TABLE GoldPrices_history (
+    history_id BIGINT IDENTITY(1,1) PRIMARY KEY,
+    gold_id INT NULL,
+    GoldType NVARCHAR(255) NOT NULL,
+    BuyPrice FLOAT NULL,
+    SellPrice FLOAT NULL,
+    UpdateTime DATETIME NULL,
+    RowHash BINARY(32) NOT NULL,
+    valid_from DATETIME NOT NULL,      -- thời điểm backup đầu tiên có dòng
+    valid_to DATETIME NULL,            -- thời điểm backup FULL đầu tiên không còn dòng (NULL: vẫn còn)
+    snapshot_id INT NULL,              -- control_db.Backup_Snapshots
+    closed_by_snapshot_id INT NULL
+);
+GO
+CREATE INDEX IX_GoldPrices_history_Open ON GoldPrices_history (RowHash) WHERE valid_to IS NULL;
+GO
+CREATE INDEX IX_GoldPrices_history_Validity ON GoldPrices_history (valid_from, valid_to);
+GO
@@ -89,4 +89,169 @@ BEGIN
         RETURN 1;
     END CATCH
 END;
-GO 
\ No newline at end of file
+GO 
+
+-- Procedure để refresh daily aggregates chỉ cho các DateKey thay đổi
+-- @DateKeys: danh sách DateKey phân tách bằng dấu phẩy, vd '20241208,20241209'
+CREATE OR ALTER PROCEDURE sp_RefreshDailyMart
+    @DateKeys NVARCHAR(MAX)
+AS
+BEGIN
+    BEGIN TRY
+        BEGIN TRANSACTION;
+        
+        DECLARE @Keys TABLE (DateKey INT PRIMARY KEY);
+        INSERT INTO @Keys (DateKey)
+        SELECT DISTINCT CAST(value AS INT)
+        FROM STRING_SPLIT(@DateKeys, ',')
+        WHERE LTRIM(RTRIM(value)) <> '';
+        
+        -- Xóa aggregates cũ của các ngày thay đổi
+        DELETE a
+        FROM AggDailyGoldPrices a
+        JOIN @Keys k ON a.DateKey = k.DateKey;
+        
+        -- Tính lại aggregates cho các ngày thay đổi
+        INSERT INTO AggDailyGoldPrices (
+            DateKey,
+            AvgBuyPrice, MinBuyPrice, MaxBuyPrice,
+            AvgSellPrice, MinSellPrice, MaxSellPrice,
+            AvgPriceDifference,
+            Created_at
+        )
+        SELECT 
+            f.DateKey,
+            CAST(AVG(f.BuyPrice) AS DECIMAL(18,2)) AS AvgBuyPrice,
+            CAST(MIN(f.BuyPrice) AS DECIMAL(18,2)) AS MinBuyPrice,
+            CAST(MAX(f.BuyPrice) AS DECIMAL(18,2)) AS MaxBuyPrice,
+            CAST(AVG(f.SellPrice) AS DECIMAL(18,2)) AS AvgSellPrice,
+            CAST(MIN(f.SellPrice) AS DECIMAL(18,2)) AS MinSellPrice,
+            CAST(MAX(f.SellPrice) AS DECIMAL(18,2)) AS MaxSellPrice,
+            CAST(AVG(f.PriceDifference) AS DECIMAL(18,2)) AS AvgPriceDifference,
+            GETDATE() AS Created_at
+        FROM FactGoldPrices f
+        JOIN @Keys k ON f.DateKey = k.DateKey
+        GROUP BY f.DateKey;
+        
+        COMMIT;
+        RETURN 0;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK;
+        THROW;
+        RETURN 1;
+    END CATCH
+END;
+GO
+
+-- Procedure để refresh monthly aggregates chỉ cho các (Year, Month) chứa DateKey thay đổi
+CREATE OR ALTER PROCEDURE sp_RefreshMonthlyMart
+    @DateKeys NVARCHAR(MAX)
+AS
+BEGIN
+    BEGIN TRY
+        BEGIN TRANSACTION;
+        
+        DECLARE @Months TABLE (Year INT, Month INT, PRIMARY KEY (Year, Month));
+        INSERT INTO @Months (Year, Month)
+        SELECT DISTINCT CAST(value AS INT) / 10000, (CAST(value AS INT) / 100) % 100
+        FROM STRING_SPLIT(@DateKeys, ',')
+        WHERE LTRIM(RTRIM(value)) <> '';
+        
+        -- Xóa aggregates cũ của các tháng thay đổi
+        DELETE a
+        FROM AggMonthlyGoldPrices a
+        JOIN @Months m ON a.Year = m.Year AND a.Month = m.Month;
+        
+        -- Tính lại aggregates, lọc fact theo khoảng DateKey của từng tháng
+        INSERT INTO AggMonthlyGoldPrices (
+            Year, Month,
+            AvgBuyPrice, MinBuyPrice, MaxBuyPrice,
+            AvgSellPrice, MinSellPrice, MaxSellPrice,
+            AvgPriceDifference,
+            Created_at
+        )
+        SELECT 
+            m.Year,
+            m.Month,
+            CAST(AVG(f.BuyPrice) AS DECIMAL(18,2)) AS AvgBuyPrice,
+            CAST(MIN(f.BuyPrice) AS DECIMAL(18,2)) AS MinBuyPrice,
+            CAST(MAX(f.BuyPrice) AS DECIMAL(18,2)) AS MaxBuyPrice,
+            CAST(AVG(f.SellPrice) AS DECIMAL(18,2)) AS AvgSellPrice,
+            CAST(MIN(f.SellPrice) AS DECIMAL(18,2)) AS MinSellPrice,
+            CAST(MAX(f.SellPrice) AS DECIMAL(18,2)) AS MaxSellPrice,
+            CAST(AVG(f.PriceDifference) AS DECIMAL(18,2)) AS AvgPriceDifference,
+            GETDATE() AS Created_at
+        FROM @Months m
+        JOIN FactGoldPrices f
+            ON f.DateKey BETWEEN m.Year * 10000 + m.Month * 100 + 1
+                             AND m.Year * 10000 + m.Month * 100 + 31
+        GROUP BY m.Year, m.Month;
+        
+        COMMIT;
+        RETURN 0;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK;
+        THROW;
+        RETURN 1;
+    END CATCH
+END;
+GO
+
+-- Procedure để điền sẵn DimDate cho các năm @StartYear..@EndYear (một câu INSERT set-based)
+-- Ngày đã có được giữ nguyên, chạy lại nhiều lần không lỗi. Trả về số ngày mới được thêm
+CREATE OR ALTER PROCEDURE sp_PopulateDimDate
+    @StartYear INT,
+    @EndYear INT
+AS
+BEGIN
+    SET NOCOUNT ON;
+    BEGIN TRY
+        IF @EndYear < @StartYear
+            THROW 50001, 'sp_PopulateDimDate: @EndYear must not be before @StartYear', 1;
+
+        DECLARE @StartDate DATE = DATEFROMPARTS(@StartYear, 1, 1);
+        DECLARE @Days INT = DATEDIFF(DAY, @StartDate, DATEFROMPARTS(@EndYear, 12, 31)) + 1;
+        DECLARE @Inserted INT;
+
+        BEGIN TRANSACTION;
+
+        -- Dãy số 0..@Days-1 sinh từ sys.all_objects (đủ cho vài trăm năm), không dùng vòng lặp
+        WITH Numbers AS (
+            SELECT TOP (@Days) ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) - 1 AS n
+            FROM sys.all_objects a CROSS JOIN sys.all_objects b
+        ),
+        Calendar AS (
+            SELECT DATEADD(DAY, n, @StartDate) AS [Date]
+            FROM Numbers
+        )
+        INSERT INTO DimDate (DateKey, Date, Year, Month, Day, Quarter)
+        SELECT
+            YEAR(c.[Date]) * 10000 + MONTH(c.[Date]) * 100 + DAY(c.[Date]),
+            c.[Date],
+            YEAR(c.[Date]),
+            MONTH(c.[Date]),
+            DAY(c.[Date]),
+            DATEPART(QUARTER, c.[Date])
+        FROM Calendar c
+        WHERE NOT EXISTS (
+            SELECT 1 FROM DimDate d
+            WHERE d.DateKey = YEAR(c.[Date]) * 10000 + MONTH(c.[Date]) * 100 + DAY(c.[Date])
+        );
+        SET @Inserted = @@ROWCOUNT;
+
+        COMMIT;
+        SELECT @Inserted AS InsertedDays;
+        RETURN 0;
+    END TRY
+    BEGIN CATCH
+        IF @@TRANCOUNT > 0
+            ROLLBACK;
+        THROW;
+        RETURN 1;
+    END CATCH
+END;
+GO
@@ -20,6 +20,8 @@ CREATE TABLE GoldPrices (
 GO
 
 -- Date Dimension
+-- Điền sẵn theo năm: EXEC sp_PopulateDimDate @StartYear, @EndYear (update_procedures.sql)
+-- hoặc python CalendarDimension.py (run_etl tự chạy theo etl.calendar ở lần load đầu tiên)
 CREATE TABLE DimDate (
     DateKey INT PRIMARY KEY,
     Date DATE,
@@ -29,6 +31,8 @@ CREATE TABLE DimDate (
     Quarter INT,
     Created_at DATETIME DEFAULT GETDATE()
 );
+CREATE NONCLUSTERED INDEX IX_DimDate_Date ON DimDate (Date) INCLUDE (Year, Month, Day, Quarter);
+CREATE NONCLUSTERED INDEX IX_DimDate_YearMonth ON DimDate (Year, Month) INCLUDE (Date, Day, Quarter);
 
 -- Gold Type Dimension
 CREATE TABLE DimGoldType (
@@ -36,10 +40,11 @@ CREATE TABLE DimGoldType (
     GoldType NVARCHAR(255),
     Created_at DATETIME DEFAULT GETDATE()
 );
+CREATE UNIQUE NONCLUSTERED INDEX UX_DimGoldType_GoldType ON DimGoldType (GoldType);
 
--- Fact Table
+-- Fact Table (clustered columnstore, xem warehouse_indexes.sql)
 CREATE TABLE FactGoldPrices (
-    FactID INT IDENTITY(1,1) PRIMARY KEY,
+    FactID INT IDENTITY(1,1) CONSTRAINT PK_FactGoldPrices PRIMARY KEY NONCLUSTERED,
     GoldTypeKey INT FOREIGN KEY REFERENCES DimGoldType(GoldTypeKey),
     DateKey INT FOREIGN KEY REFERENCES DimDate(DateKey),
     BuyPrice DECIMAL(18,2),
@@ -48,6 +53,7 @@ CREATE TABLE FactGoldPrices (
     PriceDifferencePercentage DECIMAL(18,2),
     Created_at DATETIME DEFAULT GETDATE()
 );
+CREATE CLUSTERED COLUMNSTORE INDEX CCI_FactGoldPrices ON FactGoldPrices;
 
 -- Aggregate Tables
 CREATE TABLE AggDailyGoldPrices (
@@ -0,0 +1,81 @@
+USE warehouse_db;
+GO
+
+-- Migration index / layout cho warehouse_db, chạy lại nhiều lần không lỗi
+-- (python migrate_warehouse.py chạy file này và benchmark các truy vấn BI trước / sau)
+
+-- 1. DimGoldType: gộp các GoldType bị trùng (fact trỏ về key nhỏ nhất) trước khi tạo unique index
+IF EXISTS (SELECT GoldType FROM DimGoldType GROUP BY GoldType HAVING COUNT(*) > 1)
+BEGIN
+    BEGIN TRANSACTION;
+
+    SELECT GoldType, MIN(GoldTypeKey) AS KeepKey
+    INTO #KeepGoldType
+    FROM DimGoldType
+    GROUP BY GoldType;
+
+    UPDATE f
+    SET GoldTypeKey = k.KeepKey
+    FROM FactGoldPrices f
+    JOIN DimGoldType g ON f.GoldTypeKey = g.GoldTypeKey
+    JOIN #KeepGoldType k ON k.GoldType = g.GoldType OR (k.GoldType IS NULL AND g.GoldType IS NULL)
+    WHERE f.GoldTypeKey <> k.KeepKey;
+
+    DELETE g
+    FROM DimGoldType g
+    JOIN #KeepGoldType k ON k.GoldType = g.GoldType OR (k.GoldType IS NULL AND g.GoldType IS NULL)
+    WHERE g.GoldTypeKey <> k.KeepKey;
+
+    DROP TABLE #KeepGoldType;
+    COMMIT;
+    PRINT 'Merged duplicate DimGoldType rows';
+END
+GO
+
+-- Tra GoldType -> GoldTypeKey (MERGE DimGoldType, join khi load fact): seek thay vì scan
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'UX_DimGoldType_GoldType' AND object_id = OBJECT_ID('DimGoldType'))
+    CREATE UNIQUE NONCLUSTERED INDEX UX_DimGoldType_GoldType ON DimGoldType (GoldType);
+GO
+
+-- 2. DimDate: covering index cho ORDER BY Date và group theo (Year, Month)
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_DimDate_Date' AND object_id = OBJECT_ID('DimDate'))
+    CREATE NONCLUSTERED INDEX IX_DimDate_Date ON DimDate (Date) INCLUDE (Year, Month, Day, Quarter);
+GO
+
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name = 'IX_DimDate_YearMonth' AND object_id = OBJECT_ID('DimDate'))
+    CREATE NONCLUSTERED INDEX IX_DimDate_YearMonth ON DimDate (Year, Month) INCLUDE (Date, Day, Quarter);
+GO
+
+-- 3. FactGoldPrices: clustered columnstore thay cho clustered B-tree theo FactID
+--    Dữ liệu được sắp theo DateKey trước khi nén nên mỗi rowgroup có khoảng DateKey riêng,
+--    các truy vấn lọc theo khoảng ngày (refresh mart theo tháng) bỏ qua được rowgroup không liên quan
+IF NOT EXISTS (SELECT * FROM sys.indexes WHERE object_id = OBJECT_ID('FactGoldPrices') AND type = 5)
+BEGIN
+    DECLARE @pk SYSNAME = (
+        SELECT k.name
+        FROM sys.key_constraints k
+        JOIN sys.indexes i ON i.object_id = k.parent_object_id AND i.index_id = k.unique_index_id
+        WHERE k.parent_object_id = OBJECT_ID('FactGoldPrices') AND k.type = 'PK' AND i.type = 1
+    );
+    IF @pk IS NOT NULL
+    BEGIN
+        DECLARE @drop_pk NVARCHAR(400) = N'ALTER TABLE FactGoldPrices DROP CONSTRAINT ' + QUOTENAME(@pk);
+        EXEC sp_executesql @drop_pk;
+    END
+
+    EXEC('CREATE CLUSTERED INDEX CCI_FactGoldPrices ON FactGoldPrices (DateKey)');
+    EXEC('CREATE CLUSTERED COLUMNSTORE INDEX CCI_FactGoldPrices ON FactGoldPrices WITH (DROP_EXISTING = ON, MAXDOP = 1)');
+    PRINT 'FactGoldPrices converted to clustered columnstore';
+END
+GO
+
+-- Khóa chính FactID giữ lại dưới dạng nonclustered
+IF NOT EXISTS (SELECT * FROM sys.key_constraints WHERE parent_object_id = OBJECT_ID('FactGoldPrices') AND type = 'PK')
+    ALTER TABLE FactGoldPrices ADD CONSTRAINT PK_FactGoldPrices PRIMARY KEY NONCLUSTERED (FactID);
+GO
+
+-- Cập nhật thống kê cho optimizer sau khi đổi layout
+UPDATE STATISTICS DimGoldType;
+UPDATE STATISTICS DimDate;
+UPDATE STATISTICS FactGoldPrices;
+GO